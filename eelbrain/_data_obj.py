@@ -127,9 +127,10 @@ import scipy.interpolate
 import scipy.ndimage
 import scipy.optimize
 import scipy.signal
+import scipy.sparse
 import scipy.stats
 from scipy.linalg import inv, norm
-from scipy.spatial import ConvexHull
+from scipy.spatial import ConvexHull, cKDTree
 from scipy.spatial.distance import cdist, pdist, squareform
 
 from . import fmtxt, _info
@@ -163,6 +164,10 @@ SRC_RE = re.compile(r'^(ico|oct|vol)-(\d+)(?:-(\w+))?$')
 UNNAMED = '<?>'
 LIST_INDEX_TYPES = (*INT_TYPES, slice)
 EXPAND_INDEX_TYPES = (*INT_TYPES, np.ndarray)
+MEMMAP_BLOCK_BYTES = 2**26  # aggregate memory-mapped NDVar data in blocks of cases
+GAUSSIAN_SMOOTHER_CUTOFF = 4  # sparse Gaussian smoothers: ignore sources beyond 4 std
+GAUSSIAN_SMOOTHERS_MAX = 8  # number of sparse Gaussian smoothers to cache
+GAUSSIAN_SMOOTHERS = {}
 _pickled_ds_wildcard = ("Pickled Dataset (*.pickle)", '*.pickle')
 _tex_wildcard = ("TeX (*.tex)", '*.tex')
 _tsv_wildcard = ("Plain Text Tab Separated Values (*.txt)", '*.txt')
@@ -3252,6 +3257,12 @@ class NDVar(Named):
     implicitly modify the original NDVars in place (see `this note
     <https://mail.python.org/pipermail/python-dev/2003-October/038855.html>`_).
 
+    *Memory-mapped data*: :attr:`x` can be a :class:`numpy.memmap` (e.g.,
+    from :func:`load.dataset_dir`), so that data for many cases can be kept on
+    disk. Indexing and :meth:`NDVar.sub` then only read the selected data.
+    Summary methods (e.g., :meth:`NDVar.mean`) process the data in blocks of
+    cases, so that temporary arrays do not need to hold all cases at once.
+
 
     Examples
     --------
@@ -3961,7 +3972,12 @@ class NDVar(Named):
                 else:
                     axis = list(axis) + additional_axis
             return data._aggregate_over_dims(axis, {'name': name}, func, mask)
-        elif isinstance(axis, NDVar):
+        elif isinstance(self.x, np.memmap) and self.has_case and self.x.nbytes > MEMMAP_BLOCK_BYTES:
+            out = self._aggregate_memmap(axis, name, func, mask)
+            if out is not None:
+                return out
+
+        if isinstance(axis, NDVar):
             if mask is not None:
                 raise NotImplementedError
             dims, self_x, index = self._align(axis)
@@ -3987,6 +4003,42 @@ class NDVar(Named):
 
         return self._package_aggregated_output(x, dims, name, _info.for_data(x, self.info))
 
+    def _aggregate_memmap(self, axis, name, func, mask):
+        "Aggregate memory-mapped data in blocks of cases (returns None if not possible)"
+        if isinstance(axis, NDVar):
+            if axis.has_case:
+                return
+            reduce_case = False
+        elif axis is None:
+            reduce_case = True
+        elif isinstance(axis, str):
+            reduce_case = axis == 'case'
+        else:
+            reduce_case = 'case' in axis
+        if reduce_case and (mask is not None or func not in (np.sum, np.mean, np.max, np.min)):
+            return
+        n_cases = len(self.x)
+        n_block = max(1, MEMMAP_BLOCK_BYTES * n_cases // self.x.nbytes)
+        starts = range(0, n_cases, n_block)
+        parts = [self[start:start + n_block]._aggregate_over_dims(axis, {'name': name}, func, mask) for start in starts]
+        part_data = [part.x if isinstance(part, (NDVar, Var)) else part for part in parts]
+        if not reduce_case:
+            x = np.concatenate(part_data)
+            if isinstance(parts[0], Var):
+                return Var(x, name=parts[0].name, info=parts[0].info)
+            return NDVar(x, (Case, *parts[0].dims[1:]), parts[0].name, parts[0].info)
+        elif func is np.sum:
+            x = reduce(np.add, part_data)
+        elif func is np.mean:
+            x = sum(data * min(n_block, n_cases - start) for data, start in zip(part_data, starts)) / n_cases
+        elif func is np.max:
+            x = reduce(np.maximum, part_data)
+        else:
+            x = reduce(np.minimum, part_data)
+        if isinstance(parts[0], NDVar):
+            return NDVar(x, parts[0].dims, parts[0].name, parts[0].info)
+        return x
+
     def astype(self, dtype):
         """Copy of the NDVar with data cast to the specified type
 
@@ -5120,7 +5172,8 @@ class NDVar(Named):
             Window type, input to :func:`scipy.signal.get_window`. For example
             'boxcar', 'triang', 'hamming' (default). For dimensions with
             irregular spacing, such as :class:`SourceSpace`, only ``gaussian``
-            is implemented.
+            is implemented. For :class:`SourceSpace`, the Gaussian window is
+            truncated at 4 standard deviations.
         mode : 'left' | 'center' | 'right' | 'full'
             Alignment of the output to the input relative to the window:
 
@@ -5173,12 +5226,10 @@ class NDVar(Named):
                 if dim_object._adjacency_type == 'custom':
                     raise ValueError(f"{window_samples=} for dimension with adjacency not based on adjacency")
                 raise NotImplementedError("Gaussian smoothing for window_samples")
-            else:
-                dist = dim_object._distances()
-            m = gaussian_smoother(dist, window_size)
-            x = np.tensordot(m, self.x, (1, axis))
-            if axis:
-                x = np.moveaxis(x, 0, axis)
+            m = dim_object._gaussian_smoother(window_size)
+            x = np.moveaxis(self.x, axis, 0)
+            x = (m @ x.reshape((len(x), -1))).reshape(x.shape)
+            x = np.moveaxis(x, 0, axis)
         elif dim_object._adjacency_type == 'custom':
             raise ValueError(f"{window=} for {dim_object.__class__.__name__} dimension (must be 'gaussian')")
         else:
@@ -8325,6 +8376,10 @@ class Dimension:
         "Distance matrix for dimension elements (square form)"
         raise NotImplementedError(f"Distances for {self.__class__.__name__}")
 
+    def _gaussian_smoother(self, std: float) -> np.ndarray | scipy.sparse.csr_matrix:
+        "Gaussian smoothing matrix (``x_smooth = m @ x``)"
+        return gaussian_smoother(self._distances(), std)
+
     def intersect(self, dim, check_dims=True):
         """Create a Dimension that is the intersection with dim
 
@@ -10136,6 +10191,48 @@ class SourceSpaceBase(Dimension):
             out.append('location')
         return out
 
+    def _gaussian_smoother(self, std: float) -> scipy.sparse.csr_matrix:
+        """Sparse Gaussian smoothing matrix
+
+        Only weights for sources within ``GAUSSIAN_SMOOTHER_CUTOFF * std`` of
+        each other are stored. Smoothers are cached per source space and
+        ``std``.
+        """
+        if isinstance(self._filename, mne.SourceSpaces):
+            key = None
+        else:
+            key = (self.__class__.__name__, self.subject, self.src, str(self._subjects_dir), *(v.tobytes() for v in self.vertices), std)
+            if key in GAUSSIAN_SMOOTHERS:
+                return GAUSSIAN_SMOOTHERS[key]
+        dist = self._sparse_distances(GAUSSIAN_SMOOTHER_CUTOFF * std).tocoo()
+        off_diagonal = dist.row != dist.col
+        row = np.concatenate([dist.row[off_diagonal], np.arange(self._n_vert)])
+        col = np.concatenate([dist.col[off_diagonal], np.arange(self._n_vert)])
+        weight = np.exp(-(np.concatenate([dist.data[off_diagonal], np.zeros(self._n_vert)]) / std) ** 2 / 2)
+        m = scipy.sparse.csr_matrix((weight, (row, col)), (self._n_vert, self._n_vert))
+        m = scipy.sparse.diags(1 / np.asarray(m.sum(1)).ravel()) @ m
+        if key is not None:
+            if len(GAUSSIAN_SMOOTHERS) >= GAUSSIAN_SMOOTHERS_MAX:
+                del GAUSSIAN_SMOOTHERS[next(iter(GAUSSIAN_SMOOTHERS))]
+            GAUSSIAN_SMOOTHERS[key] = m
+        return m
+
+    def _sparse_distances(self, max_dist: float) -> scipy.sparse.coo_matrix:
+        "Surface distances between source space vertices up to ``max_dist``"
+        sss = self.get_source_space()
+        blocks = []
+        for vertices, ss in zip(self.vertices, sss):
+            if ss['dist'] is None:
+                path = self._sss_path()
+                raise RuntimeError(f"Source space does not contain source distance information. To add distance information, run:\nsrc = mne.read_source_spaces({path!r})\nmne.add_source_space_distances(src)\nsrc.save({path!r}, overwrite=True)")
+            # drop distances > max_dist before indexing, which copies the data
+            dist = scipy.sparse.csr_matrix(ss['dist'])
+            keep = dist.data <= max_dist
+            indptr = np.concatenate([[0], np.cumsum(keep)])[dist.indptr]
+            dist = scipy.sparse.csr_matrix((dist.data[keep], dist.indices[keep], indptr), dist.shape)
+            blocks.append(dist[vertices][:, vertices])
+        return scipy.sparse.block_diag(blocks, 'coo')
+
     def _distances(self):
         "Surface distances between source space vertices"
         # don't cache for memory reason (4687 -> 168 MB)
@@ -10863,6 +10960,11 @@ class VolumeSourceSpace(SourceSpaceBase):
         coords = sss[0]['rr'][self.vertices[0]]
         return squareform(pdist(coords))
 
+    def _sparse_distances(self, max_dist: float) -> scipy.sparse.coo_matrix:
+        sss = self.get_source_space()
+        tree = cKDTree(sss[0]['rr'][self.vertices[0]])
+        return tree.sparse_distance_matrix(tree, max_dist, output_type='coo_matrix')
+
     def _array_index(self, arg, allow_vertex=True):
         if isinstance(arg, str):
             if arg in ('lh', 'rh'):
@@ -0,0 +1,95 @@
+# Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+"""Store for the labeled events of each recording
+
+The events of each recording are pickled to a separate file, so that only the
+events of recordings that changed need to be read or written. A small index
+records, for each recording, the raw file modification time, the sampling
+rate, a fingerprint of the definitions used for labeling the events, and a
+digest of the events themselves.
+"""
+import hashlib
+import os
+from pathlib import Path
+from pickle import HIGHEST_PROTOCOL, dumps
+
+from .._data_obj import Dataset
+from .._io.pickle import pickle, unpickle
+from .._types import PathArg
+
+
+def events_digest(events: Dataset) -> tuple[bytes, str]:
+    "Pickled events and their digest"
+    data = dumps(events, HIGHEST_PROTOCOL)
+    return data, hashlib.sha1(data).hexdigest()
+
+
+class EventStore:
+    """Labeled events for each recording
+
+    Parameters
+    ----------
+    path
+        Directory for the store.
+    """
+    def __init__(self, path: PathArg):
+        self.path = Path(path)
+        self._index_path = self.path / 'index.pickle'
+        if self._index_path.exists():
+            self.index = unpickle(self._index_path)
+        else:
+            self.index = {}  # {key: {'raw-mtime', 'sfreq', 'fingerprint', 'digest'}}
+
+    def __contains__(self, key: tuple):
+        return key in self.index
+
+    def _path(self, key: tuple) -> Path:
+        return self.path / f"{hashlib.sha1(repr(key).encode()).hexdigest()[:16]}.pickle"
+
+    def get(self, key: tuple) -> dict | None:
+        "Index entry for ``key``"
+        return self.index.get(key)
+
+    def load(self, key: tuple) -> Dataset:
+        "Events for ``key``"
+        return unpickle(self._path(key))
+
+    def update(
+            self,
+            key: tuple,
+            events: Dataset,
+            fingerprint: str = None,
+    ):
+        "Store events for ``key`` (only writes the events if they changed)"
+        data, digest = events_digest(events)
+        entry = self.index.get(key)
+        if entry is None or entry['digest'] != digest:
+            self.path.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp_path = path.with_suffix('.tmp')
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        self.index[key] = {
+            'raw-mtime': events.info['raw-mtime'],
+            'sfreq': events.info['sfreq'],
+            'fingerprint': fingerprint,
+            'digest': digest,
+        }
+
+    def remove(self, key: tuple):
+        "Remove events for ``key``"
+        del self.index[key]
+        path = self._path(key)
+        if path.exists():
+            path.unlink()
+
+    def clear(self):
+        "Remove all entries"
+        for key in tuple(self.index):
+            self.remove(key)
+
+    def save(self):
+        "Write the index"
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._index_path.with_suffix('.tmp')
+        pickle(self.index, tmp_path)
+        os.replace(tmp_path, self._index_path)
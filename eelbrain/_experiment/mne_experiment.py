@@ -4,17 +4,18 @@ from collections import defaultdict
 import copy
 from datetime import datetime
 from glob import glob
+import hashlib
 import inspect
 from itertools import chain, product
 import logging
 import os
-from os.path import basename, exists, getmtime, isdir, join, relpath
+from os.path import basename, exists, getmtime, isdir, join, relpath, splitext
 from pathlib import Path
 import re
 import shutil
 import time
 from typing import Any, Literal
-from collections.abc import Sequence
+from collections.abc import Callable, Sequence
 
 import numpy as np
 import mne
@@ -30,18 +31,20 @@ from .. import report as _report
 from .. import save
 from .. import table
 from .. import testnd
+from .._config import CONFIG
 from .._data_obj import CellArg, NDVarArg, Datalist, Dataset, Factor, Var, NDVar, SourceSpace, VolumeSourceSpace, align1, all_equal, assert_is_legal_dataset_key, combine
 from .._exceptions import DefinitionError, DimensionMismatchError, OldVersionError
 from .._info import BAD_CHANNELS
 from .._io.pickle import update_subjects_dir
 from .._names import INTERPOLATE_CHANNELS
 from .._meeg import new_rejection_ds
-from .._mne import morph_source_space, shift_mne_epoch_trigger, find_source_subject, label_from_annot
-from ..mne_fixes import write_labels_to_annot, _interpolate_bads_eeg, _interpolate_bads_meg, suppress_mne_warning
+from .._mne import morph_source_space, morph_stcs, shift_mne_epoch_trigger, find_source_subject, label_from_annot
+from ..mne_fixes import InterpolatorCache, write_labels_to_annot, _interpolate_bads_eeg, _interpolate_bads_meg, suppress_mne_warning
 from ..mne_fixes._source_space import merge_volume_source_space, prune_volume_source_space, restrict_volume_source_space
 from ..mne_fixes._version import MNE_VERSION, V1
 from .._ndvar import concatenate, cwt_morlet, neighbor_correlation
 from .._stats.stats import ttest_t
+from .._stats import testnd as _testnd
 from .._stats.testnd import _MergedTemporalClusterDist
 from .._text import enumeration, n_of, plural
 from .._types import PathArg
@@ -50,13 +53,15 @@ from .._utils.mne_utils import fix_annot_names, is_fake_mri
 from .._utils.notebooks import tqdm
 from .covariance import EpochCovariance, RawCovariance
 from .definitions import FieldCode, find_dependent_epochs, find_epochs_vars, log_dict_change, log_list_change, sequence_arg
+from .event_store import EventStore, events_digest
 from .epochs import ContinuousEpoch, PrimaryEpoch, SecondaryEpoch, SuperEpoch, EpochBase, EpochCollection, assemble_epochs, decim_param
 from .exceptions import FileMissingError
 from .experiment import FileTree
 from .groups import assemble_groups
+from .parallel import in_forked_worker, map_forked
 from .parc import SEEDED_PARC_RE, CombinationParc, EelbrainParc, FreeSurferParc, FSAverageParc, SeededParc, IndividualSeededParc, LabelParc, VolumeParc, Parcellation, SubParc, assemble_parcs
 from .preprocessing import (
-    assemble_pipeline, RawPipe, RawSource, RawICA, RawApplyICA, RawFilter,
+    assemble_pipeline, CachedRawPipe, RawPipe, RawSource, RawICA, RawApplyICA, RawFilter,
     compare_pipelines, ask_to_delete_ica_files)
 from .test_def import (
     Test,
@@ -145,6 +150,18 @@ def _time_window_str(window, delim='-'):
     return delim.join(map(_time_str, window))
 
 
+def _cached_samples_suffice(res, samples):
+    "Whether a cached test result is based on sufficient permutations for ``samples``"
+    if res.samples == -1:
+        return True
+    elif samples != 'auto':
+        return res.samples >= samples
+    elif res.samples >= _testnd.SEQUENTIAL_MAX_SAMPLES:
+        return True
+    tests = res.tests.values() if hasattr(res, 'tests') else [res]
+    return all(test._first_cdist is not None and test._first_cdist.sequential for test in tests)
+
+
 def guess_y(ds, default=None):
     "Given a dataset, guess the dependent variable"
     for y in ('srcm', 'src', 'meg', 'eeg'):
@@ -234,6 +251,10 @@ class Pipeline(FileTree):
     # moderate speed gain for loading source estimates (34 subjects: 20 vs 70 s)
     # hard drive space ~ 100 mb/file
     check_raw_mtime: bool = True  # check raw input files' mtime for change
+    lazy_event_check: bool = False
+    # At initialization, only reload events for recordings whose raw file or
+    # event definitions changed; other recordings are checked when their events
+    # are first loaded
 
     # datatype and extension are usually inferred from a BIDS dataset; override here if needed
     datatype: str = None
@@ -477,12 +498,15 @@ class Pipeline(FileTree):
             'cache-dir': join('{deriv-dir}', 'eelbrain', 'cache'),
             'raw-cache-dir': join('{cache-dir}', 'raw', '{subject_session}'),  # hard-coded in RawPipe
             'cached-raw-file': join('{raw-cache-dir}', '{raw_basename}_raw-{raw}.fif'),
+            'cached-raw-lock': join('{raw-cache-dir}', '{raw_basename}_raw-{raw}.lock'),  # hard-coded in cache_lock
 
             'event-file': join('{raw-cache-dir}', '{raw_basename}_raw-{raw}_evts.pickle'),
             'interp-file': join('{raw-cache-dir}', '{raw_basename}_raw-{raw}_interp.pickle'),
 
             # evoked
             'evoked-file': join('{cache-dir}', 'evoked', '{epoch_basename}_raw-{raw}_epoch-{epoch}_rej-{rej}_model-{model}_count-{equalize_evoked_count}_ave.fif'),
+            # evoked source estimates
+            'evoked-stc-file': join('{cache-dir}', 'evoked-stc', '{epoch_basename}_raw-{raw}_epoch-{epoch}_rej-{rej}_model-{model}_count-{equalize_evoked_count}_src-{src}_cov-{cov}_inv-{inv}_stc.pickle'),
 
             # forward modeling:
             'fwd-file': join('{raw-cache-dir}', '{epoch_basename}_mrisubject-{mrisubject}_src-{src}_fwd.fif'),
@@ -727,7 +751,9 @@ class Pipeline(FileTree):
         self._bind_cache('fwd-file', self.make_fwd)
 
         # currently only used for .rm()
-        self._secondary_cache['cached-raw-file'] = ('event-file', 'interp-file')
+        self._secondary_cache['cached-raw-file'] = ('event-file', 'interp-file', 'cached-raw-lock')
+        self._secondary_cache['evoked-file'] = ('evoked-stc-file',)
+        self._secondary_cache['inv-file'] = ('evoked-stc-file',)
 
         ########################################################################
         # Finalize
@@ -758,6 +784,12 @@ class Pipeline(FileTree):
         # ==============================
         events = {}  # {(subject, recording): event_dataset}
         self._stim_channel = sequence_arg(f'{self.__class__.__name__}.stim_channel', self.stim_channel)
+        cache_state_path = join(cache_dir, 'cache-state.pickle')
+        event_store = self._event_store = EventStore(join(cache_dir, 'event-store'))
+        if not exists(cache_state_path):
+            event_store.clear()
+        event_fingerprint = self._event_fingerprint()
+        self._unchecked_events = set()  # recordings whose events are checked when first loaded
 
         # saved mtimes
         input_state_file = join(cache_dir, 'input-state.pickle')
@@ -808,6 +840,13 @@ class Pipeline(FileTree):
                     continue
 
                 # events
+                if self.lazy_event_check and event_fingerprint is not None:
+                    entry = event_store.get(key)
+                    if entry and entry['fingerprint'] == event_fingerprint:
+                        if not (self.check_raw_mtime and mtime_changed(self._raw_mtime(bad_chs=False), entry['raw-mtime'])):
+                            self._raw_samplingrate[key] = entry['sfreq']
+                            self._unchecked_events.add(key)
+                            continue
                 events[key] = events_in = self.load_events(add_bads=False, data_raw=False)
                 self._raw_samplingrate[key] = events_in.info['sfreq']
                 if key not in raw_mtimes or mtime_changed(events_in.info['raw-mtime'], raw_mtimes[key]):
@@ -846,19 +885,9 @@ class Pipeline(FileTree):
 
         # Check the cache, delete invalid files
         # =====================================
-        save_state = new_state = {
-            'version': CACHE_STATE_VERSION,
-            'stim_channel': self._stim_channel,
-            'merge_triggers': self.merge_triggers,
-            'raw': {k: v._as_dict() for k, v in self._raw.items()},
-            'groups': self._groups,
-            'epochs': {k: v._as_dict() for k, v in self._epochs.items()},
-            'tests': {k: v._as_dict() for k, v in self._tests.items()},
-            'parcs': {k: v._as_dict() for k, v in self._parcs.items()},
-            'events': events,
-        }
+        save_state = self._definition_state()
+        new_state = {**save_state, 'events': events}
 
-        cache_state_path = join(cache_dir, 'cache-state.pickle')
         if exists(cache_state_path):
             # check time stamp
             # ================
@@ -870,6 +899,15 @@ class Pipeline(FileTree):
             cache_state_v = cache_state.setdefault('version', 0)
             if cache_state_v != CACHE_STATE_VERSION:
                 raise RuntimeError("The cache is from a different version of Eelbrain than you are currently using. Please delete the cache folder.")
+            if 'events' not in cache_state:
+                # compare reloaded events with the event store
+                cache_state['events'] = old_events = {}
+                for key, entry in event_store.index.items():
+                    if key in self._unchecked_events:
+                        continue
+                    elif key in events and events_digest(events[key])[1] == entry['digest']:
+                        continue
+                    old_events[key] = event_store.load(key)
 
             # Find modified definitions
             # =========================
@@ -880,75 +918,8 @@ class Pipeline(FileTree):
             if invalid_cache:
                 rm = self._collect_invalid_files(invalid_cache, new_state, cache_state)
 
-                # find actual files to delete
-                log.debug("Outdated cache files:")
-                files = set()
-                result_files = []
-                for temp, arg_dicts in rm.items():
-                    for args in arg_dicts:
-                        pattern = self._glob_pattern(temp, True, vmatch=False, **args)
-                        filenames = glob(pattern)
-                        files.update(filenames)
-                        # log
-                        rel_pattern = relpath(pattern, join(self.get('deriv-dir'), 'eelbrain'))
-                        rel_filenames = sorted('  ' + relpath(f, join(self.get('deriv-dir'), 'eelbrain')) for f in filenames)
-                        log.debug(' >%s', rel_pattern)
-                        for filename in rel_filenames:
-                            log.debug(filename)
-                        # message to the screen unless log is already displayed
-                        if rel_pattern.startswith('results'):
-                            result_files.extend(rel_filenames)
-
-                # handle invalid files
-                n_result_files = len(result_files)
-                # Only ask for result files
-                if n_result_files and self.auto_delete_cache == 'auto' and not self.auto_delete_results:
-                    if self._screen_log_level > logging.DEBUG:
-                        msg = ["Outdated result files detected:", *result_files]
-                    else:
-                        msg = []
-                    msg.append(f"Delete {n_result_files} outdated results?")
-                    help_text = CACHE_HELP.format(experiment=self.__class__.__name__, filetype='result')
-                    command = ask('\n'.join(msg), options={'delete': 'delete invalid result files', 'abort': 'raise an error'}, help=help_text)
-                    if command == 'abort':
-                        raise RuntimeError("User aborted invalid result deletion")
-                    elif command != 'delete':
-                        raise RuntimeError(f"{command=}")
-                # Ask for any files
-                if files and self.auto_delete_cache != 'auto':
-                    options = {'delete': 'delete invalid files', 'abort': 'raise an error'}
-                    if self.auto_delete_cache == 'debug':
-                        options.update({'ignore': 'proceed without doing anything', 'revalidate': "don't delete any cache files but write a new cache-state file"})
-                    elif self.auto_delete_cache != 'ask':
-                        raise ValueError(f"{self.__class__.__name__}.auto_delete_cache={self.auto_delete_cache!r}")
-                    help_text = CACHE_HELP.format(experiment=self.__class__.__name__, filetype='cache and/or result')
-                    command = ask("Outdated cache files. Choose 'delete' to proceed. WARNING: only choose 'ignore' or 'revalidate' if you know what you are doing.", options=options, help=help_text)
-                    if command == 'delete':
-                        pass
-                    elif command == 'abort':
-                        raise RuntimeError("User aborted invalid cache deletion")
-                    elif command == 'ignore':
-                        log.warning("Ignoring invalid cache")
-                        return
-                    elif command == 'revalidate':
-                        log.warning("Revalidating invalid cache")
-                        files.clear()
-                    else:
-                        raise RuntimeError(f"{command=}")
-
-                # delete invalid files
-                if files:
-                    n_cache_files = len(files) - n_result_files
-                    descs = []
-                    if n_result_files:
-                        descs.append(f"{n_result_files} invalid result files")
-                    if n_cache_files:
-                        descs.append(f"{n_cache_files} invalid cache files")
-                    log.info(f"Deleting {' and '.join(descs)}...")
-                    for path in files:
-                        os.remove(path)
-                else:
-                    log.debug("No existing cache files affected.")
+                if not self._remove_invalid_files(rm):
+                    return
             else:
                 log.debug("Cache up to date.")
         else:  # cache-dir but no history
@@ -970,8 +941,136 @@ class Pipeline(FileTree):
             else:
                 raise RuntimeError(f"command={command}")
 
+        for key, events_in in events.items():
+            event_store.update(key, events_in, event_fingerprint)
+        for key in tuple(event_store.index):
+            if key not in events and key not in self._unchecked_events:
+                event_store.remove(key)
+        event_store.save()
         save.pickle(save_state, cache_state_path)
 
+    def _definition_state(self):
+        "Definitions relevant for the cache (cache-state without events)"
+        return {
+            'version': CACHE_STATE_VERSION,
+            'stim_channel': self._stim_channel,
+            'merge_triggers': self.merge_triggers,
+            'raw': {k: v._as_dict() for k, v in self._raw.items()},
+            'groups': self._groups,
+            'epochs': {k: v._as_dict() for k, v in self._epochs.items()},
+            'tests': {k: v._as_dict() for k, v in self._tests.items()},
+            'parcs': {k: v._as_dict() for k, v in self._parcs.items()},
+        }
+
+    def _event_fingerprint(self):
+        "Fingerprint of definitions affecting labeled events (None if they can not be determined)"
+        try:
+            sources = [inspect.getsource(getattr(self.__class__, name)) for name in ('fix_events', 'label_events')]
+        except (OSError, TypeError):
+            return None
+        # has_edf is a defaultdict that gains entries as it is queried
+        has_edf = sorted(subject for subject, value in self.has_edf.items() if value)
+        definitions = (sources, repr(self._variables), self._groups, self.trigger_shift, self.merge_triggers, self._stim_channel, self._tasks, self._sessions, has_edf)
+        return hashlib.sha1(repr(definitions).encode()).hexdigest()
+
+    def _check_events(self, keys):
+        "Check events of recordings that were skipped at initialization (``lazy_event_check``)"
+        keys = [key for key in keys if key in self._unchecked_events]
+        if not keys:
+            return
+        self._unchecked_events.difference_update(keys)
+        new_events = {}
+        subjects = sorted({key[0] for key in keys})
+        for key in self.iter(('subject', 'session', 'task', 'acquisition', 'run'), values={'subject': subjects}, raw='raw'):
+            if key in keys:
+                new_events[key] = self.load_events(add_bads=False, data_raw=False)
+        definitions = self._definition_state()
+        new_state = {**definitions, 'events': new_events}
+        cache_state = {**definitions, 'events': {key: self._event_store.load(key) for key in keys}}
+        invalid_cache = self._check_cache(new_state, cache_state, self.root)
+        if invalid_cache:
+            rm = self._collect_invalid_files(invalid_cache, new_state, cache_state)
+            if not self._remove_invalid_files(rm):
+                return
+        for key, events in new_events.items():
+            entry = self._event_store.get(key)
+            self._event_store.update(key, events, entry['fingerprint'])
+        self._event_store.save()
+
+    def _remove_invalid_files(self, rm):
+        "Remove invalid cache files; returns False if the user chose to ignore the invalid cache"
+        log = self._log
+        # find actual files to delete
+        log.debug("Outdated cache files:")
+        files = set()
+        result_files = []
+        for temp, arg_dicts in rm.items():
+            for args in arg_dicts:
+                pattern = self._glob_pattern(temp, True, vmatch=False, **args)
+                filenames = glob(pattern)
+                files.update(filenames)
+                # log
+                rel_pattern = relpath(pattern, join(self.get('deriv-dir'), 'eelbrain'))
+                rel_filenames = sorted('  ' + relpath(f, join(self.get('deriv-dir'), 'eelbrain')) for f in filenames)
+                log.debug(' >%s', rel_pattern)
+                for filename in rel_filenames:
+                    log.debug(filename)
+                # message to the screen unless log is already displayed
+                if rel_pattern.startswith('results'):
+                    result_files.extend(rel_filenames)
+
+        # handle invalid files
+        n_result_files = len(result_files)
+        # Only ask for result files
+        if n_result_files and self.auto_delete_cache == 'auto' and not self.auto_delete_results:
+            if self._screen_log_level > logging.DEBUG:
+                msg = ["Outdated result files detected:", *result_files]
+            else:
+                msg = []
+            msg.append(f"Delete {n_result_files} outdated results?")
+            help_text = CACHE_HELP.format(experiment=self.__class__.__name__, filetype='result')
+            command = ask('\n'.join(msg), options={'delete': 'delete invalid result files', 'abort': 'raise an error'}, help=help_text)
+            if command == 'abort':
+                raise RuntimeError("User aborted invalid result deletion")
+            elif command != 'delete':
+                raise RuntimeError(f"{command=}")
+        # Ask for any files
+        if files and self.auto_delete_cache != 'auto':
+            options = {'delete': 'delete invalid files', 'abort': 'raise an error'}
+            if self.auto_delete_cache == 'debug':
+                options.update({'ignore': 'proceed without doing anything', 'revalidate': "don't delete any cache files but write a new cache-state file"})
+            elif self.auto_delete_cache != 'ask':
+                raise ValueError(f"{self.__class__.__name__}.auto_delete_cache={self.auto_delete_cache!r}")
+            help_text = CACHE_HELP.format(experiment=self.__class__.__name__, filetype='cache and/or result')
+            command = ask("Outdated cache files. Choose 'delete' to proceed. WARNING: only choose 'ignore' or 'revalidate' if you know what you are doing.", options=options, help=help_text)
+            if command == 'delete':
+                pass
+            elif command == 'abort':
+                raise RuntimeError("User aborted invalid cache deletion")
+            elif command == 'ignore':
+                log.warning("Ignoring invalid cache")
+                return False
+            elif command == 'revalidate':
+                log.warning("Revalidating invalid cache")
+                files.clear()
+            else:
+                raise RuntimeError(f"{command=}")
+
+        # delete invalid files
+        if files:
+            n_cache_files = len(files) - n_result_files
+            descs = []
+            if n_result_files:
+                descs.append(f"{n_result_files} invalid result files")
+            if n_cache_files:
+                descs.append(f"{n_cache_files} invalid cache files")
+            log.info(f"Deleting {' and '.join(descs)}...")
+            for path in files:
+                os.remove(path)
+        else:
+            log.debug("No existing cache files affected.")
+        return True
+
     def _restore_state(self, state=-1, discard_tip=True):
         FileTree._restore_state(self, state=state, discard_tip=discard_tip)
         self._update_bids_path()
@@ -1409,6 +1508,27 @@ class Pipeline(FileTree):
             out = max(out, mtime)
         return out
 
+    def _load_group(
+            self,
+            group: str,
+            load: Callable[[], Dataset],  # load data for the current subject
+            desc: str,  # progress bar description
+            parallel: bool = False,  # load subjects in worker processes
+    ) -> list[Dataset]:
+        "Call ``load()`` for each subject in ``group``"
+        if not parallel:
+            return [load() for _ in self.iter(group=group, progress_bar=desc)]
+
+        subjects = [(subject,) for subject in self.iter(group=group)]
+        # check events in the parent process, which maintains the event store
+        self._check_events([key for key in self._unchecked_events if (key[0],) in subjects])
+
+        def load_subject(subject):
+            with self._temporary_state:
+                self.set(subject=subject)
+                return load()
+        return map_forked(load_subject, subjects, desc)
+
     def _process_subject_arg(self, subjects, kwargs):
         """Process subject arg for methods that work on groups and subjects
 
@@ -1979,6 +2099,7 @@ class Pipeline(FileTree):
             tmax: float = None,
             tstop: float = None,
             interpolate_bads: Literal[True, False, 'keep'] = False,
+            parallel: bool = False,
             **state,
     ) -> Dataset:
         """
@@ -2040,6 +2161,10 @@ class Pipeline(FileTree):
         interpolate_bads
             Interpolate channels marked as bad for the whole recording (useful
             when comparing topographies across subjects; default False).
+        parallel
+            When loading a group, load subjects in parallel worker processes
+            (the number of processes is set through :func:`configure`;
+            requires the ``fork`` start method, i.e., not on Windows).
         ...
             Applicable :ref:`state-parameters`:
 
@@ -2064,11 +2189,9 @@ class Pipeline(FileTree):
         epoch_name = self.get('epoch')
 
         if group is not None:
-            dss = []
-            for _ in self.iter(group=group, progress_bar=f"Load {epoch_name}"):
-                ds = self.load_epochs(None, baseline, ndvar, add_bads, reject, cat, samplingrate, decim, pad, data_raw, vardef, data, True, tmin, tmax, tstop, interpolate_bads)
-                dss.append(ds)
-
+            def load_subject():
+                return self.load_epochs(None, baseline, ndvar, add_bads, reject, cat, samplingrate, decim, pad, data_raw, vardef, data, True, tmin, tmax, tstop, interpolate_bads)
+            dss = self._load_group(group, load_subject, f"Load {epoch_name}", parallel)
             return combine(dss)
 
         # single subject
@@ -2189,15 +2312,9 @@ class Pipeline(FileTree):
         if reject and bads_individual:
             assert not variable_tmax
             if 'mag' in sensor_types:
-                interp_path = self.get('interp-file')
-                if exists(interp_path):
-                    interp_cache = load.unpickle(interp_path)
-                else:
-                    interp_cache = {}
-                n_in_cache = len(interp_cache)
-                _interpolate_bads_meg(ds['epochs'], bads_individual, interp_cache)
-                if len(interp_cache) > n_in_cache:
-                    save.pickle(interp_cache, interp_path)
+                interp_cache = InterpolatorCache(self.get('interp-file', mkdir=True))
+                n_workers = 0 if in_forked_worker() else CONFIG['n_workers']
+                _interpolate_bads_meg(ds['epochs'], bads_individual, interp_cache, n_workers)
             if 'eeg' in sensor_types:
                 _interpolate_bads_eeg(ds['epochs'], bads_individual)
 
@@ -2245,6 +2362,7 @@ class Pipeline(FileTree):
             pad: float = 0,
             ndvar: bool = True,
             reject: bool | str = True,
+            parallel: bool = False,
             **state):
         """Load a Dataset with stcs for single epochs
 
@@ -2301,6 +2419,10 @@ class Pipeline(FileTree):
             from the Dataset. Set to ``False`` to ignore the trial rejection.
             Set ``reject='keep'`` to load the rejection (added it to the events
             as ``'accept'`` variable), but keep bad trails.
+        parallel
+            When loading a group, load subjects in parallel worker processes
+            (the number of processes is set through :func:`configure`;
+            requires the ``fork`` start method, i.e., not on Windows).
         ...
             Applicable :ref:`state-parameters`:
 
@@ -2330,10 +2452,14 @@ class Pipeline(FileTree):
                 morph = True
             elif not morph:
                 raise ValueError(f"{morph=} with group: Source estimates can only be combined after morphing data to common brain model. Set morph=True.")
-            dss = []
-            for _ in self.iter(group=group, progress_bar=f"Load {epoch_name} STC"):
-                ds = self.load_epochs_stc(None, baseline, src_baseline, cat, keep_epochs, morph, mask, False, vardef, samplingrate, decim, pad, ndvar, reject)
-                dss.append(ds)
+            if parallel and ndvar:
+                # shared files are made before starting workers
+                with self._temporary_state:
+                    self.make_annot(mrisubject=self.get('common_brain'))
+
+            def load_subject():
+                return self.load_epochs_stc(None, baseline, src_baseline, cat, keep_epochs, morph, mask, False, vardef, samplingrate, decim, pad, ndvar, reject)
+            dss = self._load_group(group, load_subject, f"Load {epoch_name} STC", parallel)
             return combine(dss)
 
         if keep_epochs is True:
@@ -2379,7 +2505,11 @@ class Pipeline(FileTree):
                 common_brain = self.get('common_brain')
                 with self._temporary_state:
                     self.make_annot(mrisubject=common_brain)
-                ndvar_list = [morph_source_space(v, common_brain) for v in ndvar_list]
+                if is_scaled or mrisubject == common_brain:
+                    source_morph = None
+                else:  # use the cached morph for the whole source space
+                    source_morph = self.load_source_morph()
+                ndvar_list = [morph_source_space(v, common_brain, morph=source_morph) for v in ndvar_list]
                 if mask and not is_scaled:
                     ndvar_list = [_mask_ndvar(v) for v in ndvar_list]
                 key = 'srcm'
@@ -2435,6 +2565,8 @@ class Pipeline(FileTree):
         entities = {k: self.get(k) for k in BIDS_ENTITY_KEYS}
         subject = entities['subject']
         session = entities['session']
+        if self._unchecked_events:
+            self._check_events([(subject, session, entities['task'], entities['acquisition'], entities['run'])])
 
         # search for and check cached version
         ds = None
@@ -2493,6 +2625,7 @@ class Pipeline(FileTree):
             data_raw: bool = False,
             vardef: str = None,
             data: DataArg = 'sensor',
+            parallel: bool = False,
             **state):
         """
         Load a Dataset with condition average responses for each subject.
@@ -2529,6 +2662,10 @@ class Pipeline(FileTree):
             Data to load; 'sensor' to load all sensor data (default);
             'sensor.rms' to return RMS over sensors. Only applies to NDVar
             output.
+        parallel
+            When loading a group, load subjects in parallel worker processes
+            (the number of processes is set through :func:`configure`;
+            requires the ``fork`` start method, i.e., not on Windows).
         ...
             Applicable :ref:`state-parameters`:
 
@@ -2562,8 +2699,10 @@ class Pipeline(FileTree):
             # to avoid losing sensors that are not shared
             individual_ndvar = isinstance(data.sensor, str)
             desc = f'by {model}' if model else 'average'
-            dss = [self.load_evoked(None, baseline, individual_ndvar, cat, samplingrate, decim, data_raw, vardef, data)
-                   for _ in self.iter(group=group, progress_bar=f"Load {epoch_name} {desc}")]
+
+            def load_subject():
+                return self.load_evoked(None, baseline, individual_ndvar, cat, samplingrate, decim, data_raw, vardef, data)
+            dss = self._load_group(group, load_subject, f"Load {epoch_name} {desc}", parallel)
             if individual_ndvar:
                 ndvar = False
             elif ndvar:
@@ -2731,6 +2870,7 @@ class Pipeline(FileTree):
             samplingrate: int = None,
             decim: int = None,
             ndvar: bool = True,
+            parallel: bool = False,
             **state):
         """Load evoked source estimates.
 
@@ -2775,6 +2915,10 @@ class Pipeline(FileTree):
         ndvar
             Add the source estimates as NDVar named "src" instead of a list of
             :class:`mne.SourceEstimate` objects named "stc" (default True).
+        parallel
+            When loading a group, load subjects in parallel worker processes
+            (the number of processes is set through :func:`configure`;
+            requires the ``fork`` start method, i.e., not on Windows).
         ...
             Applicable :ref:`state-parameters`:
 
@@ -2792,7 +2936,7 @@ class Pipeline(FileTree):
             state['parc'] = mask
         # load sensor data (needs state in case it has 'group' entry)
         sns_ndvar = 2 if keep_evoked + ndvar > 1 else 0
-        ds = self.load_evoked(subjects, baseline, sns_ndvar, cat, samplingrate, decim, data_raw, vardef, **state)
+        ds = self.load_evoked(subjects, baseline, sns_ndvar, cat, samplingrate, decim, data_raw, vardef, parallel=parallel, **state)
 
         # check baseline
         epoch = self._epochs[self.get('epoch')]
@@ -2830,29 +2974,63 @@ class Pipeline(FileTree):
 
         # convert evoked objects
         method, make_kw, apply_kw = self._inv_params()
-        stcs = []
-        invs = {}
-        for subject, evoked in tqdm(ds.zip('subject', 'evoked'), "Localize", ds.n_cases):
-            # get inv
-            if subject in invs:
-                inv = invs[subject]
-            else:
-                inv = invs[subject] = self.load_inv(evoked, subject=subject)
-
-            # apply inv
-            stc = apply_inverse(evoked, inv, **apply_kw)
-
-            # baseline correction
-            if src_baseline:
-                mne.baseline.rescale(stc._data, stc.times, src_baseline, 'mean', copy=False)
 
+        # source estimates are cached when based on cached evoked responses
+        use_cache = samplingrate is None and decim is None and vardef is None
+        stc_options = repr((baseline, src_baseline, morph and common_brain))
+
+        def localize(subject, evokeds):
+            stc_cache = {}
+            if use_cache:
+                dst = self.get('evoked-stc-file', mkdir=True, subject=subject)
+                if exists(dst) and cache_valid(getmtime(dst), self._evoked_stc_mtime()):
+                    stc_cache = load.unpickle(dst)
+            inv = None
+            subject_stcs = []
+            new = []  # index of new stcs
+            for evoked in evokeds:
+                key = (evoked.comment, stc_options)
+                stc = stc_cache.get(key)
+                if stc is not None and len(stc.times) == len(evoked.times) and np.isclose(stc.tmin, evoked.times[0]):
+                    subject_stcs.append(stc)
+                    continue
+                if inv is None:
+                    inv = self.load_inv(evokeds[0], subject=subject)
+                stc = apply_inverse(evoked, inv, **apply_kw)
+                # baseline correction
+                if src_baseline:
+                    mne.baseline.rescale(stc._data, stc.times, src_baseline, 'mean', copy=False)
+                new.append(len(subject_stcs))
+                subject_stcs.append(stc)
+            if not new:
+                return subject_stcs
             if morph:
                 subject_from = from_subjects[subject]
                 if subject_from == common_brain:
-                    stc.subject = common_brain
-                else:
-                    stc = source_morphs[subject_from].apply(stc)
-            stcs.append(stc)
+                    for i in new:
+                        subject_stcs[i].subject = common_brain
+                else:  # morph all new stcs at once
+                    morphed = morph_stcs(source_morphs[subject_from], [subject_stcs[i] for i in new])
+                    for i, stc in zip(new, morphed):
+                        subject_stcs[i] = stc
+            for i in new:
+                stc_cache[evokeds[i].comment, stc_options] = subject_stcs[i]
+            if use_cache:
+                save.pickle(stc_cache, dst)
+            return subject_stcs
+
+        subject_index = defaultdict(list)
+        for i, subject in enumerate(ds['subject']):
+            subject_index[subject].append(i)
+        items = [(subject, [ds[i, 'evoked'] for i in index]) for subject, index in subject_index.items()]
+        if parallel:
+            subject_stcs = map_forked(localize, items, "Localize")
+        else:
+            subject_stcs = [localize(*item) for item in tqdm(items, "Localize")]
+        stcs = [None] * ds.n_cases
+        for index, stcs_i in zip(subject_index.values(), subject_stcs):
+            for i, stc in zip(index, stcs_i):
+                stcs[i] = stc
 
         # add to Dataset
         if ndvar:
@@ -3676,7 +3854,7 @@ class Pipeline(FileTree):
             pmin: PMinArg = None,
             parc: str = None,
             mask: str = None,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             data: str = 'source',
             baseline: BaselineArg = True,
             smooth: float = None,
@@ -3720,7 +3898,9 @@ class Pipeline(FileTree):
             Number of random permutations of the data used to determine cluster
             *p*-values (default 10'000). If the test is already cached with a
             number ≥ ``samples`` the cached version is returned, otherwise the
-            test is recomputed.
+            test is recomputed. With ``'auto'``, permutations stop as soon as
+            all *p*-values are resolved relative to *p* = .05 (not available
+            for ROI tests).
         data
             Data to test, for example:
 
@@ -3790,6 +3970,8 @@ class Pipeline(FileTree):
     ):
         "Load a cached test after _set_analysis_options() has been called"
         test_obj = self._tests[test]
+        if samples == 'auto' and isinstance(data.source, str):
+            raise NotImplementedError(f"{samples=} for ROI tests")
 
         dst = self.get('test-file', mkdir=True)
 
@@ -3804,7 +3986,7 @@ class Pipeline(FileTree):
             except OldVersionError:
                 res = None
             else:
-                if res.samples >= samples or res.samples == -1:
+                if _cached_samples_suffice(res, samples):
                     self._log.info("Load cached test: %s", desc)
                     if not return_data:
                         return res
@@ -3843,35 +4025,38 @@ class Pipeline(FileTree):
         else:
             test_kwargs = None
 
-        if isinstance(test_obj, TwoStageTest):
-            if smooth:
-                raise NotImplementedError(f"{smooth=}: smoothing for two-stage tests")
-            if isinstance(data.source, str):
-                res_data, res = self._make_test_rois_2stage(baseline, src_baseline, test_obj, samples, test_kwargs, res, data, return_data, samplingrate)
-            elif data.source is True:
-                res_data, res = self._make_test_2stage(baseline, src_baseline, mask, test_obj, test_kwargs, res, data, return_data, samplingrate)
-            else:
-                raise NotImplementedError(f"Two-stage test with data={data.string!r}")
-        elif isinstance(data.source, str):
-            if smooth:
-                raise TypeError(f"{smooth=} for ROI tests")
-            res_data, res = self._make_test_rois(baseline, src_baseline, test_obj, samples, pmin, test_kwargs, res, data, samplingrate)
-        else:
-            if data.sensor:
-                res_data = self.load_evoked(True, baseline, True, test_obj.cat, samplingrate, data=data, vardef=test_obj.vars)
-                if len(res_data.info['sensor_types']) > 1:
-                    desc = ', '.join(res_data.info['sensor_types'])
-                    raise RuntimeError(f"Data contains more than one sensor type ({desc}). Mass-univariate tests are not designed for multiple sensor types. Use the data argument to perform test on one sensor type.")
-            elif data.source:
-                res_data = self.load_evoked_stc(True, baseline, src_baseline, test_obj.cat, morph=True, mask=mask, vardef=test_obj.vars, samplingrate=samplingrate)
+        # resume interrupted permutation tests
+        checkpoint_dir = f'{splitext(dst)[0]} checkpoints' if do_test else None
+        with testnd.permutation_checkpoints(checkpoint_dir):
+            if isinstance(test_obj, TwoStageTest):
                 if smooth:
-                    res_data[data.y_name] = res_data[data.y_name].smooth('source', smooth, 'gaussian')
+                    raise NotImplementedError(f"{smooth=}: smoothing for two-stage tests")
+                if isinstance(data.source, str):
+                    res_data, res = self._make_test_rois_2stage(baseline, src_baseline, test_obj, samples, test_kwargs, res, data, return_data, samplingrate)
+                elif data.source is True:
+                    res_data, res = self._make_test_2stage(baseline, src_baseline, mask, test_obj, test_kwargs, res, data, return_data, samplingrate)
+                else:
+                    raise NotImplementedError(f"Two-stage test with data={data.string!r}")
+            elif isinstance(data.source, str):
+                if smooth:
+                    raise TypeError(f"{smooth=} for ROI tests")
+                res_data, res = self._make_test_rois(baseline, src_baseline, test_obj, samples, pmin, test_kwargs, res, data, samplingrate)
             else:
-                raise ValueError(f"data={data.string!r}")
+                if data.sensor:
+                    res_data = self.load_evoked(True, baseline, True, test_obj.cat, samplingrate, data=data, vardef=test_obj.vars)
+                    if len(res_data.info['sensor_types']) > 1:
+                        desc = ', '.join(res_data.info['sensor_types'])
+                        raise RuntimeError(f"Data contains more than one sensor type ({desc}). Mass-univariate tests are not designed for multiple sensor types. Use the data argument to perform test on one sensor type.")
+                elif data.source:
+                    res_data = self.load_evoked_stc(True, baseline, src_baseline, test_obj.cat, morph=True, mask=mask, vardef=test_obj.vars, samplingrate=samplingrate)
+                    if smooth:
+                        res_data[data.y_name] = res_data[data.y_name].smooth('source', smooth, 'gaussian')
+                else:
+                    raise ValueError(f"data={data.string!r}")
 
-            if do_test:
-                self._log.info("Make test: %s", desc)
-                res = self._make_test(data.y_name, res_data, test_obj, test_kwargs)
+                if do_test:
+                    self._log.info("Make test: %s", desc)
+                    res = self._make_test(data.y_name, res_data, test_obj, test_kwargs)
 
         if do_test:
             save.pickle(res, dst)
@@ -4846,6 +5031,114 @@ class Pipeline(FileTree):
                         folder="{parc} {mrisubject} %s" % surf, resname=label,
                         ext='png')
 
+    def make_raw_cache(
+            self,
+            raw: str | Sequence[str] = None,
+            subjects: str | int = None,
+            max_memory: float = None,
+            **state,
+    ) -> None:
+        """Make all missing cached raw files for one or more raw pipes
+
+        Parameters
+        ----------
+        raw
+            Raw preprocessing pipe(s) for which to make the cache (default is
+            the current ``raw`` state).
+        subjects
+            Subject(s) for which to make the cache. Can be a single subject
+            name or a group name such as ``'all'``. ``1`` to use the current
+            subject; ``-1`` for the current group. Default is current subject
+            (or group if ``group`` is specified).
+        max_memory
+            Memory budget in GB for making raw files concurrently (default no
+            limit). The number of worker processes is limited so that the
+            estimated memory used by the recordings processed at the same time
+            stays within this limit.
+        ...
+            State parameters.
+
+        Notes
+        -----
+        Usually, cached raw files are made on demand, when they are first
+        needed. This method determines all missing or outdated cache files,
+        including those of intermediate pipes (e.g., the source of a
+        :class:`pipeline.RawApplyICA` pipe), and makes them in worker
+        processes (see :func:`configure`). Files of each pipe are made only
+        after the files of its source pipe.
+
+        While a cache file is made, it is locked, so that separate jobs
+        sharing the same cache directory never make the same file twice or
+        read a file that is incomplete.
+        """
+        if raw is None:
+            raws = [self.get('raw', **state)]
+        elif isinstance(raw, str):
+            raws = [raw]
+        else:
+            raws = list(raw)
+        subject, group = self._process_subject_arg(subjects, state)
+        missing = [raw for raw in raws if raw not in self._raw]
+        if missing:
+            raise ValueError(f"raw={enumeration(missing)}: no such raw pipe")
+        # plan: find missing cache files, assigning each to a dependency level
+        jobs = {}  # {(recording, pipe_name): (level, bids_path, pipe)}
+        unavailable = []
+
+        def plan(key, bids_path, pipe) -> int | None:
+            "Level of the job making the cache for pipe (None if nothing needs to be made)"
+            if not isinstance(pipe, CachedRawPipe):
+                return None
+            elif (key, pipe.name) in jobs:
+                return jobs[key, pipe.name][0]
+            elif pipe._cache and pipe.is_cached(bids_path):
+                return None
+            elif not pipe.mtime(bids_path):
+                unavailable.append((key, pipe.name))
+                return None
+            source_level = plan(key, bids_path, pipe.source)
+            if not pipe._cache:
+                return source_level
+            level = 0 if source_level is None else source_level + 1
+            jobs[key, pipe.name] = (level, bids_path.copy(), pipe)
+            return level
+
+        fields = ('subject', 'session', 'task', 'acquisition', 'run')
+        if subject:
+            iter_kwargs = {'values': {'subject': [subject]}}
+        else:
+            iter_kwargs = {'group': group}
+        with self._temporary_state:
+            for key in self.iter(fields, **iter_kwargs):
+                for raw in raws:
+                    plan(key, self._bids_path, self._raw[raw])
+        for key, raw in unavailable:
+            self._log.warning("Can not make raw=%r cache for %s: input files are missing", raw, ' '.join(filter(None, key)))
+        if not jobs:
+            return
+
+        # make the cache files for each level
+        n_levels = max(level for level, _, _ in jobs.values()) + 1
+        for i_level in range(n_levels):
+            level_jobs = [(bids_path, pipe) for level, bids_path, pipe in jobs.values() if level == i_level]
+            if max_memory:
+                job_bytes = max(self._raw_memory_estimate(bids_path) for bids_path, _ in level_jobs)
+                max_workers = max(1, int(max_memory * 1e9 // job_bytes))
+            else:
+                max_workers = None
+
+            def make(i):
+                bids_path, pipe = level_jobs[i]
+                pipe.load(bids_path, add_bads=False)
+            items = [(i,) for i in range(len(level_jobs))]
+            map_forked(make, items, f"Raw cache ({i_level + 1}/{n_levels})", max_workers)
+
+    def _raw_memory_estimate(self, bids_path: BIDSPath) -> float:
+        "Estimated memory (in bytes) for making one cached raw file"
+        raw = self._raw['raw'].load(bids_path, add_bads=False)
+        # input and output data in float64
+        return 2 * 8 * raw.info['nchan'] * raw.n_times
+
     def make_epoch_selection(
             self,
             samplingrate: int = None,
@@ -4989,11 +5282,17 @@ class Pipeline(FileTree):
         else:
             meta = fmtxt.read_meta(dst)
             if 'samples' in meta:
-                if int(meta['samples']) >= samples:
+                if meta['samples'] == 'auto':
+                    up_to_date = samples == 'auto'
+                elif samples == 'auto':
+                    up_to_date = int(meta['samples']) >= _testnd.SEQUENTIAL_MAX_SAMPLES
+                else:
+                    up_to_date = int(meta['samples']) >= samples
+                if up_to_date:
                     self._log.debug("Report up to date: %s", desc)
                     return True
                 else:
-                    self._log.debug("Report file used %s samples, recomputing with %i: %s", meta['samples'], samples, desc)
+                    self._log.debug("Report file used %s samples, recomputing with %s: %s", meta['samples'], samples, desc)
             else:
                 self._log.debug("Report created prior to Eelbrain 0.25, can not check number of samples. Delete manually to recompute: %s", desc)
                 return True
@@ -5006,7 +5305,7 @@ class Pipeline(FileTree):
             pmin: str = None,
             tstart: float = None,
             tstop: float = None,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             baseline: BaselineArg = True,
             src_baseline: BaselineArg = None,
             include: float = 0.2,
@@ -5046,7 +5345,10 @@ class Pipeline(FileTree):
             (default is the end of the epoch).
         samples
             Number of samples used to determine cluster p values for spatio-
-            temporal clusters (default 10,000).
+            temporal clusters (default 10,000). With ``'auto'``, permutations
+            stop as soon as all *p*-values are resolved relative to *p* = .05,
+            and the number of permutations actually used is listed in the
+            report.
         baseline
             Apply baseline correction using this period in sensor space.
             True to use the epoch's baseline specification (default).
@@ -5066,7 +5368,7 @@ class Pipeline(FileTree):
         --------
         load_test : load corresponding data and tests
         """
-        if samples < 1:
+        if samples != 'auto' and samples < 1:
             raise ValueError(f"{samples=}: needs to be > 0")
         elif include <= 0 or include > 1:
             raise ValueError(f"{include=}: needs to be 0 < include <= 1")
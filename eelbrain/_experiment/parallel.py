@@ -0,0 +1,63 @@
+# Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+"""Run pipeline steps in forked worker processes
+
+The pipeline state (the experiment instance) is not picklable in general, so
+worker processes are forked to inherit it from the parent process.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from collections.abc import Callable, Sequence
+from typing import Any
+
+from .._config import CONFIG, tqdm_disable
+from .._utils.notebooks import tqdm
+
+
+# Function called by forked worker processes (set while a pool is running)
+_FORKED_FUNC = None
+
+
+def _call_forked(args: tuple) -> Any:
+    return _FORKED_FUNC(*args)
+
+
+def in_forked_worker() -> bool:
+    "Whether the current process is running a task from :func:`map_forked`"
+    return _FORKED_FUNC is not None
+
+
+def n_fork_workers(n_tasks: int, max_workers: int = None) -> int:
+    "Number of worker processes to use for n_tasks (0 to run in the current process)"
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return 0
+    n_workers = min(CONFIG['n_workers'] or 0, n_tasks)
+    if max_workers is not None:
+        n_workers = min(n_workers, max_workers)
+    return n_workers if n_workers > 1 else 0
+
+
+def map_forked(
+        func: Callable,
+        items: Sequence[tuple],  # arguments for func
+        desc: str = None,  # progress bar description
+        max_workers: int = None,  # limit the number of workers below CONFIG['n_workers']
+) -> list:
+    """Call ``func(*item)`` for each item, in forked worker processes
+
+    Results are returned in the order of ``items``. ``func`` can be a closure
+    using objects that can not be pickled (only ``items`` and the return
+    values are pickled). Without the ``fork`` start method, if
+    ``CONFIG['n_workers']`` allows only one process, or when called from a
+    worker process, items are processed in the current process.
+    """
+    global _FORKED_FUNC
+
+    n_workers = n_fork_workers(len(items), max_workers)
+    if not n_workers or in_forked_worker():
+        return [func(*item) for item in tqdm(items, desc, disable=tqdm_disable() or desc is None)]
+    _FORKED_FUNC = func
+    try:
+        with ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            return list(tqdm(executor.map(_call_forked, items), desc, len(items), disable=tqdm_disable() or desc is None))
+    finally:
+        _FORKED_FUNC = None
@@ -7,6 +7,7 @@ Entity information: BIDSPath object as a parameter
 """
 from __future__ import annotations
 import warnings
+from contextlib import contextmanager
 from copy import deepcopy
 import fnmatch
 from itertools import chain
@@ -15,9 +16,15 @@ from os import makedirs, remove
 from os.path import basename, dirname, exists, getmtime
 from pathlib import Path
 from typing import Any
-from collections.abc import Sequence
+from collections.abc import Callable, Sequence
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 import mne
+from mne.filter import _filt_check_picks, _filt_update_info
+import numpy as np
 from scipy import signal
 from mne_bids import BIDSPath, mark_channels
 import pandas as pd
@@ -38,6 +45,37 @@ MNE_VERBOSITY = 'WARNING'
 AddBadsArg = bool | Sequence[str]
 
 
+@contextmanager
+def cache_lock(cache_path: str, exclusive: bool):
+    """Lock a cached raw file
+
+    Readers hold a shared lock while checking and opening the file, the process
+    making the file holds an exclusive lock until the file is completely
+    written. The lock is held on a separate ``*.lock`` file, so that it works
+    across processes and hosts sharing the cache directory. If the lock file
+    can not be created (e.g., on a read-only cache), readers proceed without
+    lock, since no other process can write to the cache either.
+
+    The lock only covers opening the file; data of a raw file opened with
+    ``preload=False`` are read from disk later, outside the lock.
+    """
+    if fcntl is None:
+        makedirs(dirname(cache_path), exist_ok=True)
+        yield
+        return
+    try:
+        makedirs(dirname(cache_path), exist_ok=True)
+        fid = open(cache_path[:-3] + 'lock', 'a')
+    except OSError:
+        if exclusive:
+            raise
+        yield
+        return
+    with fid:
+        fcntl.flock(fid, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
 class RawPipe:
     name: str = None  # set on linking
     log: logging.Logger = None
@@ -411,6 +449,129 @@ class RawSource(RawPipe):
             return getmtime(raw_path)
 
 
+class BlockFilteredRaw(mne.io.BaseRaw):
+    """Raw data that are filtered block by block when they are read
+
+    Used for writing filtered raw data to a cache file without loading the
+    whole recording into memory.
+
+    Parameters
+    ----------
+    raw
+        Source data (not preloaded).
+    make_block
+        ``make_block(start, stop)`` returns the filtered data for the samples
+        ``start:stop``. Blocks are requested in ascending order when the data
+        are read sequentially.
+    block_size
+        Number of samples per block.
+    """
+    def __init__(
+            self,
+            raw: mne.io.BaseRaw,
+            make_block: Callable[[int, int], np.ndarray],
+            block_size: int,
+    ):
+        mne.io.BaseRaw.__init__(self, raw.info.copy(), False, (raw.first_samp,), (raw.last_samp,), orig_format=raw.orig_format, buffer_size_sec=raw.buffer_size_sec, verbose=False)
+        self.set_annotations(raw.annotations)
+        self._make_block = make_block
+        self._block_size = block_size
+        self._block = None  # (index, data)
+
+    def _read_segment(self, start=0, stop=None, sel=None, data_buffer=None, *, verbose=None):
+        start = int(start)
+        stop = self.n_times if stop is None else min(int(stop), self.n_times)
+        out = np.empty((self.info['nchan'], stop - start))
+        i = start
+        while i < stop:
+            i_block = i // self._block_size
+            block_start = i_block * self._block_size
+            if self._block is None or self._block[0] != i_block:
+                block_stop = min(block_start + self._block_size, self.n_times)
+                self._block = (i_block, self._make_block(block_start, block_stop))
+            i_stop = min(stop, block_start + self._block_size)
+            out[:, i - start:i_stop - start] = self._block[1][:, i - block_start:i_stop - block_start]
+            i = i_stop
+        if sel is not None:
+            out = out[sel]
+        if isinstance(data_buffer, np.ndarray):
+            data_buffer[:] = out
+            return data_buffer
+        return out
+
+
+def fir_filtered_raw(
+        raw: mne.io.BaseRaw,
+        l_freq: float | None,
+        h_freq: float | None,
+        block_duration: float,
+        n_jobs: int | str | None = 1,
+        **kwargs,
+) -> BlockFilteredRaw | None:
+    """FIR-filter ``raw`` in overlapping blocks (equivalent to :meth:`mne.io.Raw.filter`)
+
+    Returns ``None`` if the filter can not be applied in blocks (IIR filters
+    and recordings with discontinuities).
+    """
+    kwargs = dict(kwargs)
+    if kwargs.get('method', 'fir') != 'fir':
+        return None
+    skip = kwargs.pop('skip_by_annotation', ('edge', 'bad_acq_skip'))
+    if isinstance(skip, str):
+        skip = (skip,)
+    if any(description.startswith(tuple(skip)) for description in raw.annotations.description):
+        return None
+    sfreq = raw.info['sfreq']
+    block_size = int(round(block_duration * sfreq))
+    if raw.n_times <= block_size:
+        return None
+    if kwargs.get('pad', 'reflect_limited') is None:
+        kwargs['pad'] = 'edge'
+    update_info, picks = _filt_check_picks(raw.info, kwargs.pop('picks', None), l_freq, h_freq)
+    # padding on both sides of each block to cover the filter's impulse response
+    fir_kwargs = {key: kwargs[key] for key in ('filter_length', 'l_trans_bandwidth', 'h_trans_bandwidth', 'phase', 'fir_window', 'fir_design') if key in kwargs}
+    h = mne.filter.create_filter(None, sfreq, l_freq, h_freq, **fir_kwargs, verbose='error')
+    n_pad = len(h)
+
+    def make_block(start, stop):
+        pad_start = max(0, start - n_pad)
+        pad_stop = min(raw.n_times, stop + n_pad)
+        x = raw[:, pad_start:pad_stop][0]
+        mne.filter.filter_data(x, sfreq, l_freq, h_freq, picks, n_jobs=n_jobs, copy=False, verbose='error', **kwargs)
+        return x[:, start - pad_start:stop - pad_start]
+
+    out = BlockFilteredRaw(raw, make_block, block_size)
+    _filt_update_info(out.info, update_info, l_freq, h_freq)
+    return out
+
+
+def sos_filtered_raw(
+        raw: mne.io.BaseRaw,
+        sos: np.ndarray,
+        picks: np.ndarray,
+        block_duration: float,
+) -> BlockFilteredRaw:
+    "Apply a causal ``sos`` filter to ``raw`` in blocks, carrying over the filter state"
+    block_size = int(round(block_duration * raw.info['sfreq']))
+    zi_init = np.zeros((len(sos), len(picks), 2))
+    state = {'stop': 0, 'zi': zi_init}
+
+    def filter_block(start, stop):
+        x = raw[:, start:stop][0]
+        x[picks], state['zi'] = signal.sosfilt(sos, x[picks], zi=state['zi'])
+        state['stop'] = stop
+        return x
+
+    def make_block(start, stop):
+        if start < state['stop']:  # restart
+            state['stop'], state['zi'] = 0, zi_init
+        while state['stop'] < start:
+            filter_block(state['stop'], min(start, state['stop'] + block_size))
+        return filter_block(start, stop)
+
+    return BlockFilteredRaw(raw, make_block, block_size)
+
+
 class CachedRawPipe(RawPipe):
     _bad_chs_affect_cache: bool = False
     # set on linking
@@ -462,35 +623,40 @@ class CachedRawPipe(RawPipe):
         # Resolve empty room path for actual file reading, not for _make()
         if not self._cache:
             return self._make(path, preload, noise=noise)
-        cache_path = self._cache_path(path if not noise else path.find_empty_room())
-        if self.is_cached(path if not noise else path.find_empty_room()):
-            with warnings.catch_warnings():  # BIDS paths are not covered by mne standard
-                warnings.filterwarnings('ignore', 'This filename', module='mne')
-                raw = mne.io.read_raw_fif(
-                    cache_path,
-                    preload=preload,
-                    verbose=MNE_VERBOSITY,
-                )
-        else:
+        cache_bids_path = path if not noise else path.find_empty_room()
+        cache_path = self._cache_path(cache_bids_path)
+        with cache_lock(cache_path, exclusive=False):
+            if self.is_cached(cache_bids_path):
+                return self._read_cache(cache_path, preload)
+        with cache_lock(cache_path, exclusive=True):
+            # another process might have made the file while we were waiting
+            if self.is_cached(cache_bids_path):
+                return self._read_cache(cache_path, preload)
             from .. import __version__
-            # make sure the target directory exists
-            makedirs(dirname(cache_path), exist_ok=True)
             # generate new raw
             with CaptureLog(cache_path[:-3] + 'log') as logger:
                 logger.info(f"eelbrain {__version__}")
                 logger.info(f"mne {mne.__version__}")
                 logger.info(repr(self._as_dict()))
-                raw = self._make(path, True, noise=noise)
-            # save
-            try:
-                raw.save(cache_path, overwrite=True, verbose='ERROR')
-            except BaseException:
-                # clean up potentially corrupted file
-                if exists(cache_path):
-                    remove(cache_path)
-                raise
+                raw = self._make_cache(path, noise=noise)
+                # save
+                try:
+                    raw.save(cache_path, overwrite=True, verbose='ERROR')
+                except BaseException:
+                    # clean up potentially corrupted file
+                    if exists(cache_path):
+                        remove(cache_path)
+                    raise
+            if not raw.preload:
+                raw = self._read_cache(cache_path, preload)
         return raw
 
+    @staticmethod
+    def _read_cache(cache_path: str, preload: bool) -> mne.io.BaseRaw:
+        with warnings.catch_warnings():  # BIDS paths are not covered by mne standard
+            warnings.filterwarnings('ignore', 'This filename', module='mne')
+            return mne.io.read_raw_fif(cache_path, preload=preload, verbose=MNE_VERBOSITY)
+
     def load_info(self, path: BIDSPath) -> mne.Info:
         return self.source.load_info(path)
 
@@ -505,6 +671,14 @@ class CachedRawPipe(RawPipe):
     ) -> mne.io.BaseRaw:
         raise NotImplementedError
 
+    def _make_cache(
+            self,
+            path: BIDSPath,
+            noise: bool = False,
+    ) -> mne.io.BaseRaw:
+        "Make the raw data for the cache file (can return a raw that is not preloaded)"
+        return self._make(path, True, noise=noise)
+
     def make_bad_channels(
             self,
             path: BIDSPath,
@@ -558,6 +732,12 @@ class RawFilter(CachedRawPipe):
     n_jobs
         Parameter for :meth:`mne.io.Raw.filter`; Values other than 1 are slower
         in most cases due to added overhead except for very large files.
+    block_duration
+        When making the cache file, read and filter the data in blocks of this
+        duration (in seconds) instead of loading the whole recording into
+        memory (default is to load the whole recording). This reduces memory
+        usage for long recordings. Only applies to FIR filters, and to
+        recordings without discontinuities.
     ...
         :meth:`mne.io.Raw.filter` parameters.
 
@@ -573,12 +753,14 @@ class RawFilter(CachedRawPipe):
             h_freq: float = None,
             cache: bool = True,
             n_jobs: str | int | None = 1,
+            block_duration: float = None,
             **kwargs,
     ):
         CachedRawPipe.__init__(self, source, cache)
         self.args = (l_freq, h_freq)
         self.kwargs = kwargs
         self.n_jobs = n_jobs
+        self.block_duration = block_duration
         # mne backwards compatibility (fir_design default change 0.15 -> 0.16)
         if 'use_kwargs' in kwargs:
             self._use_kwargs = kwargs.pop('use_kwargs')
@@ -599,6 +781,19 @@ class RawFilter(CachedRawPipe):
         raw.filter(*self.args, **self._use_kwargs, n_jobs=self.n_jobs, verbose=MNE_VERBOSITY)
         return raw
 
+    def _make_cache(
+            self,
+            path: BIDSPath,
+            noise: bool = False,
+    ) -> mne.io.BaseRaw:
+        if self.block_duration:
+            raw = self.source.load(path, noise=noise)
+            out = fir_filtered_raw(raw, *self.args, self.block_duration, self.n_jobs, **self._use_kwargs)
+            if out is not None:
+                self.log.info("Raw %s: filtering in blocks for %s...", self.name, path.fpath if not noise else path.find_empty_room().fpath)
+                return out
+        return self._make(path, True, noise=noise)
+
     def load_info(self, path: BIDSPath) -> mne.Info:
         info = super().load_info(path)
         l_freq, h_freq = self.args
@@ -616,9 +811,10 @@ class RawFilter(CachedRawPipe):
 
 class RawFilterElliptic(CachedRawPipe):
 
-    def __init__(self, source, low_stop, low_pass, high_pass, high_stop, gpass, gstop):
+    def __init__(self, source, low_stop, low_pass, high_pass, high_stop, gpass, gstop, block_duration=None):
         CachedRawPipe.__init__(self, source)
         self.args = (low_stop, low_pass, high_pass, high_stop, gpass, gstop)
+        self.block_duration = block_duration  # filter in blocks when making the cache
 
     def _sos(self, sfreq):
         nyq = sfreq / 2.
@@ -667,14 +863,31 @@ class RawFilterElliptic(CachedRawPipe):
         sos = self._sos(raw.info['sfreq'])
         for i in picks:
             raw._data[i] = signal.sosfilt(sos, raw._data[i])
-        # update info
-        low, high = self.args[1], self.args[2]
-        if high and raw.info['lowpass'] > high:
-            raw.info['lowpass'] = float(high)
-        if low and raw.info['highpass'] < low:
-            raw.info['highpass'] = float(low)
+        self._update_info(raw.info)
         return raw
 
+    def _make_cache(
+            self,
+            path: BIDSPath,
+            noise: bool = False,
+    ) -> mne.io.BaseRaw:
+        if not self.block_duration:
+            return self._make(path, True, noise=noise)
+        raw = self.source.load(path, noise=noise)
+        self.log.info("Raw %s: filtering in blocks for %s...", self.name, path.fpath if not noise else path.find_empty_room().fpath)
+        picks = mne.pick_types(raw.info, meg=True, eeg=True, ref_meg=True)
+        out = sos_filtered_raw(raw, self._sos(raw.info['sfreq']), picks, self.block_duration)
+        self._update_info(out.info)
+        return out
+
+    def _update_info(self, info: mne.Info) -> None:
+        low, high = self.args[1], self.args[2]
+        with info._unlock():
+            if high and info['lowpass'] > high:
+                info['lowpass'] = float(high)
+            if low and info['highpass'] < low:
+                info['highpass'] = float(low)
+
     def _as_dict(self, args: Sequence[str] = ()) -> dict:
         return CachedRawPipe._as_dict(self, [*args, 'args'])
 
@@ -1,9 +1,23 @@
 # Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
 from itertools import product
+import multiprocessing
 import os
+from pathlib import Path
+import shutil
+from warnings import catch_warnings, filterwarnings
 
-from eelbrain.testing import TempDir
+import mne
+from mne_bids import BIDSPath, write_raw_bids
+import numpy as np
+import pytest
+
+from eelbrain import Factor, Pipeline, datasets, load, save
+from eelbrain._config import CONFIG
+from eelbrain.pipeline import PrimaryEpoch
+from eelbrain.testing import TempDir, assert_dataset_equal
 from eelbrain._experiment import TreeModel, FileTree
+from eelbrain._experiment.event_store import EventStore
+from eelbrain._experiment.parallel import map_forked
 
 
 class Tree(TreeModel):
@@ -170,3 +184,161 @@ def test_file_tree():
     for fname in tree.iter_temp('a-file', folder='f2'):
         assert fname[-6:-4] == tree.get('name')
         assert os.path.exists(fname)
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason="requires fork")
+def test_map_forked(monkeypatch):
+    "Test calling closures in forked worker processes"
+    pid = os.getpid()
+    tree = Tree()
+
+    def func(value):
+        with tree._temporary_state:
+            tree.set(afield=value)
+            return tree.get('apath'), os.getpid() != pid
+
+    items = [(value,) for value in ('a3', 'a1', 'a2', 'a1')]
+    monkeypatch.setitem(CONFIG, 'n_workers', 2)
+    out = map_forked(func, items)
+    assert [path for path, _ in out] == ['/a3/', '/a1/', '/a2/', '/a1/']
+    assert all(in_worker for _, in_worker in out)
+    assert tree.get('afield') == 'a1'
+    # without multiprocessing
+    monkeypatch.setitem(CONFIG, 'n_workers', 1)
+    out = map_forked(func, items)
+    assert [path for path, _ in out] == ['/a3/', '/a1/', '/a2/', '/a1/']
+    assert not any(in_worker for _, in_worker in out)
+
+
+def test_event_store():
+    "Test storing events per recording"
+    tempdir = TempDir()
+    ds = datasets.get_uts()
+    ds.info.update({'raw-mtime': 1.5, 'sfreq': 100})
+    key = ('R0001', None, 'task', None, None)
+    store = EventStore(tempdir)
+    store.update(key, ds, 'abc')
+    store.save()
+    assert store.get(key)['sfreq'] == 100
+    # reload
+    store = EventStore(tempdir)
+    assert key in store
+    assert store.get(key)['fingerprint'] == 'abc'
+    assert_dataset_equal(store.load(key), ds)
+    # unchanged events are not rewritten
+    path = store._path(key)
+    mtime = path.stat().st_mtime_ns
+    store.update(key, ds, 'abd')
+    assert path.stat().st_mtime_ns == mtime
+    assert store.get(key)['fingerprint'] == 'abd'
+    ds2 = ds[:10]
+    store.update(key, ds2)
+    assert_dataset_equal(store.load(key), ds2)
+    # remove
+    store.clear()
+    store.save()
+    assert not path.exists()
+    assert key not in EventStore(tempdir)
+
+
+class EventPipeline(Pipeline):
+    stim_channel = 'STI 014'
+    lazy_event_check = True
+    variables = {'kind': {1: 'a', 2: 'b'}}
+    epochs = {'epoch': PrimaryEpoch('test')}
+    # stands in for information that label_events() reads from other files
+    condition = 'x'
+
+    def label_events(self, ds):
+        ds['condition'] = Factor([self.condition], repeat=ds.n_cases)
+        return ds
+
+
+class ChangedEventPipeline(EventPipeline):
+
+    def label_events(self, ds):
+        ds['condition'] = Factor(['changed'], repeat=ds.n_cases)
+        return ds
+
+
+def setup_event_pipeline(root: Path, subjects):
+    "Minimal BIDS dataset with a stim channel"
+    info = mne.create_info(['MEG 001', 'MEG 002', 'STI 014'], 100., ['mag', 'mag', 'stim'])
+    info['line_freq'] = 60
+    data = np.zeros((3, 1000))
+    data[2, 100::100] = [1, 2] * 4 + [1]
+    for subject in subjects:
+        path = root.parent / f'{subject}_raw.fif'
+        mne.io.RawArray(data, info, verbose=False).save(path, verbose=False)
+        raw = mne.io.read_raw_fif(path, verbose=False)
+        with catch_warnings():
+            filterwarnings('ignore', "No events found or provided")
+            write_raw_bids(raw, BIDSPath(subject=subject, task='test', root=root, datatype='meg'), verbose=False)
+
+
+def test_lazy_event_check(monkeypatch):
+    "Test checking events when they are first loaded"
+    tempdir = TempDir()
+    root = Path(tempdir) / 'root'
+    setup_event_pipeline(root, ('01', '02'))
+    keys = [(subject, '', 'test', '', '') for subject in ('01', '02')]
+    invalid = []
+    collect_invalid_files = Pipeline._collect_invalid_files
+
+    def spy_collect_invalid_files(self, invalid_cache, new_state, cache_state):
+        changes = {k: set(v) for k, v in invalid_cache.items() if v}
+        if changes:
+            invalid.append(changes)
+        return collect_invalid_files(self, invalid_cache, new_state, cache_state)
+
+    monkeypatch.setattr(Pipeline, '_collect_invalid_files', spy_collect_invalid_files)
+
+    # new cache: all events are loaded
+    e = EventPipeline(root)
+    assert not e._unchecked_events
+    cache_dir = Path(e.get('cache-dir'))
+    # unchanged: events are not loaded at initialization
+    e = EventPipeline(root)
+    assert e._unchecked_events == set(keys)
+    ds = e.load_events(subject='01')
+    assert e._unchecked_events == {keys[1]}
+    assert ds['condition'][0] == 'x'
+    assert not invalid
+
+    # change not reflected in the definitions: invalidate when first loaded
+    monkeypatch.setattr(EventPipeline, 'condition', 'y')
+    e = EventPipeline(root)
+    assert e._unchecked_events == set(keys)
+    assert not invalid
+    ds = e.load_events(subject='02')
+    assert ds['condition'][0] == 'y'
+    assert invalid == [{'variable_for_subject': {('condition', '02')}, 'variables': {'condition'}}]
+    assert e._event_store.load(keys[1])['condition'][0] == 'y'
+    e = EventPipeline(root)
+    assert e._unchecked_events == set(keys)
+    e.load_events(subject='02')
+    assert len(invalid) == 1
+
+    # changed label_events(): all events are reloaded at initialization
+    invalid.clear()
+    e = ChangedEventPipeline(root)
+    assert not e._unchecked_events
+    assert invalid == [{'variable_for_subject': {('condition', '01'), ('condition', '02')}, 'variables': {'condition'}}]
+    assert e._event_store.load(keys[0])['condition'][0] == 'changed'
+
+    # cache-state from previous versions, with events
+    invalid.clear()
+    cache_state_path = cache_dir / 'cache-state.pickle'
+    cache_state = load.unpickle(cache_state_path)
+    assert 'events' not in cache_state
+    cache_state['events'] = {key: e._event_store.load(key) for key in keys}
+    cache_state['events'][keys[0]]['condition'] = Factor(['old'], repeat=ds.n_cases)
+    save.pickle(cache_state, cache_state_path)
+    shutil.rmtree(cache_dir / 'event-store')
+    e = ChangedEventPipeline(root)
+    assert not e._unchecked_events
+    assert invalid == [{'variable_for_subject': {('condition', '01')}, 'variables': {'condition'}}]
+    assert 'events' not in load.unpickle(cache_state_path)
+    assert set(e._event_store.index) == set(keys)
+    e = ChangedEventPipeline(root)
+    assert e._unchecked_events == set(keys)
@@ -0,0 +1,52 @@
+# Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+from pathlib import Path
+
+import mne
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+from scipy import signal
+
+from eelbrain._experiment.preprocessing import fir_filtered_raw, sos_filtered_raw
+from eelbrain.testing import TempDir
+
+
+def make_raw():
+    rng = np.random.RandomState(0)
+    info = mne.create_info(['EEG 001', 'EEG 002', 'EEG 003', 'STI 014'], 100, ['eeg', 'eeg', 'eeg', 'stim'])
+    data = rng.normal(0, 1e-5, (4, 10000))
+    data[3] = 0
+    return mne.io.RawArray(data, info, verbose=False)
+
+
+def test_block_filter():
+    tempdir = TempDir()
+    raw = make_raw()
+    path = Path(tempdir) / 'raw.fif'
+    raw.save(path, verbose=False)
+    source = mne.io.read_raw_fif(path, verbose=False)
+
+    # FIR
+    target = source.copy().load_data().filter(1, 8, verbose=False)
+    raw_blocks = fir_filtered_raw(source, 1, 8, 7.3)
+    assert not raw_blocks.preload
+    assert raw_blocks.info['highpass'] == 1
+    assert raw_blocks.info['lowpass'] == 8
+    dst = Path(tempdir) / 'filtered-raw.fif'
+    raw_blocks.save(dst, verbose=False)
+    filtered = mne.io.read_raw_fif(dst, preload=True, verbose=False)
+    assert_allclose(filtered.get_data(), target.get_data(), rtol=1e-6, atol=1e-15)
+    assert_array_equal(filtered.get_data(picks='stim'), raw.get_data(picks='stim'))
+    # random access
+    assert_allclose(raw_blocks[:, 4500:4600][0], target[:, 4500:4600][0], rtol=1e-12, atol=1e-20)
+    # IIR can not be applied in blocks
+    assert fir_filtered_raw(source, 1, 8, 7.3, method='iir') is None
+
+    # causal IIR
+    sos = signal.ellip(4, 0.1, 40, 0.1, 'highpass', output='sos')
+    picks = mne.pick_types(raw.info, eeg=True)
+    target = source.get_data()
+    for i in picks:
+        target[i] = signal.sosfilt(sos, target[i])
+    raw_blocks = sos_filtered_raw(source, sos, picks, 7.3)
+    assert_array_equal(raw_blocks.get_data(), target)
+    assert_array_equal(raw_blocks[:, 4500:4600][0], target[:, 4500:4600])
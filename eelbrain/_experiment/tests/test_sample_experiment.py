@@ -1,6 +1,6 @@
 # Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
 """Test Pipeline using mne-python sample data"""
-from os.path import join, exists
+from os.path import dirname, join, exists, splitext
 from os import remove
 import pytest
 from warnings import catch_warnings, filterwarnings
@@ -12,11 +12,12 @@ from numpy.testing import assert_almost_equal, assert_array_equal
 from eelbrain import *
 from eelbrain.pipeline import *
 from eelbrain._exceptions import DefinitionError
+from eelbrain._stats import testnd as _testnd
 from eelbrain.testing import TempDir, assert_dataobj_equal, requires_mne_sample_data
 
 
 @requires_mne_sample_data
-def test_sample():
+def test_sample(monkeypatch):
     set_log_level('warning', 'mne')
     from eelbrain._experiment.tests.sample_experiment import SampleExperiment
 
@@ -75,6 +76,7 @@ def test_sample():
     ds_ind = combine(sds, dim_intersection=True)
 
     ds = e.load_evoked('all')
+    assert_dataobj_equal(e.load_evoked('all', parallel=True), ds)
     ds['meg'] = ds['meg'].sub(sensor=ds['meg'].sensor.index(exclude='MEG 0331'))  # load_evoked interpolates bad channel
     assert_dataobj_equal(ds_ind, ds, decimal=19)  # make vs load evoked
 
@@ -88,7 +90,14 @@ def test_sample():
     assert_dataobj_equal(res.c1_mean, meg_mean, decimal=21)
     with pytest.raises(IOError):
         e.load_test('a>v', 0.05, 0.2, 0.05, samples=20, data='sensor', baseline=False)
+    # permutation checkpoints are kept next to the test file
+    checkpoints = []
+    monkeypatch.setattr(_testnd.PermutationCheckpoint, 'remove', lambda self: checkpoints.append(self.path))
     res = e.load_test('a>v', 0.05, 0.2, 0.05, samples=20, data='sensor', baseline=False, make=True)
+    monkeypatch.undo()
+    checkpoint_dir = f"{splitext(e.get('test-file'))[0]} checkpoints"
+    assert [dirname(path) for path in checkpoints] == [checkpoint_dir]
+    assert not exists(checkpoint_dir)
     assert res.p.min() == pytest.approx(.143, abs=.001)
     assert res.difference.max() == pytest.approx(4.47e-13, 1e-15)
     # plot (skip to avoid using framework build)
@@ -219,6 +228,10 @@ def test_sample():
     ica = e.load_ica(raw='ica')
     ica.exclude = [0, 1, 2]
     ica.save(ica_path, overwrite=True)
+    # precompute raw cache
+    e.make_raw_cache(['ica1-40', 'apply-ica'], 'all', max_memory=1)
+    for raw in ['ica', 'ica1-40']:
+        assert e._raw[raw].is_cached(e._bids_path)
     ds2 = e.load_evoked(raw='ica1-40')
     assert not np.allclose(ds1['meg'].x, ds2['meg'].x, atol=1e-20), "ICA change ignored"
     # apply-ICA
@@ -314,6 +327,14 @@ def test_sample_source():
     res = ress.res['transversetemporal-lh']
     assert res.samples == -1
     assert res.tests['intercept'].p.min() == 1 / 7
+    # parallel loading
+    ds = e.load_evoked_stc('all')
+    assert_dataobj_equal(e.load_evoked_stc('all', parallel=True), ds)
+    # cached source estimates
+    assert exists(e.get('evoked-stc-file', subject=e.get('subject')))
+    assert_dataobj_equal(e.load_evoked_stc('all'), ds)
+    ds = e.load_epochs_stc('all')
+    assert_dataobj_equal(e.load_epochs_stc('all', parallel=True), ds)
 
 
 @requires_mne_sample_data
@@ -0,0 +1,171 @@
+# Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+"""Columnar on-disk format for Dataset and NDVar
+
+A dataset directory contains ``meta.pickle`` with the Dataset attributes and
+one entry per column. The data of :class:`Var`, :class:`Factor` and
+:class:`NDVar` columns are stored as ``.npy`` files (with aligned data, so that
+they can be opened as memory-mapped arrays), while the remaining attributes
+(name, dimensions, labels, info) are stored in ``meta.pickle``. Other columns
+are pickled individually.
+"""
+from pathlib import Path
+import shutil
+from typing import Any
+from collections.abc import Sequence
+
+import numpy as np
+
+from .._data_obj import Dataset, Factor, NDVar, Var
+from .._types import PathArg
+from .pickle import pickle, unpickle
+
+
+VERSION = 1
+META_FILE = 'meta.pickle'
+ARRAY_TYPES = (Var, Factor, NDVar)
+
+
+def _split_state(obj):
+    "Separate the data array from the other state of a data-object"
+    state = obj.__getstate__()
+    if isinstance(obj, Var):
+        x, name, info = state
+        return x, {'name': name, 'info': info}
+    state = dict(state)
+    return state.pop('x'), state
+
+
+def _join_state(cls, x, state):
+    obj = cls.__new__(cls)
+    if cls is Var:
+        obj.__setstate__((x, state['name'], state['info']))
+    else:
+        obj.__setstate__({**state, 'x': x})
+    return obj
+
+
+def _save_column(obj: Any, path: Path, i: int) -> dict:
+    if type(obj) in ARRAY_TYPES:
+        x, state = _split_state(obj)
+        if not x.dtype.hasobject:
+            filename = f'{i}.npy'
+            np.save(path / filename, x, allow_pickle=False)
+            return {'class': type(obj), 'file': filename, 'state': state}
+    filename = f'{i}.pickle'
+    pickle(obj, path / filename)
+    return {'class': None, 'file': filename}
+
+
+def _load_column(entry: dict, path: Path, mmap: bool, index=None):
+    cls = entry['class']
+    if cls is None:
+        obj = unpickle(path / entry['file'])
+        return obj if index is None else obj[index]
+    if index is None:
+        mmap_mode = 'r' if mmap and cls is NDVar else None
+        x = np.load(path / entry['file'], mmap_mode, allow_pickle=False)
+        return _join_state(cls, x, entry['state'])
+    # read only the requested cases
+    obj = _join_state(cls, np.load(path / entry['file'], 'r', allow_pickle=False), entry['state'])
+    obj = obj[index]
+    obj.x = np.array(obj.x)
+    return obj
+
+
+def save_dataset_dir(
+        obj: Dataset | NDVar,
+        dst: PathArg,
+        overwrite: bool = False,
+):
+    """Save a :class:`Dataset` or :class:`NDVar` in a columnar directory format
+
+    Parameters
+    ----------
+    obj
+        Data to save.
+    dst
+        Directory to save the data in.
+    overwrite
+        Overwrite an existing dataset directory at ``dst``.
+
+    See Also
+    --------
+    eelbrain.load.dataset_dir
+
+    Notes
+    -----
+    Each column is stored in a separate file, so that individual columns and
+    cases can be loaded without reading the whole dataset (see
+    :func:`load.dataset_dir`). The data of :class:`Var`, :class:`Factor` and
+    :class:`NDVar` objects are stored as ``.npy`` files that can be opened
+    as memory-mapped arrays. Other objects are pickled.
+    """
+    dst = Path(dst).expanduser()
+    if dst.exists():
+        if not (dst / META_FILE).exists():
+            raise FileExistsError(f"{dst} exists and is not a dataset directory")
+        elif not overwrite:
+            raise FileExistsError(f"{dst} exists; use overwrite=True to replace it")
+        shutil.rmtree(dst)
+    dst.mkdir(parents=True)
+    if isinstance(obj, Dataset):
+        columns = [(key, _save_column(item, dst, i)) for i, (key, item) in enumerate(obj.items())]
+        meta = {'kind': 'Dataset', 'name': obj.name, 'caption': obj._caption, 'info': obj.info, 'n_cases': obj.n_cases, 'columns': columns}
+    elif isinstance(obj, NDVar):
+        meta = {'kind': 'NDVar', 'column': _save_column(obj, dst, 0)}
+    else:
+        raise TypeError(f"{obj=}: needs to be a Dataset or NDVar")
+    meta['version'] = VERSION
+    pickle(meta, dst / META_FILE)
+
+
+def load_dataset_dir(
+        path: PathArg,
+        keys: str | Sequence[str] = None,
+        index: slice | Sequence[int] | np.ndarray | Var = None,
+        mmap: bool = True,
+) -> Dataset | NDVar:
+    """Load data saved with :func:`save.dataset_dir`
+
+    Parameters
+    ----------
+    path
+        Dataset directory.
+    keys
+        Only load these columns (default all; only applies to
+        :class:`Dataset`).
+    index
+        Only load these cases (index into the case dimension, e.g., a
+        :class:`slice`, an array of integers, or a boolean array).
+    mmap
+        When loading all cases, open :class:`NDVar` data as read-only
+        memory-mapped arrays (default ``True``). With ``mmap=False``, or when
+        loading a subset of cases, the data are read into memory.
+
+    See Also
+    --------
+    eelbrain.save.dataset_dir
+    """
+    path = Path(path).expanduser()
+    meta = unpickle(path / META_FILE)
+    if meta['version'] > VERSION:
+        raise OSError(f"{path}: dataset directory was saved with a newer version of Eelbrain")
+    if isinstance(index, Var):
+        index = index.x
+    if meta['kind'] == 'NDVar':
+        return _load_column(meta['column'], path, mmap, index)
+    columns = meta['columns']
+    if keys is not None:
+        if isinstance(keys, str):
+            keys = [keys]
+        all_keys = [key for key, _ in columns]
+        missing = [key for key in keys if key not in all_keys]
+        if missing:
+            raise KeyError(f"{missing}: not in dataset directory {path}")
+        columns = [columns[all_keys.index(key)] for key in keys]
+    items = [(key, _load_column(entry, path, mmap, index)) for key, entry in columns]
+    if index is None:
+        n_cases = meta['n_cases']
+    else:
+        n_cases = len(np.arange(meta['n_cases'])[index])
+    return Dataset(items, meta['name'], meta['caption'], meta['info'], n_cases)
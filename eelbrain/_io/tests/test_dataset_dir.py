@@ -0,0 +1,41 @@
+# Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from eelbrain import Datalist, datasets, load, save
+from eelbrain.testing import TempDir, assert_dataobj_equal
+
+
+def test_dataset_dir():
+    tempdir = TempDir()
+    ds = datasets.get_uts(utsnd=True)
+    ds['list'] = Datalist(range(ds.n_cases))
+    ds.info['key'] = 'value'
+    path = Path(tempdir) / 'ds'
+    save.dataset_dir(ds, path)
+    with pytest.raises(FileExistsError):
+        save.dataset_dir(ds, path)
+    save.dataset_dir(ds, path, overwrite=True)
+
+    ds_loaded = load.dataset_dir(path)
+    assert_dataobj_equal(ds_loaded, ds)
+    assert ds_loaded.info['key'] == 'value'
+    assert isinstance(ds_loaded['utsnd'].x, np.memmap)
+    assert not isinstance(load.dataset_dir(path, mmap=False)['utsnd'].x, np.memmap)
+    # partial loading
+    ds_loaded = load.dataset_dir(path, ['A', 'uts'])
+    assert list(ds_loaded) == ['A', 'uts']
+    assert_dataobj_equal(ds_loaded, ds['A', 'uts'])
+    index = ds.eval("A == 'a1'")
+    assert_dataobj_equal(load.dataset_dir(path, index=index), ds[index])
+    assert_dataobj_equal(load.dataset_dir(path, 'utsnd', slice(5, 15)), ds[5:15, ('utsnd',)])
+    with pytest.raises(KeyError):
+        load.dataset_dir(path, 'missing')
+
+    # NDVar
+    path = Path(tempdir) / 'ndvar'
+    save.dataset_dir(ds['utsnd'], path)
+    assert_dataobj_equal(load.dataset_dir(path), ds['utsnd'])
+    assert_dataobj_equal(load.dataset_dir(path, index=[3, 1]), ds[[3, 1], 'utsnd'])
@@ -32,6 +32,8 @@ from ._utils.numpy_utils import index
 
 ICO_N_VERTICES = (12, 42, 162, 642, 2562, 10242, 40962)
 ICO_SLICE_SUBJECTS = ('fsaverage', 'fsaverage_sym')
+MORPH_MATRICES_MAX = 8  # number of morph matrices to cache
+MORPH_MATRICES = {}
 
 
 def assert_subject_exists(subject, subjects_dir):
@@ -447,6 +449,56 @@ def _morph_subset(
     )
 
 
+def _morph_matrix(
+        subject_from: str,
+        subject_to: str,
+        vertices_from: list[np.ndarray],
+        vertices_to: list[np.ndarray],
+        subjects_dir: PathArg,
+        xhemi: bool,
+) -> scipy.sparse.spmatrix:
+    "Compute a morph matrix, or retrieve it from the cache"
+    key = (subject_from, subject_to, *(v.tobytes() for v in vertices_from), *(v.tobytes() for v in vertices_to), str(subjects_dir), xhemi)
+    if key in MORPH_MATRICES:
+        return MORPH_MATRICES[key]
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', r'\d+/\d+ vertices not included in smoothing', module='mne')
+        morph = compute_morph_matrix(subject_from, subject_to, vertices_from, vertices_to, None, subjects_dir, xhemi=xhemi)
+    if len(MORPH_MATRICES) >= MORPH_MATRICES_MAX:
+        del MORPH_MATRICES[next(iter(MORPH_MATRICES))]
+    MORPH_MATRICES[key] = morph
+    return morph
+
+
+def morph_stcs(
+        morph: mne.SourceMorph,
+        stcs: Sequence[mne.SourceEstimate | mne.VectorSourceEstimate],
+) -> list[mne.SourceEstimate | mne.VectorSourceEstimate]:
+    """Morph several source estimates with a single sparse matrix product
+
+    Equivalent to ``[morph.apply(stc) for stc in stcs]``.
+    """
+    vertices_from = morph.src_data.get('vertices_from') if morph.kind == 'surface' else None
+    batch = (
+        vertices_from is not None and morph.morph_mat is not None
+        and all(isinstance(stc, (mne.SourceEstimate, mne.VectorSourceEstimate)) for stc in stcs)
+        and all(stc.subject in (None, morph.subject_from) for stc in stcs)
+        and all(_vertices_equal(stc.vertices, vertices_from) for stc in stcs)
+    )
+    if not batch:
+        return [morph.apply(stc) for stc in stcs]
+    data = np.concatenate([stc.data.reshape((len(stc.data), -1)) for stc in stcs], 1)
+    data = morph.morph_mat @ data
+    out = []
+    i = 0
+    for stc in stcs:
+        n = stc.data[0].size
+        x = np.ascontiguousarray(data[:, i:i + n]).reshape((len(data), *stc.data.shape[1:]))
+        out.append(stc.__class__(x, morph.vertices_to, stc.tmin, stc.tstep, morph.subject_to))
+        i += n
+    return out
+
+
 def morph_source_space(
         data: NDVar | SourceSpace,
         subject_to: str = None,
@@ -472,7 +524,8 @@ def morph_source_space(
         providing them as argument can speed up processing by a second or two.
         Use ``'lh'`` or ``'rh'`` to target vertices from only one hemisphere.
     morph
-        A pre-computed morph matrix to speed up processing.
+        A pre-computed morph matrix to speed up processing (by default, the
+        morph matrix is computed and kept in memory for subsequent calls).
     copy
         Make sure that the data of ``morphed_ndvar`` is separate from
         ``data`` (default False).
@@ -675,9 +728,7 @@ def morph_source_space(
             dims.insert(0, dims.pop(case_axis))
         return NDVar(x, dims, ndvar.name, ndvar.info)
     elif morph is None:
-        with warnings.catch_warnings():
-            warnings.filterwarnings('ignore', r'\d+/\d+ vertices not included in smoothing', module='mne')
-            morph = compute_morph_matrix(subject_from, subject_to, source.vertices, source_to.vertices, None, subjects_dir, xhemi=xhemi)
+        morph = _morph_matrix(subject_from, subject_to, source.vertices, source_to.vertices, subjects_dir, xhemi)
     elif not scipy.sparse.issparse(morph):
         raise ValueError(f'{morph=}: must be mne.SourceMorph or a sparse matrix')
     elif morph.shape != (len(source), len(source_to)):
@@ -29,7 +29,6 @@ from .._info import merge_info
 from .._mne import complete_source_space
 from .._stats.adjacency import Adjacency
 from .._stats.adjacency import find_peaks as _find_peaks
-from .._trf._fit_metrics import error_for_indexes
 from .._utils import deprecate_ds_arg
 from .._utils.numpy_utils import aslice
 from ._convolve import convolve_2d
@@ -789,13 +788,11 @@ def label_operator(labels, operation='mean', exclude=None, weights=None,
                             "all strings or all real numbers; got %r" %
                             (dim_values,))
     # construct operator
-    x = np.empty((len(label_values), len(dim)))
-    for v, xs in zip(label_values, x):
-        np.equal(label_data, v, xs)
-        if weights is not None:
-            xs *= weights
-        if operation == 'mean':
-            xs /= error_for_indexes(xs, np.array(((0, len(xs)),), np.int64), 1)
+    x = np.equal(label_data, label_values[:, np.newaxis]).astype(np.float64)
+    if weights is not None:
+        x *= weights
+    if operation == 'mean':
+        x /= np.abs(x).sum(1, keepdims=True)
     return NDVar(x, (label_dim, dim), labels.name)
 
 
@@ -4,7 +4,7 @@ from numpy.testing import assert_array_equal, assert_allclose
 import pytest
 from scipy import signal
 
-from eelbrain import NDVar, Case, Scalar, UTS, datasets, concatenate, convolve, correlation_coefficient, cross_correlation, cwt_morlet, find_intervals, find_peaks, frequency_response, gaussian, normalize_in_cells, psd_welch, resample, set_time
+from eelbrain import NDVar, Case, Scalar, UTS, datasets, concatenate, convolve, correlation_coefficient, cross_correlation, cwt_morlet, find_intervals, find_peaks, frequency_response, gaussian, label_operator, normalize_in_cells, psd_welch, resample, set_time
 from eelbrain.testing import assert_dataobj_equal, get_ndvar
 
 
@@ -201,6 +201,23 @@ def test_gaussian():
     assert_array_equal(gaussian(0.4, 0.1, time).x, signal.windows.gaussian(9, 1)[:6])
 
 
+def test_label_operator():
+    rng = np.random.RandomState(0)
+    dim = Scalar('location', range(50))
+    labels = NDVar(rng.randint(0, 4, 50), dim)
+    weights = NDVar(rng.uniform(-1, 1, 50), dim)
+    data = NDVar(rng.normal(0, 1, (50, 10)), (dim, UTS(0, 0.01, 10)))
+    m = label_operator(labels)
+    assert_array_equal(m.label, [0, 1, 2, 3])
+    assert_allclose(m.dot(data).x, [data.x[labels.x == i].mean(0) for i in range(4)])
+    m = label_operator(labels, 'sum', exclude=0)
+    assert_array_equal(m.label, [1, 2, 3])
+    assert_allclose(m.dot(data).x, [data.x[labels.x == i].sum(0) for i in range(1, 4)])
+    m = label_operator(labels, weights=weights)
+    target = [(weights.x[labels.x == i, None] * data.x[labels.x == i]).sum(0) / np.abs(weights.x[labels.x == i]).sum() for i in range(4)]
+    assert_allclose(m.dot(data).x, target)
+
+
 def test_mask():
     ds = datasets.get_uts(True)
 
@@ -54,6 +54,39 @@ class Adjacency:
             if ctype != 'grid':
                 self.struct[(slice(None),) * i + (slice(None, None, 2),)] = False
 
+    def flat_graph(self, shape):
+        """Neighbors for a map of ``shape``, flattened in C order
+
+        Returns
+        -------
+        grid_strides, grid_lengths : array of int (n_grid_axes,)
+            Stride and length of each axis with grid adjacency.
+        custom_stride : int
+            Stride of the first axis if it has custom adjacency (else 0).
+        neighbor_start : array of int (n_vertices + 1,)
+            Index into ``neighbors`` for each vertex of the custom axis.
+        neighbors : array of uint32 (n_neighbors,)
+            Neighbors of each vertex of the custom axis (in both directions).
+        """
+        ndim = len(shape)
+        strides = [int(np.prod(shape[i + 1:])) for i in range(ndim)]
+        grid_axes = [i for i in range(ndim) if self.struct[(1,) * i + (0,) + (1,) * (ndim - i - 1)]]
+        grid_strides = np.array([strides[i] for i in grid_axes], np.int64)
+        grid_lengths = np.array([shape[i] for i in grid_axes], np.int64)
+        if self.custom:
+            edges = self.custom[0][0]
+            src = np.concatenate((edges[:, 0], edges[:, 1]))
+            dst = np.concatenate((edges[:, 1], edges[:, 0]))
+            neighbors = dst[np.argsort(src, kind='stable')].astype(np.uint32)
+            neighbor_start = np.zeros(shape[0] + 1, np.int64)
+            np.cumsum(np.bincount(src, minlength=shape[0]), out=neighbor_start[1:])
+            custom_stride = strides[0]
+        else:
+            neighbors = np.empty(0, np.uint32)
+            neighbor_start = np.zeros(1, np.int64)
+            custom_stride = 0
+        return grid_strides, grid_lengths, custom_stride, neighbor_start, neighbors
+
     def __getstate__(self):
         return {k: getattr(self, k) for k in self.__slots__}
 
@@ -1,5 +1,7 @@
 # Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
 # cython: boundscheck=False, wraparound=False, language_level=3
+cimport cython
+from cython.parallel cimport prange
 from libc.stdlib cimport malloc, free
 import numpy as np
 cimport numpy as np
@@ -99,37 +101,395 @@ def merge_labels(
     return out
 
 
-def tfce_increment(
-        const np.npy_uint32[:] labels,
-        const np.npy_uint32[:] label_image,
-        np.npy_float64[:] image,
+cdef inline Py_ssize_t _find(Py_ssize_t* parent, double* acc, Py_ssize_t i) noexcept nogil:
+    "Find root of ``i`` with path halving, preserving path sums in ``acc``"
+    cdef Py_ssize_t p
+    while parent[i] != i:
+        p = parent[i]
+        if parent[p] != p:
+            acc[i] += acc[p]
+            parent[i] = parent[p]
+        i = parent[i]
+    return i
+
+
+cdef inline void _flush(Py_ssize_t root, Py_ssize_t level, Py_ssize_t* size, Py_ssize_t* start, double* acc, double* cum_factor, double e) noexcept nogil:
+    "Credit ``root`` with its current extent for heights above ``level``"
+    if start[root] > level:
+        acc[root] += (<double> size[root]) ** e * (cum_factor[start[root]] - cum_factor[level])
+        start[root] = level
+
+
+cdef inline void _union(Py_ssize_t p, Py_ssize_t q, Py_ssize_t level, Py_ssize_t* parent, Py_ssize_t* size, Py_ssize_t* start, double* acc, double* cum_factor, double e) noexcept nogil:
+    "Merge the clusters of ``p`` and ``q`` (if ``q`` is active) at ``level``"
+    cdef Py_ssize_t rp, rq
+    if parent[q] == -1:
+        return
+    rp = _find(parent, acc, p)
+    rq = _find(parent, acc, q)
+    if rp == rq:
+        return
+    _flush(rp, level, size, start, acc, cum_factor, e)
+    _flush(rq, level, size, start, acc, cum_factor, e)
+    if size[rp] < size[rq]:
+        rp, rq = rq, rp
+    # attach rq to rp while preserving path sums of rq's members
+    acc[rq] -= acc[rp]
+    parent[rq] = rp
+    size[rp] += size[rq]
+
+
+@cython.cdivision(True)
+def tfce_union_find(
+        const np.npy_int64[:] levels,
+        const np.npy_float64[:] factors,
+        np.npy_float64[:] out,
+        const np.npy_int64[:] grid_strides,
+        const np.npy_int64[:] grid_lengths,
+        Py_ssize_t custom_stride,
+        const np.npy_int64[:] neighbor_start,
+        const np.npy_uint32[:] neighbors,
         double e,
-        double h_factor,
 ):
-    cdef size_t i, cid
-    cdef size_t n = image.shape[0]
-    cdef size_t n_labels = max(labels) + 1
+    """Add TFCE values for one tail to ``out``
+
+    Points are activated from the highest level down, and clusters are merged
+    incrementally with a union-find structure. Each cluster root accumulates
+    ``extent ** e * factor`` for the heights during which its extent did not
+    change, so that the map needs to be sorted only once.
+
+    Parameters
+    ----------
+    levels : array of int (n_points,)
+        For each point of the flattened map, the number of heights at which it
+        is included in the thresholded map (0 for points below the first
+        height).
+    factors : array (n_heights,)
+        ``height ** H`` for each height, in ascending order of heights.
+    out : array (n_points,)
+        TFCE map (modified in-place).
+    grid_strides, grid_lengths : array of int (n_grid_axes,)
+        Stride (in the flattened map) and length of each axis with grid
+        adjacency.
+    custom_stride : int
+        Stride of the first axis if it has custom adjacency (0 otherwise).
+    neighbor_start : array of int (n_vertices + 1,)
+        Index into ``neighbors`` for each vertex of the custom axis.
+    neighbors : array of int (n_neighbors,)
+        Neighbors for each vertex of the custom axis (both directions).
+    e : float
+        TFCE extent exponent.
+    """
+    cdef:
+        Py_ssize_t i, j, k, p, r, level, coord, axis, stride
+        Py_ssize_t n = levels.shape[0]
+        Py_ssize_t n_heights = factors.shape[0]
+        Py_ssize_t n_grid = grid_strides.shape[0]
+        double total
+
+    if n_heights == 0:
+        return
 
-    cdef double* area = <double*> malloc(sizeof(double) * n_labels)
+    cdef:
+        Py_ssize_t* parent = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * n)
+        Py_ssize_t* size = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * n)
+        Py_ssize_t* start = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * n)
+        Py_ssize_t* order = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * n)
+        double* acc = <double*> malloc(sizeof(double) * n)
+        Py_ssize_t* level_start = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * (n_heights + 2))
+        double* cum_factor = <double*> malloc(sizeof(double) * (n_heights + 1))
 
-    # initialize area
-    for i in range(n_labels):
-        area[i] = 0.
+    with nogil:
+        # cumulative sum of height factors
+        cum_factor[0] = 0
+        for k in range(n_heights):
+            cum_factor[k + 1] = cum_factor[k] + factors[k]
 
-    # determine area
-    for i in range(n):
-        cid = label_image[i]
-        if cid > 0:
-            area[cid] += 1.
+        # counting sort of points by level
+        for k in range(n_heights + 2):
+            level_start[k] = 0
+        for i in range(n):
+            level_start[levels[i] + 1] += 1
+        for k in range(n_heights + 1):
+            level_start[k + 1] += level_start[k]
+        for i in range(n):
+            parent[i] = -1
+            start[i] = level_start[levels[i]]
+            level_start[levels[i]] += 1
+            order[start[i]] = i
+        # level_start[k] now points to the end of level k
+        for k in range(n_heights, 0, -1):
+            level_start[k] = level_start[k - 1]
+        level_start[0] = 0
 
-    # determine TFCE value
-    for cid in labels:
-        area[cid] = area[cid] ** e * h_factor
+        # activate points from the top down
+        for level in range(n_heights, 0, -1):
+            for j in range(level_start[level], level_start[level + 1]):
+                p = order[j]
+                parent[p] = p
+                size[p] = 1
+                start[p] = level
+                acc[p] = 0
+                # grid neighbors
+                for axis in range(n_grid):
+                    stride = grid_strides[axis]
+                    coord = (p // stride) % grid_lengths[axis]
+                    if coord > 0:
+                        _union(p, p - stride, level, parent, size, start, acc, cum_factor, e)
+                    if coord < grid_lengths[axis] - 1:
+                        _union(p, p + stride, level, parent, size, start, acc, cum_factor, e)
+                # custom neighbors
+                if custom_stride:
+                    i = p // custom_stride
+                    r = p - i * custom_stride
+                    for k in range(neighbor_start[i], neighbor_start[i + 1]):
+                        _union(p, neighbors[k] * custom_stride + r, level, parent, size, start, acc, cum_factor, e)
 
-    # update TFCE image
-    for i in range(n):
-        cid = label_image[i]
-        if cid > 0:
-            image[i] += area[cid]
+        # credit remaining heights and collect path sums
+        for i in range(n):
+            if parent[i] == -1:
+                continue
+            r = _find(parent, acc, i)
+            _flush(r, 0, size, start, acc, cum_factor, e)
+        for i in range(n):
+            if parent[i] == -1:
+                continue
+            total = acc[i]
+            r = i
+            while parent[r] != r:
+                r = parent[r]
+                total += acc[r]
+            out[i] += total
+
+    free(parent)
+    free(size)
+    free(start)
+    free(order)
+    free(acc)
+    free(level_start)
+    free(cum_factor)
+
+
+cdef inline Py_ssize_t _root(Py_ssize_t* parent, Py_ssize_t i) noexcept nogil:
+    "Find root of ``i`` with path halving"
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+cdef inline void _merge(Py_ssize_t* parent, Py_ssize_t* size, Py_ssize_t p, Py_ssize_t q) noexcept nogil:
+    "Merge the clusters of ``p`` and ``q`` (union by size)"
+    p = _root(parent, p)
+    q = _root(parent, q)
+    if p == q:
+        return
+    if size[p] < size[q]:
+        p, q = q, p
+    parent[q] = p
+    size[p] += size[q]
+
+
+@cython.cdivision(True)
+cdef double _cluster_max(
+        const double* x,
+        Py_ssize_t n,
+        double threshold,
+        int tail,
+        const np.npy_int64[:] grid_strides,
+        const np.npy_int64[:] grid_lengths,
+        Py_ssize_t custom_stride,
+        const np.npy_int64[:] neighbor_start,
+        const np.npy_uint32[:] neighbors,
+        const np.npy_int64[:] criteria_strides,
+        const np.npy_int64[:] criteria_lengths,
+        const np.npy_int64[:] criteria_min,
+        np.npy_uint32* cmap,
+) noexcept nogil:
+    "Label clusters in ``x`` and return the largest cluster mass (see cluster_max_stat)"
+    cdef:
+        Py_ssize_t i, j, k, p, q, r, coord, axis, stride, length, outer, inner, i_outer
+        Py_ssize_t n_grid = grid_strides.shape[0]
+        Py_ssize_t n_criteria = criteria_strides.shape[0]
+        double v, out = 0
+        signed char* sign = <signed char*> malloc(sizeof(signed char) * n)
+        Py_ssize_t* parent = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * n)
+        Py_ssize_t* size = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * n)
+        Py_ssize_t* last = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * n)
+        double* mass = <double*> malloc(sizeof(double) * n)
+
+    # points exceeding the threshold, each in its own cluster
+    for p in range(n):
+        if tail >= 0 and x[p] > threshold:
+            sign[p] = 1
+        elif tail <= 0 and x[p] < -threshold:
+            sign[p] = -1
+        else:
+            sign[p] = 0
+        parent[p] = p
+        size[p] = 1
+        mass[p] = 0
+
+    # merge neighboring points with the same sign (each edge in one direction)
+    for p in range(n):
+        if sign[p] == 0:
+            continue
+        for axis in range(n_grid):
+            stride = grid_strides[axis]
+            coord = (p // stride) % grid_lengths[axis]
+            if coord < grid_lengths[axis] - 1 and sign[p + stride] == sign[p]:
+                _merge(parent, size, p, p + stride)
+        if custom_stride:
+            i = p // custom_stride
+            r = p - i * custom_stride
+            for k in range(neighbor_start[i], neighbor_start[i + 1]):
+                j = neighbors[k]
+                if j > i:
+                    q = j * custom_stride + r
+                    if sign[q] == sign[p]:
+                        _merge(parent, size, p, q)
+
+    # cluster masses (summed in the same order as scipy.ndimage.sum)
+    for p in range(n):
+        if sign[p] != 0:
+            parent[p] = _root(parent, p)
+            mass[parent[p]] += x[p]
+
+    # extent criteria: count distinct coordinates along the criterion axis;
+    # clusters that fail a criterion are marked by sign = 0 on the root
+    for k in range(n_criteria):
+        stride = criteria_strides[k]
+        length = criteria_lengths[k]
+        outer = n // (stride * length)
+        for p in range(n):
+            if sign[p] != 0 and parent[p] == p:
+                size[p] = 0
+                last[p] = -1
+        for coord in range(length):
+            for i_outer in range(outer):
+                q = (i_outer * length + coord) * stride
+                for inner in range(stride):
+                    p = q + inner
+                    if sign[p] != 0:
+                        r = parent[p]
+                        if last[r] != coord:
+                            last[r] = coord
+                            size[r] += 1
+        for p in range(n):
+            if sign[p] != 0 and parent[p] == p and size[p] < criteria_min[k]:
+                sign[p] = 0
+
+    # largest mass
+    for p in range(n):
+        if sign[p] != 0 and parent[p] == p:
+            v = mass[p]
+            if tail <= 0 and v < 0:
+                v = -v
+            if v > out:
+                out = v
+    if cmap != NULL:
+        for p in range(n):
+            if sign[p] != 0 and sign[parent[p]] != 0:
+                cmap[p] = parent[p] + 1
+            else:
+                cmap[p] = 0
+
+    free(sign)
+    free(parent)
+    free(size)
+    free(last)
+    free(mass)
+    return out
+
+
+def cluster_max_stat(
+        const np.npy_float64[::1] stat_map,
+        double threshold,
+        int tail,
+        const np.npy_int64[:] grid_strides,
+        const np.npy_int64[:] grid_lengths,
+        Py_ssize_t custom_stride,
+        const np.npy_int64[:] neighbor_start,
+        const np.npy_uint32[:] neighbors,
+        const np.npy_int64[:] criteria_strides,
+        const np.npy_int64[:] criteria_lengths,
+        const np.npy_int64[:] criteria_min,
+        np.npy_uint32[::1] cmap = None,
+):
+    """Find the largest cluster mass in a statistical map
+
+    Clusters are labeled with a union-find structure directly on the
+    adjacency graph, and cluster masses and extent criteria are evaluated in
+    the same pass. Positive and negative clusters are never merged.
+
+    Parameters
+    ----------
+    stat_map : array (n_points,)
+        Flattened statistical map (C-contiguous).
+    threshold : float
+        Cluster forming threshold.
+    tail : int
+        Tail(s) in which to form clusters.
+    grid_strides, grid_lengths, custom_stride, neighbor_start, neighbors
+        Adjacency graph (see :meth:`Adjacency.flat_graph`).
+    criteria_strides, criteria_lengths : array of int (n_criteria,)
+        Stride and length of the axis to which each extent criterion applies.
+    criteria_min : array of int (n_criteria,)
+        Minimum number of distinct coordinates on that axis.
+    cmap : array of uint32 (n_points,)
+        If provided, label clusters that survive the criteria (0 elsewhere).
+
+    Returns
+    -------
+    max_mass : float
+        Largest cluster mass (absolute for ``tail <= 0``; 0 if there are no
+        clusters).
+    """
+    cdef:
+        Py_ssize_t n = stat_map.shape[0]
+        np.npy_uint32* cmap_ptr = NULL
+        double out
+
+    if n == 0:
+        return 0.
+    if cmap is not None:
+        if cmap.shape[0] != n:
+            raise ValueError(f"cmap has length {cmap.shape[0]}, stat_map has length {n}")
+        cmap_ptr = &cmap[0]
+    with nogil:
+        out = _cluster_max(&stat_map[0], n, threshold, tail, grid_strides, grid_lengths, custom_stride, neighbor_start, neighbors, criteria_strides, criteria_lengths, criteria_min, cmap_ptr)
+    return out
+
+
+def cluster_max_stats(
+        const np.npy_float64[:, ::1] stat_maps,
+        const np.npy_int64[:] index,
+        const np.npy_float64[:] thresholds,
+        int tail,
+        const np.npy_int64[:] grid_strides,
+        const np.npy_int64[:] grid_lengths,
+        Py_ssize_t custom_stride,
+        const np.npy_int64[:] neighbor_start,
+        const np.npy_uint32[:] neighbors,
+        const np.npy_int64[:] criteria_strides,
+        const np.npy_int64[:] criteria_lengths,
+        const np.npy_int64[:] criteria_min,
+        np.npy_float64[:] out,
+        int num_threads = 1,
+):
+    """Largest cluster mass for several maps in parallel threads
+
+    See :func:`cluster_max_stat`. For each ``i``, ``out[i]`` is the largest
+    cluster mass in ``stat_maps[index[i]]`` with threshold ``thresholds[i]``.
+    Rows of ``stat_maps`` need to be C-contiguous.
+    """
+    cdef:
+        Py_ssize_t i
+        Py_ssize_t n_maps = index.shape[0]
+        Py_ssize_t n = stat_maps.shape[1]
 
-    free(area)
+    if n == 0:
+        out[:n_maps] = 0
+        return
+    for i in prange(n_maps, nogil=True, num_threads=num_threads, schedule='dynamic'):
+        out[i] = _cluster_max(&stat_maps[index[i], 0], n, thresholds[i], tail, grid_strides, grid_lengths, custom_stride, neighbor_start, neighbors, criteria_strides, criteria_lengths, criteria_min, NULL)
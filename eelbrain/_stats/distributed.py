@@ -0,0 +1,403 @@
+# Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+"""Executors for distributing permutation tests
+
+A permutation job is a picklable callable, ``job(start, perms)``, that computes
+the maximum statistics for a block of permutations starting at index
+``start`` and returns ``(start, dists)``. Since the permutations themselves are
+drawn in the main process, results do not depend on which worker computes
+which block.
+
+Usage from the command line (start a worker on any host that can reach the
+:class:`SocketExecutor`)::
+
+    $ python -m eelbrain._stats.permutation_worker host port authkey
+
+"""
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, FIRST_COMPLETED, ThreadPoolExecutor, wait
+import ipaddress
+from itertools import count
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+import logging
+import os
+import pickle
+import queue
+import socket
+from threading import Lock, Thread
+import time
+
+import numpy as np
+
+
+Job = Callable[[int, np.ndarray], tuple[int, np.ndarray]]
+# Interval for checking whether SocketExecutor workers are connected (s)
+WORKER_POLL_INTERVAL = 10.
+
+
+class PermutationExecutor:
+    """Baseclass for distributing permutations to workers"""
+
+    def map(
+            self,
+            job: Job,
+            chunks: Iterable[tuple[int, np.ndarray]],
+    ) -> Iterator[tuple[int, np.ndarray]]:
+        """Compute ``job`` for each chunk of permutations
+
+        Yields ``(start, dists)`` for each chunk, in any order.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SharedJob:
+    """Job that is pickled once to shared memory
+
+    When a :class:`SharedJob` is pickled, only the name of the shared memory
+    is included, so that only the permutations need to be sent with each
+    chunk. Array data in the job are pickled out-of-band and accessed by
+    worker processes without copying. The job is unpickled once per process.
+    """
+
+    def __init__(self, job: Job):
+        buffers = []
+        data = pickle.dumps(job, 5, buffer_callback=buffers.append)
+        buffers = [buffer.raw() for buffer in buffers]
+        self.offsets = [0, len(data)]
+        for buffer in buffers:
+            self.offsets.append(self.offsets[-1] + buffer.nbytes)
+        self._memory = SharedMemory(create=True, size=max(1, self.offsets[-1]))
+        for i, x in enumerate([data, *buffers]):
+            self._memory.buf[self.offsets[i]: self.offsets[i + 1]] = x
+        self.name = self._memory.name
+        self.job = job
+
+    def __getstate__(self):
+        return {'name': self.name, 'offsets': self.offsets}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memory = self.job = None
+
+    def __call__(self, start, perms):
+        if self.job is None:
+            self.job = _load_shared_job(self.name, self.offsets)
+        return self.job(start, perms)
+
+    def close(self):
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+
+# Jobs loaded from shared memory in the current (worker) process
+_SHARED_JOBS = {}  # name -> (SharedMemory, job)
+_SHARED_JOBS_MAX = 2
+
+
+def _load_shared_job(name, offsets):
+    if name not in _SHARED_JOBS:
+        while len(_SHARED_JOBS) >= _SHARED_JOBS_MAX:
+            memory, job = _SHARED_JOBS.pop(next(iter(_SHARED_JOBS)))
+            del job
+            try:
+                memory.close()
+            except BufferError:  # arrays of the job are still in use
+                pass
+        memory = SharedMemory(name)
+        buffers = [memory.buf[offsets[i]: offsets[i + 1]] for i in range(1, len(offsets) - 1)]
+        job = pickle.loads(memory.buf[:offsets[1]], buffers=buffers)
+        del buffers
+        _SHARED_JOBS[name] = (memory, job)
+    return _SHARED_JOBS[name][1]
+
+
+class FuturesExecutor(PermutationExecutor):
+    """Distribute permutations through a :mod:`concurrent.futures` executor
+
+    Parameters
+    ----------
+    executor
+        Executor to which chunks of permutations are submitted (e.g., a
+        :class:`~concurrent.futures.ProcessPoolExecutor`). For executors other
+        than a :class:`~concurrent.futures.ThreadPoolExecutor`, the job,
+        including the data, is placed in shared memory once, and only the
+        permutations are sent with each chunk; the executor's workers thus
+        need to run on the local host (use :class:`SocketExecutor` for
+        workers on other hosts).
+    max_pending
+        Maximum number of chunks submitted at a time (default: twice the
+        number of workers of ``executor``).
+    """
+
+    def __init__(self, executor: Executor, max_pending: int = None):
+        if max_pending is None:
+            max_pending = 2 * (getattr(executor, '_max_workers', None) or os.cpu_count() or 1)
+        self.executor = executor
+        self.max_pending = max_pending
+
+    def map(self, job, chunks):
+        shared_job = None
+        if not isinstance(self.executor, ThreadPoolExecutor):
+            job = shared_job = SharedJob(job)
+        pending = set()
+        try:
+            for start, perms in chunks:
+                if len(pending) >= self.max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(self.executor.submit(job, start, perms))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+            if shared_job is not None:
+                # wait for running chunks before removing the shared memory
+                wait(pending)
+                shared_job.close()
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class SocketExecutor(PermutationExecutor):
+    """Distribute permutations to workers that connect through a socket
+
+    Workers can connect at any time, and stay connected across tests. Each
+    worker is sent the job once, and then receives chunks of permutations as
+    long as there are chunks left. If a worker disconnects, its current chunk is
+    given to another worker.
+
+    Parameters
+    ----------
+    address
+        ``(host, port)`` to listen on. The default listens on ``localhost`` on
+        a free port (see :attr:`address`). Use ``('', port)`` to accept
+        workers from other hosts.
+    authkey
+        Key that workers need to connect (default: a random key, see
+        :attr:`authkey`).
+    max_pending
+        Maximum number of chunks queued for workers at a time (default: twice
+        the number of connected workers).
+    timeout
+        Raise a :exc:`TimeoutError` if no worker is connected for ``timeout``
+        seconds while permutations are pending (``None`` to wait
+        indefinitely).
+
+    Attributes
+    ----------
+    address : tuple of (str, int)
+        Address on which the executor is listening.
+    authkey : bytes
+        Key that workers need to connect.
+
+    Notes
+    -----
+    Workers are started with :func:`run_permutation_worker`, or from the
+    command line with::
+
+        $ python -m eelbrain._stats.permutation_worker host port authkey
+
+    Jobs and results are exchanged as pickles, so any client that knows the
+    ``authkey`` can execute code in the main process. Only share the key with
+    trusted workers, and only listen on an address that untrusted hosts can
+    not reach.
+    """
+
+    def __init__(
+            self,
+            address: tuple[str, int] = ('localhost', 0),
+            authkey: bytes = None,
+            max_pending: int = None,
+            timeout: float = 600.,
+    ):
+        if authkey is None:
+            authkey = os.urandom(32).hex().encode()
+        elif not authkey:
+            raise ValueError(f"{authkey=}: need a non-empty key")
+        if not _is_loopback(address[0]):
+            logging.getLogger(__name__).warning("SocketExecutor is listening on %r, which may be reachable from other hosts; any client with the authkey can run code in this process", address[0])
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        self.authkey = authkey
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._tasks = queue.Queue()
+        self._results = {}  # job_id -> queue
+        self._job_ids = count()
+        self._connections = []
+        self._lock = Lock()
+        self._closed = False
+        self._log = logging.getLogger(__name__)
+        thread = Thread(target=self._accept, daemon=True)
+        thread.start()
+
+    @property
+    def n_workers(self) -> int:
+        "Number of currently connected workers"
+        with self._lock:
+            return len(self._connections)
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                if self._closed:
+                    return
+                self._log.warning("Failed connection attempt by permutation worker", exc_info=True)
+                continue
+            with self._lock:
+                self._connections.append(connection)
+            self._log.debug("Permutation worker connected from %s", self._listener.last_accepted)
+            Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        current_job_id = None  # job that this worker has
+        task = None
+        try:
+            while True:
+                task = self._tasks.get()
+                if task is None:
+                    connection.send(None)
+                    break
+                job_id, job, start, perms = task
+                if job_id not in self._results:
+                    continue  # left over from an aborted job
+                if job_id != current_job_id:
+                    connection.send(('job', job_id, job))
+                    current_job_id = job_id
+                connection.send(('chunk', job_id, start, perms))
+                result = connection.recv()
+                results = self._results.get(job_id)
+                if results is not None:
+                    results.put(result)
+                task = None
+        except (EOFError, OSError):
+            self._log.warning("Permutation worker disconnected")
+            if task is not None:
+                self._tasks.put(task)
+        finally:
+            with self._lock:
+                self._connections.remove(connection)
+            connection.close()
+
+    def map(self, job, chunks):
+        job_id = next(self._job_ids)
+        results = self._results[job_id] = queue.Queue()
+        chunks = iter(chunks)
+        n_pending = 0
+        exhausted = False
+        idle_since = None  # time since when no worker is connected
+        poll_interval = WORKER_POLL_INTERVAL if self.timeout is None else min(WORKER_POLL_INTERVAL, self.timeout)
+        try:
+            while True:
+                # only draw as many chunks as workers can take up soon
+                max_pending = self.max_pending or 2 * max(self.n_workers, 1)
+                while not exhausted and n_pending < max_pending:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                    else:
+                        start, perms = chunk
+                        self._tasks.put((job_id, job, start, perms))
+                        n_pending += 1
+                if not n_pending:
+                    break
+                try:
+                    result = results.get(timeout=poll_interval)
+                except queue.Empty:
+                    if self.n_workers:
+                        idle_since = None
+                    elif idle_since is None:
+                        idle_since = time.monotonic()
+                        self._log.warning("Waiting for permutation workers to connect to %s", self.address)
+                    elif self.timeout is not None and time.monotonic() - idle_since >= self.timeout:
+                        raise TimeoutError(f"No permutation worker connected to {self.address} within {self.timeout} s")
+                    continue
+                n_pending -= 1
+                if isinstance(result, Exception):
+                    raise result
+                yield result
+        finally:
+            del self._results[job_id]
+
+    def close(self):
+        "Disconnect all workers and stop listening"
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            n_workers = len(self._connections)
+        for _ in range(n_workers):
+            self._tasks.put(None)
+        self._listener.close()
+
+
+def _is_loopback(host: str) -> bool:
+    "Whether ``host`` refers to the local host only"
+    if not host:
+        return False
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def run_permutation_worker(
+        address: tuple[str, int],
+        authkey: bytes,
+):
+    """Compute permutations for a :class:`SocketExecutor`
+
+    Parameters
+    ----------
+    address
+        ``(host, port)`` of the :class:`SocketExecutor`.
+    authkey
+        Key for connecting to the :class:`SocketExecutor` (see
+        :attr:`SocketExecutor.authkey`).
+
+    Notes
+    -----
+    The worker executes the jobs it receives, so only connect to a
+    :class:`SocketExecutor` you trust.
+    """
+    if not authkey:
+        raise ValueError(f"{authkey=}: need the key of the SocketExecutor")
+    connection = Client(tuple(address), authkey=authkey)
+    job = None
+    try:
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            elif message[0] == 'job':
+                _, job_id, job = message
+            else:
+                _, job_id, start, perms = message
+                try:
+                    result = job(start, perms)
+                except Exception as error:
+                    result = error
+                connection.send(result)
+    finally:
+        connection.close()
@@ -9,7 +9,7 @@ Hopkins, K. D. (1976). A Simplified Method for Determining Expected Mean
     Squares and Error Terms in the Analysis of Variance. Journal of
     Experimental Education, 45(2), 13--18.
 """
-from collections.abc import Sequence
+from collections.abc import Iterator, Sequence
 
 import numpy as np
 from scipy.linalg import lstsq
@@ -22,7 +22,7 @@ from .._data_obj import (
     Dataset, Model, asmodel, assub, asvar, assert_has_no_empty_cells, find_factors,
     hasrandom, is_higher_order_effect, isbalanced, iscategorial, isnestedin)
 from .._utils import deprecate_ds_arg
-from .opt import anova_fmaps, anova_full_fmaps, lm_res_ss, ss
+from .opt import anova_fmaps, anova_fmaps_batch, anova_full_fmaps, anova_full_fmaps_batch, lm_res_ss, lm_res_ss_batch, ss
 from . import test
 
 
@@ -337,6 +337,35 @@ class MPTestMapper:
         "Process y and pu result into output array container"
         raise NotImplementedError()
 
+    def map_batch(
+            self,
+            y: np.ndarray,  # (n_cases, n_tests)
+            perms: np.ndarray,  # (n_perms, n_cases) block of permutations
+            maps: np.ndarray,  # output container from .preallocate()
+    ) -> Iterator[np.ndarray]:
+        """Process a block of permutations
+
+        Yields ``maps`` once for each permutation, filled with the results for
+        that permutation. Subclasses can override this to compute all
+        permutations in one batch; results must be identical to :meth:`map`.
+        """
+        for perm in perms:
+            self.map(y, perm)
+            yield maps
+
+
+def permuted_parametrization(x, projector, perms):
+    """Model matrix and projector for each permutation in a block
+
+    Returns
+    -------
+    x : array (n_perms, n_cases, n_betas)
+        Same as ``x.take(perm, 0)`` for each permutation.
+    projector : array (n_perms, n_betas, n_cases)
+        Same as ``projector.take(perm, 1)`` for each permutation.
+    """
+    return x[perms], np.ascontiguousarray(projector.T[perms].swapaxes(1, 2))
+
 
 class _NDANOVA(MPTestMapper):
     """Efficiently fit a model to multiple dependent variables."""
@@ -455,9 +484,20 @@ class _BalancedNDANOVA(_NDANOVA):
 
         self._map_balanced(y, flat_f_map, x_full, x_proj)
 
+    def map_batch(self, y, perms, maps):
+        x_full, x_proj = permuted_parametrization(self.p.x, self.p.projector, perms)
+        f_maps = np.empty((len(perms), self.n_effects, y.shape[1]))
+        self._map_balanced_batch(y, f_maps, x_full, x_proj)
+        for f_map in f_maps:
+            self._flat_f_map[:] = f_map
+            yield maps
+
     def _map_balanced(self, y, flat_f_map, x_full, xsinv):
         raise NotImplementedError
 
+    def _map_balanced_batch(self, y, f_maps, x_full, xsinv):
+        raise NotImplementedError
+
 
 class _BalancedFixedNDANOVA(_BalancedNDANOVA):
     "For balanced but not fully specified models"
@@ -473,6 +513,9 @@ class _BalancedFixedNDANOVA(_BalancedNDANOVA):
     def _map_balanced(self, y, flat_f_map, x_full, xsinv):
         anova_fmaps(y, x_full, xsinv, flat_f_map, self._effect_to_beta, self.df_error)
 
+    def _map_balanced_batch(self, y, f_maps, x_full, xsinv):
+        anova_fmaps_batch(y, x_full, xsinv, f_maps, self._effect_to_beta, self.df_error)
+
 
 class _BalancedMixedNDANOVA(_BalancedNDANOVA):
     """For balanced, fully specified models.
@@ -501,6 +544,9 @@ class _BalancedMixedNDANOVA(_BalancedNDANOVA):
     def _map_balanced(self, y, flat_f_map, x_full, xsinv):
         anova_full_fmaps(y, x_full, xsinv, flat_f_map, self._effect_to_beta, self._e_ms_array)
 
+    def _map_balanced_batch(self, y, f_maps, x_full, xsinv):
+        anova_full_fmaps_batch(y, x_full, xsinv, f_maps, self._effect_to_beta, self._e_ms_array)
+
 
 class _IncrementalNDANOVA(_NDANOVA):
     def __init__(self, x):
@@ -585,6 +631,41 @@ class _IncrementalNDANOVA(_NDANOVA):
             np.divide(ss_diff, df_diff, ms_diff)
             np.divide(ms_diff, ms_e, flat_f_map[i])
 
+    def map_batch(self, y, perms, maps):
+        n_perms = len(perms)
+        n_tests = y.shape[1]
+
+        # calculate ss_res for all models
+        ss_res = {}
+        for i, x in self._x_orig.items():
+            if x is None:  # same for all permutations
+                ss_res[i] = np.empty(n_tests)
+                ss(y, ss_res[i])
+            else:
+                ss_res[i] = np.empty((n_perms, n_tests))
+                x_full, xsinv = permuted_parametrization(*x, perms)
+                lm_res_ss_batch(y, x_full, xsinv, ss_res[i])
+
+        # incremental comparisons
+        f_maps = np.empty((n_perms, self.n_effects, n_tests))
+        ss_diff = ms_diff = np.empty((n_perms, n_tests))
+        ms_e = np.empty((n_perms, n_tests))
+        if not self._comparisons.mixed:
+            np.divide(ss_res[0], self.x.df_error, ms_e)
+        for i, (i_test, (i1, i0)) in enumerate(self._comparisons.comparisons.items()):
+            if self._comparisons.mixed:
+                i_ems = self._comparisons.ems_idx[i_test]
+                np.subtract(ss_res[self._full_ss_i], ss_res[i_ems], ms_e)
+                np.divide(ms_e, self.dfs_denom[i], ms_e)
+            df_diff = self._comparisons.x.effects[i_test].df
+            np.subtract(ss_res[i0], ss_res[i1], ss_diff)
+            np.divide(ss_diff, df_diff, ms_diff)
+            np.divide(ms_diff, ms_e, f_maps[:, i])
+
+        for f_map in f_maps:
+            self._flat_f_map[:] = f_map
+            yield maps
+
 
 def effect_id(effects):
     return tuple(map(id, effects))
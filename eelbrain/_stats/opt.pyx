@@ -5,6 +5,11 @@ from libc.stdlib cimport malloc, free
 cimport numpy as np
 
 
+# number of tests processed together in batched kernels
+cdef enum:
+    TILE = 256
+
+
 def anova_full_fmaps(
         const np.npy_float64[:,:] y,
         const np.npy_float64[:,:] x,
@@ -78,6 +83,109 @@ def anova_full_fmaps(
     free(mss)
 
 
+def anova_full_fmaps_batch(
+        const np.npy_float64[:,:] y,
+        const np.npy_float64[:,:,:] x,
+        const np.npy_float64[:,:,:] xsinv,
+        np.npy_float64[:,:,:] f_maps,
+        const np.npy_int64[:,:] effects,
+        const np.npy_int8[:, :] e_ms,
+):
+    """Compute f-maps for a balanced, fully specified ANOVA model for a block of permutations
+
+    Equivalent to calling :func:`anova_full_fmaps` for each permutation (with
+    identical floating point operations for each test), but the data are
+    traversed in memory order in tiles of tests.
+
+    Parameters
+    ----------
+    y : array (n_cases, n_tests)
+        Dependent Measurement.
+    x : array (n_perm, n_cases, n_betas)
+        Permuted model matrices.
+    xsinv : array (n_perm, n_betas, n_cases)
+        Permuted xsinv for regression.
+    f_maps : array (n_perm, n_fs, n_tests)
+        container for output.
+    effects : array (n_effects, 2)
+        For each effect, indicating the first index in betas and df.
+    e_ms : array (n_effects, n_effects)
+        Each row represents the expected MS of one effect.
+    """
+    cdef:
+        Py_ssize_t i0, i1, t, n_t, perm, case, i_beta, i_fmap, i_effect, i_effect_ms, i_start, i_stop, df
+        double w, ms_denom
+
+        Py_ssize_t n_tests = y.shape[1]
+        Py_ssize_t n_cases = y.shape[0]
+        Py_ssize_t n_perm = x.shape[0]
+        Py_ssize_t n_betas = x.shape[2]
+        Py_ssize_t n_effects = effects.shape[0]
+        double *betas = <double *>malloc(sizeof(double) * n_betas * TILE)
+        double *v = <double *>malloc(sizeof(double) * TILE)
+        double *ss = <double *>malloc(sizeof(double) * TILE)
+        double *mss = <double *>malloc(sizeof(double) * n_effects * TILE)
+        char *zero_var = <char *>malloc(sizeof(char) * TILE)
+
+    for i0 in range(0, n_tests, TILE):
+        i1 = min(i0 + TILE, n_tests)
+        n_t = i1 - i0
+        for t in range(n_t):
+            zero_var[t] = zero_variance(y, i0 + t)
+
+        for perm in range(n_perm):
+            # betas = xsinv * y
+            for i_beta in range(n_betas):
+                for t in range(n_t):
+                    betas[i_beta * TILE + t] = 0
+                for case in range(n_cases):
+                    w = xsinv[perm, i_beta, case]
+                    for t in range(n_t):
+                        betas[i_beta * TILE + t] += w * y[case, i0 + t]
+
+            # find MS of effects
+            for i_effect in range(n_effects):
+                i_start = effects[i_effect, 0]
+                df = effects[i_effect, 1]
+                i_stop = i_start + df
+                for t in range(n_t):
+                    ss[t] = 0
+                for case in range(n_cases):
+                    for t in range(n_t):
+                        v[t] = 0
+                    for i_beta in range(i_start, i_stop):
+                        w = x[perm, case, i_beta]
+                        for t in range(n_t):
+                            v[t] += w * betas[i_beta * TILE + t]
+                    for t in range(n_t):
+                        ss[t] += v[t] ** 2
+                for t in range(n_t):
+                    mss[i_effect * TILE + t] = ss[t] / df
+
+            # compute F maps
+            for t in range(n_t):
+                if zero_var[t]:
+                    for i_fmap in range(f_maps.shape[1]):
+                        f_maps[perm, i_fmap, i0 + t] = 0
+                    continue
+                i_fmap = 0
+                for i_effect in range(n_effects):
+                    ms_denom = 0
+                    for i_effect_ms in range(n_effects):
+                        if e_ms[i_effect, i_effect_ms] > 0:
+                            ms_denom += mss[i_effect_ms * TILE + t]
+
+                    if ms_denom > 0:
+                        f_maps[perm, i_fmap, i0 + t] = mss[i_effect * TILE + t] / ms_denom
+                        i_fmap += 1
+
+    free(betas)
+    free(v)
+    free(ss)
+    free(mss)
+    free(zero_var)
+
+
 def anova_fmaps(const np.npy_float64[:,:] y,
                 const np.npy_float64[:,:] x,
                 const np.npy_float64[:,:] xsinv,
@@ -152,6 +260,114 @@ def anova_fmaps(const np.npy_float64[:,:] y,
     free(betas)
 
 
+def anova_fmaps_batch(
+        const np.npy_float64[:,:] y,
+        const np.npy_float64[:,:,:] x,
+        const np.npy_float64[:,:,:] xsinv,
+        np.npy_float64[:,:,:] f_maps,
+        const np.npy_int64[:,:] effects,
+        int df_res,
+):
+    """Compute f-maps for a balanced ANOVA model for a block of permutations
+
+    Equivalent to calling :func:`anova_fmaps` for each permutation (with
+    identical floating point operations for each test), but the data are
+    traversed in memory order in tiles of tests.
+
+    Parameters
+    ----------
+    y : array (n_cases, n_tests)
+        Dependent Measurement.
+    x : array (n_perm, n_cases, n_betas)
+        Permuted model matrices.
+    xsinv : array (n_perm, n_betas, n_cases)
+        Permuted xsinv for regression.
+    f_maps : array (n_perm, n_fs, n_tests)
+        container for output.
+    effects : array (n_effects, 2)
+        For each effect, indicating the first index in betas and df.
+    df_res : int
+        Df of the residuals.
+    """
+    cdef:
+        Py_ssize_t i0, i1, t, n_t, perm, case, i_beta, i_effect, i_effect_beta, df
+        double w
+
+        Py_ssize_t n_tests = y.shape[1]
+        Py_ssize_t n_cases = y.shape[0]
+        Py_ssize_t n_perm = x.shape[0]
+        Py_ssize_t n_betas = x.shape[2]
+        Py_ssize_t n_effects = effects.shape[0]
+        double *betas = <double *>malloc(sizeof(double) * n_betas * TILE)
+        double *predicted_y = <double *>malloc(sizeof(double) * TILE)
+        double *ss_res = <double *>malloc(sizeof(double) * TILE)
+        double *ss_effect = <double *>malloc(sizeof(double) * n_effects * TILE)
+        double *effect_v = <double *>malloc(sizeof(double) * TILE)
+        char *zero_var = <char *>malloc(sizeof(char) * TILE)
+
+    for i0 in range(0, n_tests, TILE):
+        i1 = min(i0 + TILE, n_tests)
+        n_t = i1 - i0
+        for t in range(n_t):
+            zero_var[t] = zero_variance(y, i0 + t)
+
+        for perm in range(n_perm):
+            # betas = xsinv * y
+            for i_beta in range(n_betas):
+                for t in range(n_t):
+                    betas[i_beta * TILE + t] = 0
+                for case in range(n_cases):
+                    w = xsinv[perm, i_beta, case]
+                    for t in range(n_t):
+                        betas[i_beta * TILE + t] += w * y[case, i0 + t]
+
+            for t in range(n_t):
+                ss_res[t] = 0
+            for i_effect in range(n_effects):
+                for t in range(n_t):
+                    ss_effect[i_effect * TILE + t] = 0
+
+            for case in range(n_cases):
+                # residuals
+                for t in range(n_t):
+                    predicted_y[t] = 0
+                for i_beta in range(n_betas):
+                    w = x[perm, case, i_beta]
+                    for t in range(n_t):
+                        predicted_y[t] += w * betas[i_beta * TILE + t]
+                for t in range(n_t):
+                    ss_res[t] += (y[case, i0 + t] - predicted_y[t]) ** 2
+
+                # SS of effects
+                for i_effect in range(n_effects):
+                    i_effect_beta = effects[i_effect, 0]
+                    df = effects[i_effect, 1]
+                    for t in range(n_t):
+                        effect_v[t] = 0
+                    for i_beta in range(i_effect_beta, i_effect_beta + df):
+                        w = x[perm, case, i_beta]
+                        for t in range(n_t):
+                            effect_v[t] += w * betas[i_beta * TILE + t]
+                    for t in range(n_t):
+                        ss_effect[i_effect * TILE + t] += effect_v[t] ** 2
+
+            # F = MS_effect / MS_res
+            for i_effect in range(n_effects):
+                df = effects[i_effect, 1]
+                for t in range(n_t):
+                    if zero_var[t]:
+                        f_maps[perm, i_effect, i0 + t] = 0
+                    else:
+                        f_maps[perm, i_effect, i0 + t] = (ss_effect[i_effect * TILE + t] / df) / (ss_res[t] / df_res)
+
+    free(betas)
+    free(predicted_y)
+    free(ss_res)
+    free(ss_effect)
+    free(effect_v)
+    free(zero_var)
+
+
 def sum_square(
         const np.npy_float64[:,:] y,
         np.npy_float64[:] out,
@@ -375,6 +591,70 @@ def lm_res_ss(
     free(betas)
 
 
+def lm_res_ss_batch(
+        const np.npy_float64[:,:] y,
+        const np.npy_float64[:,:,:] x,
+        const np.npy_float64[:,:,:] xsinv,
+        np.npy_float64[:,:] ss,
+):
+    """Fit a linear model and compute the residual sum squares for a block of permutations
+
+    Equivalent to calling :func:`lm_res_ss` for each permutation (with
+    identical floating point operations for each test), but the data are
+    traversed in memory order in tiles of tests.
+
+    Parameters
+    ----------
+    y : array (n_cases, n_tests)
+        Dependent Measurement.
+    x : array (n_perm, n_cases, n_betas)
+        Permuted model matrices.
+    xsinv : array (n_perm, n_betas, n_cases)
+        Permuted xsinv for x.
+    ss : array (n_perm, n_tests)
+        Container for output.
+    """
+    cdef:
+        Py_ssize_t i0, i1, t, n_t, perm, case, i_beta
+        double w
+
+        Py_ssize_t n_tests = y.shape[1]
+        Py_ssize_t n_cases = y.shape[0]
+        Py_ssize_t n_perm = x.shape[0]
+        Py_ssize_t df_x = xsinv.shape[1]
+        double *betas = <double *>malloc(sizeof(double) * df_x * TILE)
+        double *predicted_y = <double *>malloc(sizeof(double) * TILE)
+
+    for i0 in range(0, n_tests, TILE):
+        i1 = min(i0 + TILE, n_tests)
+        n_t = i1 - i0
+        for perm in range(n_perm):
+            # betas = xsinv * y
+            for i_beta in range(df_x):
+                for t in range(n_t):
+                    betas[i_beta * TILE + t] = 0
+                for case in range(n_cases):
+                    w = xsinv[perm, i_beta, case]
+                    for t in range(n_t):
+                        betas[i_beta * TILE + t] += w * y[case, i0 + t]
+
+            # residual sum squares
+            for t in range(n_t):
+                ss[perm, i0 + t] = 0
+            for case in range(n_cases):
+                for t in range(n_t):
+                    predicted_y[t] = 0
+                for i_beta in range(df_x):
+                    w = x[perm, case, i_beta]
+                    for t in range(n_t):
+                        predicted_y[t] += w * betas[i_beta * TILE + t]
+                for t in range(n_t):
+                    ss[perm, i0 + t] += (y[case, i0 + t] - predicted_y[t]) ** 2
+
+    free(betas)
+    free(predicted_y)
+
+
 def t_1samp(
         const np.npy_float64[:,:] y,
         np.npy_float64[:] out,
@@ -512,6 +792,157 @@ def t_ind(
         out[i] = (mean1 - mean0) / (var * var_mult) ** 0.5
 
 
+def t_1samp_perm_batch(
+        const np.npy_float64[:,:] y,
+        np.npy_float64[:,:] out,
+        const np.npy_int8[:,:] signs,
+):
+    """T-values for 1-sample t-test for a block of sign-flips
+
+    Equivalent to calling :func:`t_1samp_perm` for each row of ``signs`` (with
+    identical floating point operations for each test), but the data are
+    traversed in memory order in tiles of tests.
+
+    Parameters
+    ----------
+    y : array (n_cases, n_tests)
+        Dependent Measurement.
+    out : array (n_perm, n_tests)
+        Container for output.
+    signs : array (n_perm, n_cases)
+        The randomly asigned sign for each case in each permutation.
+    """
+    cdef:
+        Py_ssize_t i0, i1, t, n_t, perm, case
+        double sign, denom
+        Py_ssize_t n_tests = y.shape[1]
+        Py_ssize_t n_cases = y.shape[0]
+        Py_ssize_t n_perm = signs.shape[0]
+        double div = (n_cases - 1) * n_cases
+        double *var = <double *>malloc(sizeof(double) * n_perm * TILE)
+
+    for i0 in range(0, n_tests, TILE):
+        i1 = min(i0 + TILE, n_tests)
+        n_t = i1 - i0
+
+        # mean
+        for perm in range(n_perm):
+            for t in range(n_t):
+                out[perm, i0 + t] = 0
+        for case in range(n_cases):
+            for perm in range(n_perm):
+                sign = signs[perm, case]
+                for t in range(n_t):
+                    out[perm, i0 + t] += y[case, i0 + t] * sign
+        for perm in range(n_perm):
+            for t in range(n_t):
+                out[perm, i0 + t] /= n_cases
+                var[perm * TILE + t] = 0
+
+        # variance
+        for case in range(n_cases):
+            for perm in range(n_perm):
+                sign = signs[perm, case]
+                for t in range(n_t):
+                    var[perm * TILE + t] += (y[case, i0 + t] * sign - out[perm, i0 + t]) ** 2
+
+        for perm in range(n_perm):
+            for t in range(n_t):
+                denom = var[perm * TILE + t] / div
+                denom **= 0.5
+                if denom > 0:
+                    out[perm, i0 + t] = out[perm, i0 + t] / denom
+                else:
+                    out[perm, i0 + t] = 0
+
+    free(var)
+
+
+def t_ind_batch(
+        const np.npy_float64[:,:] y,
+        np.npy_float64[:,:] out,
+        const np.npy_int8[:,:] groups,
+):
+    """Indpendent-samples t-test, assuming equal variance, for a block of permutations
+
+    Equivalent to calling :func:`t_ind` for each row of ``groups`` (with
+    identical floating point operations for each test), but the data are
+    traversed in memory order in tiles of tests.
+    """
+    cdef:
+        Py_ssize_t i0, i1, t, n_t, perm, case, n0, n1
+        Py_ssize_t n_tests = y.shape[1]
+        Py_ssize_t n_cases = y.shape[0]
+        Py_ssize_t n_perm = groups.shape[0]
+        Py_ssize_t df = n_cases - 2
+        double *mean0 = <double *>malloc(sizeof(double) * n_perm * TILE)
+        double *mean1 = <double *>malloc(sizeof(double) * n_perm * TILE)
+        double *var = <double *>malloc(sizeof(double) * n_perm * TILE)
+        double *var_mult = <double *>malloc(sizeof(double) * n_perm)
+        Py_ssize_t *n0s = <Py_ssize_t *>malloc(sizeof(Py_ssize_t) * n_perm)
+        Py_ssize_t *n1s = <Py_ssize_t *>malloc(sizeof(Py_ssize_t) * n_perm)
+
+    if groups.shape[1] != n_cases:
+        raise ValueError("length of group does not match n_cases in y")
+
+    for perm in range(n_perm):
+        n1 = 0
+        for case in range(n_cases):
+            if groups[perm, case]:
+                n1 += 1
+        n0 = n_cases - n1
+        n0s[perm] = n0
+        n1s[perm] = n1
+        var_mult[perm] = (1. / n0 + 1. / n1) / df
+
+    for i0 in range(0, n_tests, TILE):
+        i1 = min(i0 + TILE, n_tests)
+        n_t = i1 - i0
+        for perm in range(n_perm):
+            for t in range(n_t):
+                mean0[perm * TILE + t] = 0.
+                mean1[perm * TILE + t] = 0.
+                var[perm * TILE + t] = 0.
+
+        # means
+        for case in range(n_cases):
+            for perm in range(n_perm):
+                if groups[perm, case]:
+                    for t in range(n_t):
+                        mean1[perm * TILE + t] += y[case, i0 + t]
+                else:
+                    for t in range(n_t):
+                        mean0[perm * TILE + t] += y[case, i0 + t]
+        for perm in range(n_perm):
+            for t in range(n_t):
+                mean0[perm * TILE + t] /= n0s[perm]
+                mean1[perm * TILE + t] /= n1s[perm]
+
+        # variance
+        for case in range(n_cases):
+            for perm in range(n_perm):
+                if groups[perm, case]:
+                    for t in range(n_t):
+                        var[perm * TILE + t] += (y[case, i0 + t] - mean1[perm * TILE + t]) ** 2
+                else:
+                    for t in range(n_t):
+                        var[perm * TILE + t] += (y[case, i0 + t] - mean0[perm * TILE + t]) ** 2
+
+        for perm in range(n_perm):
+            for t in range(n_t):
+                if var[perm * TILE + t] == 0:
+                    out[perm, i0 + t] = 0
+                else:
+                    out[perm, i0 + t] = (mean1[perm * TILE + t] - mean0[perm * TILE + t]) / (var[perm * TILE + t] * var_mult[perm]) ** 0.5
+
+    free(mean0)
+    free(mean1)
+    free(var)
+    free(var_mult)
+    free(n0s)
+    free(n1s)
+
+
 def has_zero_variance(const np.npy_float64[:,:] y):
     "True if any data-columns have zero variance"
     cdef:
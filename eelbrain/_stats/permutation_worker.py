@@ -0,0 +1,15 @@
+# Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+"""Compute permutations for a :class:`~eelbrain.testnd.SocketExecutor`
+
+usage: $ python -m eelbrain._stats.permutation_worker host port authkey
+"""
+import sys
+
+from .distributed import run_permutation_worker
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        sys.exit(__doc__.strip())
+    host, port, authkey = sys.argv[1:]
+    run_permutation_worker((host, int(port)), authkey.encode())
@@ -7,13 +7,13 @@ from collections.abc import Sequence
 import numpy as np
 
 from .. import _info, fmtxt
-from .._data_obj import Dataset, Factor, Var, NDVar, Case, IndexArg, ModelArg, NDVarArg, Parametrization, PermutedParametrization, asmodel, asndvar, assub, combine
+from .._data_obj import Dataset, Factor, Var, NDVar, Case, IndexArg, ModelArg, NDVarArg, Parametrization, asmodel, asndvar, assub, combine
 from .._exceptions import DimensionMismatchError
 from .._utils import deprecate_ds_arg
 from . import stats
 from .glm import MPTestMapper
 from .test import star
-from .testnd import TTestOneSample, MultiEffectNDTest, NDPermutationDistribution, permute_order, run_permutation_me
+from .testnd import TTestOneSample, MultiEffectNDTest, NDPermutationDistribution, _samples_arg, permute_order, run_permutation_me
 
 
 class LMMapper(MPTestMapper):
@@ -23,7 +23,6 @@ class LMMapper(MPTestMapper):
             parametrization: Parametrization,
     ):
         self.parametrization = parametrization
-        self.permuted_parametrization = PermutedParametrization(parametrization, g=True)
         self._flat_t_buffer = None
 
     def preallocate(self, y_shape: Sequence[int]) -> np.ndarray:
@@ -39,11 +38,16 @@ class LMMapper(MPTestMapper):
             perm: np.ndarray = None,  # (n_cases,) permutation index
     ) -> None:
         if perm is None:
-            parametrization = self.parametrization
-        else:
-            parametrization = self.permuted_parametrization
-            parametrization.permute(perm)
-        stats.lm_t(y, parametrization, out_t=self._flat_t_buffer)
+            perm = np.arange(len(y))
+        y = y.reshape((len(y), -1))
+        stats.lm_t_batch(y, self.parametrization, perm[None], self._flat_t_buffer[None])
+
+    def map_batch(self, y, perms, maps):
+        t_maps = np.empty((len(perms), *self._flat_t_buffer.shape))
+        stats.lm_t_batch(y, self.parametrization, perms, t_maps)
+        for t_map in t_maps:
+            self._flat_t_buffer[:] = t_map
+            yield maps
 
 
 class LM(MultiEffectNDTest):
@@ -66,7 +70,10 @@ class LM(MultiEffectNDTest):
         Optional information used by :class:`LMGroup`; if subject is a column in
         ``ds`` it will be extracted automatically.
     samples
-        Number of samples for permutation test (default 10,000).
+        Number of samples for permutation test (default 10,000). With
+        ``'auto'``, permutations stop as soon as all p-values are resolved
+        relative to p = .05 (up to 10,000 permutations; see
+        :attr:`n_samples` for the actual number).
     pmin
         Threshold for forming clusters:  use a t-value equivalent to an
         uncorrected p-value.
@@ -117,7 +124,7 @@ class LM(MultiEffectNDTest):
             data: Dataset = None,
             coding: Literal['dummy', 'effect'] = 'dummy',
             subject: str = None,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             pmin: float = None,
             tmin: float = None,
             tfce: float | bool = False,
@@ -149,6 +156,7 @@ class LM(MultiEffectNDTest):
 
         # Cluster-based tests
         n_effects = len(parametrization.column_names)
+        samples, sequential = _samples_arg(samples)
         n_threshold_params = sum((pmin is not None, tmin is not None, bool(tfce)))
         if n_threshold_params == 0 and not samples:
             cdists = None
@@ -163,7 +171,7 @@ class LM(MultiEffectNDTest):
             else:
                 thresholds = tuple(repeat(None, n_effects))
 
-            cdists = [NDPermutationDistribution(y, samples, thresh, tfce, 0, 't', name, tstart, tstop, criteria, None, force_permutation) for name, thresh in zip(parametrization.column_names, thresholds)]
+            cdists = [NDPermutationDistribution(y, samples, thresh, tfce, 0, 't', name, tstart, tstop, criteria, None, force_permutation, sequential) for name, thresh in zip(parametrization.column_names, thresholds)]
 
             # Find clusters in the actual data
             do_permutation = 0
@@ -105,6 +105,15 @@ def corr(y, x, out=None, perm=None):
     return out
 
 
+def _lm_residual_ms(y, x, b, out=None):
+    "Residual mean square, computed from the residuals ``y - x * b``"
+    res = x.dot(b)
+    np.subtract(y, res, res)
+    out = np.einsum('ij,ij->j', res, res, out=out)
+    out /= len(y) - x.shape[1]
+    return out
+
+
 def lm_betas_se_1d(y, b, p):
     """Regression coefficient standard errors
 
@@ -117,10 +126,7 @@ def lm_betas_se_1d(y, b, p):
     p : Parametrization
         Parametrized model.
     """
-    v = np.einsum('i...,i...', y, y)
-    y_hat = b.T.dot(p.x.T).T
-    v -= np.einsum('i...,i...', y_hat, y)
-    v /= len(y) - p.x.shape[1]
+    v = _lm_residual_ms(y, p.x, b)
     var_b = v * p.g.diagonal()[:, None]
     return np.sqrt(var_b, var_b)
 
@@ -141,6 +147,29 @@ def lm_t(
     return b, se, t
 
 
+def lm_t_batch(
+        y: np.ndarray,  # [n_cases, n_tests]
+        p: Parametrization,  # Parametrized model
+        perms: np.ndarray,  # [n_perms, n_cases] permutations
+        out: np.ndarray,  # [n_perms, n_betas, n_tests]
+) -> np.ndarray:
+    """T-values for regression coefficients for a block of permutations
+
+    Equivalent to :func:`lm_t` with the rows of ``p.x`` permuted by each
+    permutation. The coefficients for all permutations are computed in one
+    stacked matrix product; residuals are computed one permutation at a time
+    to keep memory use at the size of ``y``.
+    """
+    projectors = np.ascontiguousarray(p.projector[:, perms].swapaxes(0, 1))  # [n_perms, n_betas, n_cases]
+    np.matmul(projectors, y, out=out)
+    ms = np.empty((len(perms), y.shape[1]))
+    for i, perm in enumerate(perms):
+        _lm_residual_ms(y, p.x[perm], out[i], ms[i])
+    se = ms[:, None, :] * p.g.diagonal()[:, None]
+    np.sqrt(se, se)
+    return np.divide(out, se, out)
+
+
 def residual_mean_square(y, x=None):
     """Mean square of the residuals
 
@@ -379,6 +408,24 @@ def t_ind(y, group, out=None, perm=None):
     return out
 
 
+def t_ind_batch(y, group, out, perms):
+    """T-values for independent samples t-test for a block of permutations
+
+    Parameters
+    ----------
+    y : array (n_cases, n_tests)
+        Dependent measurement.
+    group : array of int8 (n_cases,)
+        Group membership.
+    out : array (n_perms, n_tests)
+        Container for output.
+    perms : array of int (n_perms, n_cases)
+        Permutations.
+    """
+    opt.t_ind_batch(y, out, group[perms])
+    return out
+
+
 def rtest_p(r, df):
     # http://en.wikipedia.org/wiki/Pearson_product-moment_correlation_coefficient#Inference
     r = np.asanyarray(r)
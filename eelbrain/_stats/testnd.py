@@ -20,19 +20,25 @@ n_samples : None | int
     or permutations is performed, then ``n_samples`` indicates the actual
     number of permutations that constitute the complete set.
 '''
+from contextlib import contextmanager
+from copy import deepcopy
 from datetime import datetime, timedelta
 from functools import cached_property, reduce, partial
-from itertools import chain, repeat
+from itertools import chain, islice, repeat, takewhile
 from math import ceil
 from multiprocessing.shared_memory import SharedMemory
+import hashlib
 import logging
 import operator
 import os
+import pickle
 import re
 import socket
-from threading import Thread
+from threading import Semaphore, Thread, get_ident
 from time import time as current_time
-from collections.abc import Iterable
+from typing import Literal
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import Executor
 
 import numpy as np
 import scipy.stats
@@ -51,10 +57,11 @@ from .._data_obj import (
 from .._exceptions import OldVersionError, WrongDimensionError, ZeroVarianceError
 from .._utils import deprecate_ds_arg, user_activity, restore_main_spec
 from .._utils.numpy_utils import FULL_AXIS_SLICE
-from .._utils.notebooks import trange
+from .._utils.notebooks import tqdm
 from . import opt, stats, vector
 from .adjacency import Adjacency, find_peaks
-from .adjacency_opt import merge_labels, tfce_increment
+from .adjacency_opt import cluster_max_stat, cluster_max_stats, merge_labels, tfce_union_find
+from .distributed import FuturesExecutor, PermutationExecutor
 from .glm import MPTestMapper, _nd_anova
 from .permutation import (
     _resample_params, permute_order, permute_sign_flip, random_seeds,
@@ -64,6 +71,37 @@ from .test import star, star_factor, _independent_measures_args, _related_measur
 
 
 __test__ = False
+# Number of permutations sent to a worker process at a time (None: automatic)
+PERMUTATION_CHUNK_SIZE = None
+MAX_CHUNK_SIZE = 100
+# Directory and interval (seconds) for permutation checkpoints (see permutation_checkpoints())
+_CHECKPOINT = None
+# Executor for distributing permutations (see permutation_executor())
+_EXECUTOR = None
+# Sequential stopping (samples='auto'): maximum number of permutations, number
+# of permutations between evaluating the stopping rule, and the level and
+# confidence (over all evaluations) relative to which p-values need to be
+# resolved
+SEQUENTIAL_MAX_SAMPLES = 10000
+SEQUENTIAL_CHECK_INTERVAL = 100
+SEQUENTIAL_ALPHA = 0.05
+SEQUENTIAL_CONFIDENCE = 0.99
+# Memory for permutation tests in bytes (None: available system memory)
+PERMUTATION_MEMORY = None
+# Compute raw maximum statistics in tiles of this many points (None: only when
+# needed to stay within PERMUTATION_MEMORY)
+PERMUTATION_TILE_SIZE = None
+MIN_TILE_SIZE = 1000
+# In tiled tests, each tile of y is copied once for a round of this many
+# permutations
+TILE_ROUND_SIZE = 1000
+# Buffers of the map processors in bytes per point of the map: TFCE uses the
+# union-find parent, size, start, order and accumulator arrays (5 * 8), the
+# height level of each point, the negated map and the TFCE map (3 * 8);
+# cluster labeling uses the sign (1) and the union-find parent, size, last and
+# mass arrays (4 * 8) and the uint32 cluster map (4)
+TFCE_BYTES_PER_POINT = 64
+CLUSTER_BYTES_PER_POINT = 37
 
 
 def check_for_vector_dim(y: NDVar) -> None:
@@ -111,6 +149,8 @@ class NDTest:
         self.tstart = tstart
         self.tstop = tstop
         self._dims = y.dims[1:]
+        if self._first_cdist is not None and self._first_cdist.sequential:
+            self.samples = self._first_cdist.samples
 
     def __getstate__(self):
         return {name: getattr(self, name) for name in self._attributes}
@@ -185,6 +225,8 @@ class NDTest:
             return f"a complete set of {self.n_samples} permutations"
         elif self.samples is None:
             return "no permutations"
+        elif self._first_cdist is not None and self._first_cdist.sequential:
+            return f"{self.n_samples} random permutations (sequential stopping with a maximum of {self._first_cdist.sequential} permutations)"
         else:
             return f"{self.n_samples} random permutations"
 
@@ -461,8 +503,11 @@ class TContrastRelated(NDTest):
         0: both (two-tailed);
         1: upper tail (one-tailed);
         -1: lower tail (one-tailed).
-    samples : int
-        Number of samples for permutation test (default 10,000).
+    samples : int | 'auto'
+        Number of samples for permutation test (default 10,000). With
+        ``'auto'``, permutations stop as soon as all p-values are resolved
+        relative to p = .05 (up to 10,000 permutations; see
+        :attr:`n_samples` for the actual number).
     pmin : None | scalar (0 < pmin < 1)
         Threshold for forming clusters:  use a t-value equivalent to an
         uncorrected p-value for a related samples t-test (with df =
@@ -541,7 +586,7 @@ class TContrastRelated(NDTest):
             sub: CategorialArg = None,
             data: Dataset = None,
             tail: int = 0,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             pmin: float = None,
             tmin: float = None,
             tfce: float | bool = False,
@@ -562,6 +607,8 @@ class TContrastRelated(NDTest):
         # original data
         tmap = t_contrast.map(ct.y.x)
 
+        samples, sequential = _samples_arg(samples)
+
         n_threshold_params = sum((pmin is not None, tmin is not None, bool(tfce)))
         if n_threshold_params == 0 and not samples:
             threshold = cdist = None
@@ -578,7 +625,7 @@ class TContrastRelated(NDTest):
 
             cdist = NDPermutationDistribution(
                 ct.y, samples, threshold, tfce, tail, 't', "t-contrast",
-                tstart, tstop, criteria, parc, force_permutation)
+                tstart, tstop, criteria, parc, force_permutation, sequential)
             cdist.add_original(tmap)
             if cdist.do_permutation:
                 iterator = permute_order(len(ct.y), samples, unit=ct.match)
@@ -634,8 +681,11 @@ class Correlation(NDTest):
     data : Dataset
         If a Dataset is specified, all data-objects can be specified as
         names of Dataset variables.
-    samples : int
-        Number of samples for permutation test (default 10,000).
+    samples : int | 'auto'
+        Number of samples for permutation test (default 10,000). With
+        ``'auto'``, permutations stop as soon as all p-values are resolved
+        relative to p = .05 (up to 10,000 permutations; see
+        :attr:`n_samples` for the actual number).
     pmin : None | scalar (0 < pmin < 1)
         Threshold for forming clusters:  use an r-value equivalent to an
         uncorrected p-value.
@@ -694,7 +744,7 @@ class Correlation(NDTest):
             norm: CategorialArg = None,
             sub: IndexArg = None,
             data: Dataset = None,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             pmin: float = None,
             rmin: float = None,
             tfce: float | bool = False,
@@ -736,6 +786,8 @@ class Correlation(NDTest):
 
         rmap = stats.corr(y.x, x.x)
 
+        samples, sequential = _samples_arg(samples)
+
         n_threshold_params = sum((pmin is not None, rmin is not None, bool(tfce)))
         if n_threshold_params == 0 and not samples:
             threshold = cdist = None
@@ -751,7 +803,7 @@ class Correlation(NDTest):
 
             cdist = NDPermutationDistribution(
                 y, samples, threshold, tfce, 0, 'r', name,
-                tstart, tstop, criteria, parc)
+                tstart, tstop, criteria, parc, sequential=sequential)
             cdist.add_original(rmap)
             if cdist.do_permutation:
                 iterator = permute_order(n, samples, unit=match)
@@ -879,8 +931,11 @@ class TTestOneSample(NDDifferenceTest):
         0: both (two-tailed);
         1: upper tail (one-tailed);
         -1: lower tail (one-tailed).
-    samples : int
-        Number of samples for permutation test (default 10,000).
+    samples : int | 'auto'
+        Number of samples for permutation test (default 10,000). With
+        ``'auto'``, permutations stop as soon as all p-values are resolved
+        relative to p = .05 (up to 10,000 permutations; see
+        :attr:`n_samples` for the actual number).
     pmin : None | scalar (0 < pmin < 1)
         Threshold for forming clusters:  use a t-value equivalent to an
         uncorrected p-value.
@@ -947,7 +1002,7 @@ class TTestOneSample(NDDifferenceTest):
             sub: IndexArg = None,
             data: Dataset = None,
             tail: int = 0,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             pmin: float = None,
             tmin: float = None,
             tfce: float | bool = False,
@@ -974,6 +1029,8 @@ class TTestOneSample(NDDifferenceTest):
         else:
             diff = y
 
+        samples, sequential = _samples_arg(samples)
+
         n_threshold_params = sum((pmin is not None, tmin is not None, bool(tfce)))
         if n_threshold_params == 0 and not samples:
             threshold = cdist = None
@@ -994,11 +1051,11 @@ class TTestOneSample(NDDifferenceTest):
             n_samples, samples = _resample_params(len(y_perm), samples)
             cdist = NDPermutationDistribution(
                 y_perm, n_samples, threshold, tfce, tail, 't', '1-Sample t-Test',
-                tstart, tstop, criteria, parc, force_permutation)
+                tstart, tstop, criteria, parc, force_permutation, sequential and samples > 0)
             cdist.add_original(tmap)
             if cdist.do_permutation:
                 iterator = permute_sign_flip(n, samples)
-                run_permutation(opt.t_1samp_perm, cdist, iterator)
+                run_permutation(opt.t_1samp_perm, cdist, iterator, batch_func=opt.t_1samp_perm_batch)
 
         # NDVar map of t-values
         info = _info.for_stat_map('t', threshold, tail=tail, old=ct.y.info)
@@ -1087,8 +1144,11 @@ class TTestIndependent(NDDifferenceTest):
         0: both (two-tailed);
         1: upper tail (one-tailed);
         -1: lower tail (one-tailed).
-    samples : int
-        Number of samples for permutation test (default 10,000).
+    samples : int | 'auto'
+        Number of samples for permutation test (default 10,000). With
+        ``'auto'``, permutations stop as soon as all p-values are resolved
+        relative to p = .05 (up to 10,000 permutations; see
+        :attr:`n_samples` for the actual number).
     pmin : None | scalar (0 < pmin < 1)
         Threshold p value for forming clusters. None for threshold-free
         cluster enhancement.
@@ -1160,7 +1220,7 @@ class TTestIndependent(NDDifferenceTest):
             sub: IndexArg = None,
             data: Dataset = None,
             tail: int = 0,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             pmin: float = None,
             tmin: float = None,
             tfce: float | bool = False,
@@ -1183,6 +1243,8 @@ class TTestIndependent(NDDifferenceTest):
         groups.dtype = np.int8
         tmap = stats.t_ind(y.x, groups)
 
+        samples, sequential = _samples_arg(samples)
+
         n_threshold_params = sum((pmin is not None, tmin is not None, bool(tfce)))
         if n_threshold_params == 0 and not samples:
             threshold = cdist = None
@@ -1196,11 +1258,11 @@ class TTestIndependent(NDDifferenceTest):
             else:
                 threshold = None
 
-            cdist = NDPermutationDistribution(y, samples, threshold, tfce, tail, 't', 'Independent Samples t-Test', tstart, tstop, criteria, parc, force_permutation)
+            cdist = NDPermutationDistribution(y, samples, threshold, tfce, tail, 't', 'Independent Samples t-Test', tstart, tstop, criteria, parc, force_permutation, sequential)
             cdist.add_original(tmap)
             if cdist.do_permutation:
                 iterator = permute_order(n, samples)
-                run_permutation(stats.t_ind, cdist, iterator, groups)
+                run_permutation(stats.t_ind, cdist, iterator, groups, batch_func=stats.t_ind_batch)
 
         # store attributes
         NDDifferenceTest.__init__(self, y, match, sub, samples, tfce, pmin, cdist, tstart, tstop)
@@ -1311,7 +1373,10 @@ class TTestRelated(NDMaskedC1Mixin, NDDifferenceTest):
         1: upper tail (one-tailed);
         -1: lower tail (one-tailed).
     samples
-        Number of samples for permutation test (default 10,000).
+        Number of samples for permutation test (default 10,000). With
+        ``'auto'``, permutations stop as soon as all p-values are resolved
+        relative to p = .05 (up to 10,000 permutations; see
+        :attr:`n_samples` for the actual number).
     pmin
         Threshold for forming clusters:  use a t-value equivalent to an
         uncorrected p-value.
@@ -1392,7 +1457,7 @@ class TTestRelated(NDMaskedC1Mixin, NDDifferenceTest):
             sub: IndexArg = None,
             data: Dataset = None,
             tail: int = 0,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             pmin: float = None,
             tmin: float = None,
             tfce: float | bool = False,
@@ -1410,6 +1475,8 @@ class TTestRelated(NDMaskedC1Mixin, NDDifferenceTest):
         diff = y1 - y0
         tmap = stats.t_1samp(diff.x)
 
+        samples, sequential = _samples_arg(samples)
+
         n_threshold_params = sum((pmin is not None, tmin is not None, bool(tfce)))
         if n_threshold_params == 0 and not samples:
             threshold = cdist = None
@@ -1426,11 +1493,11 @@ class TTestRelated(NDMaskedC1Mixin, NDDifferenceTest):
             n_samples, samples = _resample_params(len(diff), samples)
             cdist = NDPermutationDistribution(
                 diff, n_samples, threshold, tfce, tail, 't', 'Related Samples t-Test',
-                tstart, tstop, criteria, parc, force_permutation)
+                tstart, tstop, criteria, parc, force_permutation, sequential and samples > 0)
             cdist.add_original(tmap)
             if cdist.do_permutation:
                 iterator = permute_sign_flip(n, samples)
-                run_permutation(opt.t_1samp_perm, cdist, iterator)
+                run_permutation(opt.t_1samp_perm, cdist, iterator, batch_func=opt.t_1samp_perm_batch)
 
         # NDVar map of t-values
         info = _info.for_stat_map('t', threshold, tail=tail, old=y1.info)
@@ -1743,8 +1810,11 @@ class ANOVA(MultiEffectNDTest):
     data : Dataset
         If a Dataset is specified, all data-objects can be specified as
         names of Dataset variables.
-    samples : int
-        Number of samples for permutation test (default 10,000).
+    samples : int | 'auto'
+        Number of samples for permutation test (default 10,000). With
+        ``'auto'``, permutations stop as soon as all p-values are resolved
+        relative to p = .05 (up to 10,000 permutations; see
+        :attr:`n_samples` for the actual number).
     pmin : None | scalar (0 < pmin < 1)
         Threshold for forming clusters:  use an f-value equivalent to an
         uncorrected p-value.
@@ -1814,7 +1884,7 @@ class ANOVA(MultiEffectNDTest):
             x: ModelArg,
             sub: IndexArg = None,
             data: Dataset = None,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             pmin: float = None,
             fmin: float = None,
             tfce: float | bool = False,
@@ -1847,6 +1917,7 @@ class ANOVA(MultiEffectNDTest):
         fmaps = lm.map(y.x)
 
         # Cluster-based tests
+        samples, sequential = _samples_arg(samples)
         n_threshold_params = sum((pmin is not None, fmin is not None, bool(tfce)))
         if n_threshold_params == 0 and not samples:
             cdists = None
@@ -1861,7 +1932,7 @@ class ANOVA(MultiEffectNDTest):
             else:
                 thresholds = tuple(repeat(None, len(effects)))
 
-            cdists = [NDPermutationDistribution(y, samples, thresh, tfce, 1, 'f', e.name, tstart, tstop, criteria, parc, force_permutation) for e, thresh in zip(effects, thresholds)]
+            cdists = [NDPermutationDistribution(y, samples, thresh, tfce, 1, 'f', e.name, tstart, tstop, criteria, parc, force_permutation, sequential) for e, thresh in zip(effects, thresholds)]
 
             # Find clusters in the actual data
             do_permutation = 0
@@ -2030,8 +2101,11 @@ class Vector(NDDifferenceTest):
     data : Dataset
         If a Dataset is specified, all data-objects can be specified as
         names of Dataset variables
-    samples : int
-        Number of samples for permutation test (default 10000).
+    samples : int | 'auto'
+        Number of samples for permutation test (default 10000). With
+        ``'auto'``, permutations stop as soon as all p-values are resolved
+        relative to p = .05 (up to 10,000 permutations; see
+        :attr:`n_samples` for the actual number).
     tmin : scalar
         Threshold value for forming clusters.
     tfce : bool | scalar
@@ -2104,7 +2178,7 @@ class Vector(NDDifferenceTest):
             match: CategorialArg = None,
             sub: IndexArg = None,
             data: Dataset = None,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             tmin: float = None,
             tfce: float | bool = False,
             tstart: float = None,
@@ -2117,7 +2191,8 @@ class Vector(NDDifferenceTest):
         ct = Celltable(y, match=match, sub=sub, data=data, coercion=asndvar, dtype=np.float64)
 
         n = len(ct.y)
-        cdist = NDPermutationDistribution(ct.y, samples, tmin, tfce, 1, 'norm', 'Vector test', tstart, tstop, criteria, parc, force_permutation)
+        samples, sequential = _samples_arg(samples)
+        cdist = NDPermutationDistribution(ct.y, samples, tmin, tfce, 1, 'norm', 'Vector test', tstart, tstop, criteria, parc, force_permutation, sequential)
 
         v_dim = ct.y.dimnames[cdist._vector_ax + 1]
         v_mean = ct.y.mean('case')
@@ -2214,8 +2289,11 @@ class VectorDifferenceIndependent(Vector):
     data : Dataset
         If a Dataset is specified, all data-objects can be specified as
         names of Dataset variables.
-    samples : int
-        Number of samples for permutation test (default 10000).
+    samples : int | 'auto'
+        Number of samples for permutation test (default 10000). With
+        ``'auto'``, permutations stop as soon as all p-values are resolved
+        relative to p = .05 (up to 10,000 permutations; see
+        :attr:`n_samples` for the actual number).
     tmin : scalar
         Threshold value for forming clusters.
     tfce : bool | scalar
@@ -2285,7 +2363,7 @@ class VectorDifferenceIndependent(Vector):
             match: CategorialArg = None,
             sub: IndexArg = None,
             data: Dataset = None,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             tmin: float = None,
             tfce: bool = False,
             tstart: float = None,
@@ -2300,7 +2378,8 @@ class VectorDifferenceIndependent(Vector):
         self.n0 = len(y0)
         self.n = len(y)
 
-        cdist = NDPermutationDistribution(y, samples, tmin, tfce, 1, 'norm', 'Vector test (independent)', tstart, tstop, criteria, parc, force_permutation)
+        samples, sequential = _samples_arg(samples)
+        cdist = NDPermutationDistribution(y, samples, tmin, tfce, 1, 'norm', 'Vector test (independent)', tstart, tstop, criteria, parc, force_permutation, sequential)
 
         self._v_dim = v_dim = y.dimnames[cdist._vector_ax + 1]
         self.c1_mean = y1.mean('case', name=cellname(c1_name))
@@ -2380,8 +2459,11 @@ class VectorDifferenceRelated(NDMaskedC1Mixin, Vector):
     data : Dataset
         If a Dataset is specified, all data-objects can be specified as
         names of Dataset variables.
-    samples : int
-        Number of samples for permutation test (default 10000).
+    samples : int | 'auto'
+        Number of samples for permutation test (default 10000). With
+        ``'auto'``, permutations stop as soon as all p-values are resolved
+        relative to p = .05 (up to 10,000 permutations; see
+        :attr:`n_samples` for the actual number).
     tmin : scalar
         Threshold value for forming clusters.
     tfce : bool | scalar
@@ -2447,7 +2529,7 @@ class VectorDifferenceRelated(NDMaskedC1Mixin, Vector):
             match: CategorialArg = None,
             sub: IndexArg = None,
             data: Dataset = None,
-            samples: int = 10000,
+            samples: int | Literal['auto'] = 10000,
             tmin: float = None,
             tfce: bool = False,
             tstart: float = None,
@@ -2461,8 +2543,9 @@ class VectorDifferenceRelated(NDMaskedC1Mixin, Vector):
         difference = y1 - y0
         difference.name = 'difference'
 
+        samples, sequential = _samples_arg(samples)
         n_samples, samples = _resample_params(n, samples)
-        cdist = NDPermutationDistribution(difference, n_samples, tmin, tfce, 1, 'norm', 'Vector test (related)', tstart, tstop, criteria, parc, force_permutation)
+        cdist = NDPermutationDistribution(difference, n_samples, tmin, tfce, 1, 'norm', 'Vector test (related)', tstart, tstop, criteria, parc, force_permutation, sequential and samples > 0)
 
         v_dim = difference.dimnames[cdist._vector_ax + 1]
         v_mean = difference.mean('case')
@@ -2697,43 +2780,26 @@ def _label_clusters_binary(bin_map, cmap, cmap_flat, adjacency, criteria):
 
 def tfce(stat_map, tail, adjacency, dh=0.1):
     tfce_im = np.empty(stat_map.shape, np.float64)
-    tfce_im_1d = flatten_1d(tfce_im)
-    bin_buff = np.empty(stat_map.shape, bool)
-    int_buff = np.empty(stat_map.shape, np.uint32)
-    int_buff_flat = flatten(int_buff, adjacency)
-    int_buff_1d = flatten_1d(int_buff)
-    return _tfce(stat_map, tail, adjacency, tfce_im, tfce_im_1d, bin_buff, int_buff,
-                 int_buff_flat, int_buff_1d, dh)
+    graph = adjacency.flat_graph(stat_map.shape)
+    return _tfce(stat_map, tail, graph, tfce_im, flatten_1d(tfce_im), dh)
 
 
-def _tfce(stat_map, tail, conn, out, out_1d, bin_buff, int_buff,
-          int_buff_flat, int_buff_1d, dh=0.1, e=0.5, h=2.0):
-    "Threshold-free cluster enhancement"
-    out.fill(0)
+def _tfce(stat_map, tail, graph, out, out_1d, dh=0.1, e=0.5, h=2.0):
+    """Threshold-free cluster enhancement
 
-    # determine slices
-    if tail == 0:
-        hs = chain(np.arange(-dh, stat_map.min(), -dh),
-                   np.arange(dh, stat_map.max(), dh))
-    elif tail < 0:
-        hs = np.arange(-dh, stat_map.min(), -dh)
-    else:
+    Equivalent to labeling clusters at each height step, but clusters are
+    merged incrementally in a single pass over the sorted map.
+    """
+    out.fill(0)
+    stat_map_1d = stat_map.ravel()
+    if tail >= 0:
         hs = np.arange(dh, stat_map.max(), dh)
-
-    # label clusters in slices at different heights
-    # fill each cluster with total section value
-    # each point's value is the vertical sum
-    for h_ in hs:
-        if h_ > 0:
-            np.greater_equal(stat_map, h_, bin_buff)
-            h_factor = h_ ** h
-        else:
-            np.less_equal(stat_map, h_, bin_buff)
-            h_factor = (-h_) ** h
-
-        c_ids = _label_clusters_binary(bin_buff, int_buff, int_buff_flat, conn, None)
-        tfce_increment(c_ids, int_buff_1d, out_1d, e, h_factor)
-
+        levels = np.searchsorted(hs, stat_map_1d, 'right')
+        tfce_union_find(levels, hs ** h, out_1d, *graph, e)
+    if tail <= 0:
+        hs = -np.arange(-dh, stat_map.min(), -dh)
+        levels = np.searchsorted(hs, -stat_map_1d, 'right')
+        tfce_union_find(levels, hs ** h, out_1d, *graph, e)
     return out
 
 
@@ -2768,19 +2834,12 @@ class TFCEProcessor(StatMapProcessor):
         self.dh = dh
 
         # Pre-allocate memory buffers used for cluster processing
-        self._bin_buff = np.empty(shape, bool)
-        self._int_buff = np.empty(shape, np.uint32)
+        self._graph = adjacency.flat_graph(shape)
         self._tfce_im = np.empty(shape, np.float64)
         self._tfce_im_1d = flatten_1d(self._tfce_im)
-        self._int_buff_flat = flatten(self._int_buff, adjacency)
-        self._int_buff_1d = flatten_1d(self._int_buff)
 
     def max_stat(self, stat_map):
-        v = _tfce(
-            stat_map, self.tail, self.adjacency, self._tfce_im, self._tfce_im_1d,
-            self._bin_buff, self._int_buff, self._int_buff_flat, self._int_buff_1d,
-            self.dh,
-        ).max(self.max_axes)
+        v = _tfce(stat_map, self.tail, self._graph, self._tfce_im, self._tfce_im_1d, self.dh).max(self.max_axes)
         if self.parc is None:
             return v
         else:
@@ -2797,41 +2856,53 @@ class ClusterProcessor(StatMapProcessor):
         self.threshold = threshold
         self.criteria = criteria
 
-        # Pre-allocate memory buffers used for cluster processing
-        self._bin_buff = np.empty(shape, bool)
+        # adjacency graph and extent criteria for the labeling kernel
+        self._graph = adjacency.flat_graph(shape)
+        strides = [int(np.prod(shape[i + 1:])) for i in range(len(shape))]
+        criteria_axes = [] if criteria is None else [(set(range(len(shape))).difference(axes).pop(), v) for axes, v in criteria]
+        self._criteria = (
+            np.array([strides[ax] for ax, _ in criteria_axes], np.int64),
+            np.array([shape[ax] for ax, _ in criteria_axes], np.int64),
+            np.array([v for _, v in criteria_axes], np.int64),
+        )
 
-        self._cmap = np.empty(shape, np.uint32)
-        self._cmap_flat = flatten(self._cmap, adjacency)
-
-        if tail == 0:
-            self._int_buff = np.empty(shape, np.uint32)
-            self._int_buff_flat = flatten(self._int_buff, adjacency)
-        else:
-            self._int_buff = self._int_buff_flat = None
+        # Pre-allocate memory buffers used for cluster processing
+        if parc is not None:
+            self._cmap = np.empty(shape, np.uint32)
+            self._cmap_1d = flatten_1d(self._cmap)
 
     def max_stat(self, stat_map, threshold=None):
         if threshold is None:
             threshold = self.threshold
+        if self.parc is None:
+            return cluster_max_stat(stat_map.ravel(), threshold, self.tail, *self._graph, *self._criteria)
+
         cmap = self._cmap
-        cids = _label_clusters(stat_map, threshold, self.tail, self.adjacency, self.criteria, cmap, self._cmap_flat, self._bin_buff, self._int_buff, self._int_buff_flat)
-        if self.parc is not None:
-            v = []
-            for idx in self.parc:
-                clusters_v = ndimage.sum(stat_map[idx], cmap[idx], cids)
-                if len(clusters_v):
-                    if self.tail <= 0:
-                        np.abs(clusters_v, clusters_v)
-                    v.append(clusters_v.max())
-                else:
-                    v.append(0)
-            return v
-        elif len(cids):
-            clusters_v = ndimage.sum(stat_map, cmap, cids)
-            if self.tail <= 0:
-                np.abs(clusters_v, clusters_v)
-            return clusters_v.max()
-        else:
-            return 0
+        cluster_max_stat(stat_map.ravel(), threshold, self.tail, *self._graph, *self._criteria, self._cmap_1d)
+        cids = np.flatnonzero(np.bincount(self._cmap_1d)[1:]) + 1
+        v = []
+        for idx in self.parc:
+            clusters_v = ndimage.sum(stat_map[idx], cmap[idx], cids)
+            if len(clusters_v):
+                if self.tail <= 0:
+                    np.abs(clusters_v, clusters_v)
+                v.append(clusters_v.max())
+            else:
+                v.append(0)
+        return v
+
+    def max_stats(
+            self,
+            stat_maps: np.ndarray,  # (n_maps, ...)
+            index: np.ndarray,  # index of the maps to process
+            thresholds: np.ndarray,  # threshold for each map in index
+            out: np.ndarray,  # maximum statistic for each map in index
+            num_threads: int = 1,
+    ):
+        "Maximum statistic for several maps (without parc), labeled in parallel threads"
+        assert self.parc is None
+        stat_maps = stat_maps.reshape((len(stat_maps), -1))
+        cluster_max_stats(stat_maps, index, thresholds, self.tail, *self._graph, *self._criteria, out, num_threads)
 
 
 def get_map_processor(kind, *args):
@@ -2877,6 +2948,10 @@ class NDPermutationDistribution:
         this dimension. For threshold-based test, the regions are disconnected.
     force_permutation : bool
         Conduct permutations regardless of whether there are any clusters.
+    sequential : bool
+        Stop permutations as soon as all p-values are resolved relative to
+        :data:`SEQUENTIAL_ALPHA` (``samples`` is the maximum number of
+        permutations).
 
 
     Notes
@@ -2898,8 +2973,9 @@ class NDPermutationDistribution:
     """
     dist = None
     tfce_warning = None
+    sequential = None  # maximum number of samples with sequential stopping
 
-    def __init__(self, y, samples, threshold, tfce=False, tail=0, meas='?', name=None, tstart=None, tstop=None, criteria={}, parc=None, force_permutation=False):
+    def __init__(self, y, samples, threshold, tfce=False, tail=0, meas='?', name=None, tstart=None, tstop=None, criteria={}, parc=None, force_permutation=False, sequential=False):
         assert y.has_case
         assert parc is None or isinstance(parc, str)
         if tfce and threshold:
@@ -3056,6 +3132,8 @@ class NDPermutationDistribution:
         self._init_time = current_time()
         self._host = socket.gethostname()
         self.force_permutation = force_permutation
+        if sequential:
+            self.sequential = samples
 
         from .. import __version__
         self._version = __version__
@@ -3170,6 +3248,66 @@ class NDPermutationDistribution:
 
         return dist
 
+    def _p_values_resolved(self, dist: np.ndarray, n_looks: int = 1) -> bool:
+        """Whether all p-values are resolved relative to ``SEQUENTIAL_ALPHA``
+
+        Parameters
+        ----------
+        dist
+            The permutations computed so far.
+        n_looks
+            Number of times the rule is evaluated in the course of the test.
+
+        Notes
+        -----
+        A p-value is resolved when its Clopper-Pearson confidence interval
+        does not include ``SEQUENTIAL_ALPHA``. The confidence level of each
+        interval is Bonferroni-adjusted for ``n_looks``, so that the
+        probability of any wrong decision over the course of the test is at
+        most ``1 - SEQUENTIAL_CONFIDENCE``. With ``parc``, p-values within each
+        region (based on that region's distribution) and p-values corrected
+        across regions all need to be resolved.
+        """
+        if self.kind == 'cluster':
+            if not self.n_clusters:
+                return True
+            cluster_v = np.abs(ndimage.sum(self._original_param_map, self._original_cluster_map, self._cids))
+            value_map = None
+        elif self.kind == 'tfce':
+            value_map = self._original_cluster_map
+        elif self.tail == 0:
+            value_map = np.abs(self._original_param_map)
+        elif self.tail < 0:
+            value_map = -self._original_param_map
+        else:
+            value_map = self._original_param_map
+
+        # p-values corrected across parc regions
+        tests = [(cluster_v if value_map is None else value_map, dist.max(tuple(range(1, dist.ndim))))]
+        if self.parc is not None:
+            parc_indexes = self.map_args[3]
+            parc_ax = set(range(len(self.shape))).difference(self._max_axes).pop()
+            for i, index in enumerate(parc_indexes):
+                if value_map is None:
+                    region_cids = np.intersect1d(self._original_cluster_map.take(index, parc_ax), self._cids)
+                    region_v = cluster_v[np.isin(self._cids, region_cids)]
+                else:
+                    region_v = value_map.take(index, parc_ax)
+                tests.append((region_v, dist[:, i]))  # p-values within a region
+
+        n = len(dist)
+        a = (1 - SEQUENTIAL_CONFIDENCE) / (2 * n_looks)
+        for values, test_dist in tests:
+            n_larger = n - np.searchsorted(np.sort(test_dist), np.unique(values), 'left')
+            n_larger = np.unique(n_larger)
+            # Clopper-Pearson interval for the p-value of each number of larger permutations
+            with np.errstate(invalid='ignore'):
+                lower = np.where(n_larger == 0, 0., scipy.stats.beta.ppf(a, n_larger, n - n_larger + 1))
+                upper = np.where(n_larger == n, 1., scipy.stats.beta.ppf(1 - a, n_larger + 1, n - n_larger))
+            if np.any((lower <= SEQUENTIAL_ALPHA) & (upper >= SEQUENTIAL_ALPHA)):
+                return False
+        return True
+
     def __repr__(self):
         items = [self.kind]
         if self.has_original:
@@ -3191,6 +3329,7 @@ class NDPermutationDistribution:
                 'dims', 'shape', '_nad_ax', '_vector_ax', '_criteria',
                 # results ...
                 'dt_original', 'dt_perm', 'n_clusters', '_dist_dims', 'dist', '_original_param_map', '_original_cluster_map', '_cids',
+                'sequential',
             )}
         state['_connectivity'] = self._adjacency
         state['version'] = 3
@@ -3769,93 +3908,685 @@ class _MergedTemporalClusterDist:
         return clusters
 
 
-def distribution_worker(dist, in_queue, kill_beacon):
-    "Worker that accumulates values and places them into the distribution"
-    for i in trange(dist.shape[0], desc="Permutation test", unit=' permutations', disable=tqdm_disable()):
-        dist[i] = in_queue.get()
-        if kill_beacon.is_set():
-            break
+def permutation_chunks(
+        iterator: Iterable[np.ndarray],
+        chunk_size: int,
+        start: int = 0,
+) -> Iterable[tuple[int, np.ndarray]]:
+    """Collect permutations into blocks for dispatching to worker processes
+
+    Permutation generators re-use their output buffer, so each permutation is
+    copied into the block.
+
+    Yields
+    ------
+    start : int
+        Index of the first permutation in the block.
+    perms : array (n, ...)
+        Block of up to ``chunk_size`` permutations.
+    """
+    iterator = iter(iterator)
+    for first in iterator:
+        perms = [np.array(first)]
+        perms.extend(np.array(perm) for perm in islice(iterator, chunk_size - 1))
+        yield start, np.stack(perms)
+        start += len(perms)
+
+
+def _samples_arg(samples: int | str) -> (int, bool):
+    "Interpret the ``samples`` parameter of permutation tests"
+    if isinstance(samples, str):
+        if samples != 'auto':
+            raise ValueError(f"{samples=}: needs to be an int or 'auto'")
+        return SEQUENTIAL_MAX_SAMPLES, True
+    return samples, False
+
+
+def _available_memory() -> int | None:
+    "Memory available for permutation tests (in bytes)"
+    if PERMUTATION_MEMORY is not None:
+        return PERMUTATION_MEMORY
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.virtual_memory().available
+
+
+def permutation_memory(
+        dist: NDPermutationDistribution,
+        n_maps: int,
+        n_workers: int,
+        tile_size: int = None,
+) -> tuple[int, int]:
+    """Estimate the memory needed for a permutation test
+
+    Parameters
+    ----------
+    dist
+        Distribution for which permutations are computed.
+    n_maps
+        Number of statistical maps per permutation.
+    n_workers
+        Number of worker processes (0 to compute permutations in the main
+        process).
+    tile_size
+        Number of points per tile (for tiled permutations).
+
+    Returns
+    -------
+    shared : int
+        Bytes needed once (data in shared memory and distributions).
+    per_point : int
+        Bytes needed in each process for each point of the map (or tile).
+    """
+    n_points = reduce(operator.mul, dist.shape, 1)
+    y_size = dist.y_perm.x.size
+    shared = 2 * n_maps * reduce(operator.mul, dist.dist_shape, 1) * 8
+    if n_workers and not tile_size:
+        # tiles are sent to workers instead of sharing y
+        shared += y_size * 8
+        chunk_size = _chunk_size(dist.samples, n_workers)
+    else:
+        chunk_size = MAX_CHUNK_SIZE
+    # stat-maps and buffers for a block of permutations
+    per_point = (1 + chunk_size) * n_maps * 8
+    # map processor buffers
+    if dist.kind == 'tfce':
+        per_point += TFCE_BYTES_PER_POINT
+    elif dist.kind == 'cluster':
+        per_point += CLUSTER_BYTES_PER_POINT
+    # copy of the data in the tile (and of the tile that is being sent to a worker)
+    if tile_size:
+        per_point += (2 if n_workers else 1) * y_size // n_points * 8
+    return shared, per_point
+
+
+def _plan_permutations(dist, n_maps, n_workers):
+    "Pick the number of workers and the tile size for the available memory"
+    logger = logging.getLogger(__name__)
+    n_points = reduce(operator.mul, dist.shape, 1)
+    can_tile = dist.kind == 'raw' and dist.parc is None
+    tile_size = PERMUTATION_TILE_SIZE if can_tile else None
+    shared, per_point = permutation_memory(dist, n_maps, n_workers, tile_size)
+    available = _available_memory()
+    if available is not None and shared + max(n_workers, 1) * per_point * (tile_size or n_points) > available:
+        if can_tile:
+            shared, per_point = permutation_memory(dist, n_maps, n_workers, MIN_TILE_SIZE)
+            tile_size = max(MIN_TILE_SIZE, (available - shared) // (max(n_workers, 1) * per_point))
+        if n_workers > 1:
+            n_fit = max(1, (available - shared) // (per_point * min(tile_size or n_points, n_points)))
+            if n_fit < n_workers:
+                logger.warning("Permutation test: reducing the number of workers from %i to %i to fit into %.1f GB of memory", n_workers, n_fit, available / 1e9)
+                n_workers = n_fit
+    if tile_size and tile_size >= n_points:
+        tile_size = None
+        shared, per_point = permutation_memory(dist, n_maps, n_workers)
+    peak = shared + max(n_workers, 1) * per_point * (tile_size or n_points)
+    if available is not None and peak > available:
+        reason = "even with the smallest tiles" if can_tile else "(only tests of the maximum statistic without parc can be computed in tiles)"
+        logger.warning("Permutation test: estimated peak memory %.2f GB exceeds the available %.2f GB %s", peak / 1e9, available / 1e9, reason)
+    logger.info("Permutation test: estimated peak memory %.2f GB with %i workers%s", peak / 1e9, n_workers, f" in tiles of {tile_size} points" if tile_size else "")
+    return n_workers, tile_size
+
+
+def _chunk_size(samples: int, n_workers: int) -> int:
+    "Number of permutations dispatched to a worker at a time"
+    if PERMUTATION_CHUNK_SIZE:
+        return PERMUTATION_CHUNK_SIZE
+    # small enough that workers finish at roughly the same time
+    return max(1, min(MAX_CHUNK_SIZE, samples // (4 * n_workers)))
+
+
+@contextmanager
+def permutation_checkpoints(
+        directory: str | None,
+        interval: float = 60,
+):
+    """Save partial permutation distributions to resume interrupted tests
+
+    Within this context, permutation tests periodically save the permutations
+    completed so far to ``directory``. When an interrupted test is repeated
+    with identical arguments, it resumes from the last checkpoint, and yields
+    the same distribution as an uninterrupted test. Checkpoints are deleted
+    once a test is complete.
+
+    Parameters
+    ----------
+    directory
+        Directory for checkpoint files (``None`` to disable checkpoints).
+    interval
+        Minimum time between saving checkpoints (in seconds).
+
+    Examples
+    --------
+    >>> with permutation_checkpoints('~/checkpoints'):
+    ...     res = testnd.ANOVA('src', 'A*B*subject', data=data, samples=10000)
+    """
+    global _CHECKPOINT
+
+    old = _CHECKPOINT
+    if directory is None:
+        _CHECKPOINT = None
+    else:
+        directory = os.path.expanduser(directory)
+        os.makedirs(directory, exist_ok=True)
+        _CHECKPOINT = (directory, interval)
+    try:
+        yield
+    finally:
+        _CHECKPOINT = old
+        if directory is not None and not os.listdir(directory):
+            os.rmdir(directory)
+
+
+class PermutationCheckpoint:
+    """Partial permutation distributions saved to disk
+
+    Parameters
+    ----------
+    path
+        Checkpoint file.
+    interval
+        Minimum time between saving checkpoints (in seconds).
+    dists
+        Distribution arrays, ``(samples, ...)`` each, that are saved.
+    """
+
+    def __init__(self, path: str, interval: float, dists: list[np.ndarray]):
+        self.path = path
+        self.interval = interval
+        self.dists = dists
+        self.n_done = 0
+        self._t_saved = current_time()
+
+    def restore(self) -> int:
+        "Fill in permutations from a previous run, return their number"
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, 'rb') as fid:
+                state = pickle.load(fid)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            logging.getLogger(__name__).warning("Ignoring corrupted permutation checkpoint %s", self.path)
+            return 0
+        for dist, saved in zip(self.dists, state['dists']):
+            dist[:state['n_done']] = saved
+        self.n_done = state['n_done']
+        return self.n_done
+
+    def update(self, n_done: int):
+        "Record that the first ``n_done`` permutations are complete"
+        self.n_done = n_done
+        if current_time() - self._t_saved >= self.interval:
+            self.save()
+
+    def save(self):
+        state = {'n_done': self.n_done, 'dists': [dist[:self.n_done].copy() for dist in self.dists]}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as fid:
+            pickle.dump(state, fid, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self._t_saved = current_time()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _checkpoint_key(test, dists, first_perm) -> str:
+    "Digest of everything that determines a permutation distribution"
+    digest = hashlib.sha1()
+    digest.update(type(test).__qualname__.encode())
+    if isinstance(test, TestFuncMapper):
+        digest.update(getattr(test.test_func, '__qualname__', repr(test.test_func)).encode())
+    digest.update(np.ascontiguousarray(dists[0].y_perm.x).tobytes())
+    for d in dists:
+        desc = (d.name, d.kind, d.tail, d.threshold, d.tfce, d.samples, d.tstart, d.tstop, d.parc, repr(d.criteria), d.do_permutation)
+        digest.update(repr(desc).encode())
+        digest.update(np.ascontiguousarray(d._original_param_map).tobytes())
+    digest.update(np.ascontiguousarray(first_perm).tobytes())
+    return digest.hexdigest()
+
+
+def _setup_checkpoint(test, dists, iterator, dist_arrays):
+    """Restore a previous checkpoint
+
+    Returns
+    -------
+    checkpoint : PermutationCheckpoint | None
+        Checkpoint (``None`` if checkpoints are disabled).
+    iterator : iterator
+        Iterator over remaining permutations.
+    n_done : int
+        Number of permutations restored from the checkpoint.
+    """
+    if _CHECKPOINT is None:
+        return None, iterator, 0
+    directory, interval = _CHECKPOINT
+    iterator = iter(iterator)
+    for first_perm in iterator:
+        first_perm = np.array(first_perm)
+        break
+    else:
+        return None, iterator, 0
+    iterator = chain([first_perm], iterator)
+    key = _checkpoint_key(test, dists, first_perm)
+    checkpoint = PermutationCheckpoint(os.path.join(directory, f'{key}.pickle'), interval, dist_arrays)
+    n_done = checkpoint.restore()
+    if n_done:
+        logging.getLogger(__name__).info("Resuming permutation test from checkpoint with %i of %i permutations", n_done, dists[0].samples)
+        # advance the permutation generator to the first missing permutation
+        for _ in islice(iterator, n_done):
+            pass
+    return checkpoint, iterator, n_done
+
+
+class CompletedPermutations:
+    "Count permutations that are complete without gaps, when chunks complete in any order"
+
+    def __init__(self, n_done: int = 0):
+        self.n_done = n_done
+        self._pending = {}  # chunks that finished before a preceding chunk
+
+    def add(self, start: int, n: int) -> int:
+        self._pending[start] = n
+        while self.n_done in self._pending:
+            self.n_done += self._pending.pop(self.n_done)
+        return self.n_done
+
+
+class SequentialStopping:
+    """Sequential stopping rule for permutation tests with ``samples='auto'``
+
+    The rule is evaluated every :data:`SEQUENTIAL_CHECK_INTERVAL` permutations,
+    so the stopping point does not depend on how permutations are chunked.
+
+    Parameters
+    ----------
+    dists
+        Distributions for which permutations are computed.
+    dist_arrays
+        Arrays into which the permutations for ``dists`` are written.
+    """
+
+    def __init__(
+            self,
+            dists: list[NDPermutationDistribution],
+            dist_arrays: list[np.ndarray],
+    ):
+        self.dists = [d for d in dists if d.do_permutation]
+        self.dist_arrays = dist_arrays
+        # number of times the rule is evaluated if the test runs to completion
+        self.n_looks = [max(1, d.samples // SEQUENTIAL_CHECK_INTERVAL) for d in self.dists]
+        self.n_checked = 0
+        self.n_stop = None
+
+    def update(self, n_done: int) -> bool:
+        "Evaluate the stopping rule for the first ``n_done`` permutations"
+        while self.n_stop is None and self.n_checked + SEQUENTIAL_CHECK_INTERVAL <= n_done:
+            self.n_checked += SEQUENTIAL_CHECK_INTERVAL
+            if all(d._p_values_resolved(dist[:self.n_checked], n_looks) for d, dist, n_looks in zip(self.dists, self.dist_arrays, self.n_looks)):
+                self.n_stop = self.n_checked
+        return self.n_stop is not None
+
+
+def distribution_worker(n, in_queue, kill_beacon, checkpoint=None, completed=None, stopping=None, in_flight=None):
+    "Worker that keeps track of the number of completed permutations"
+    if completed is None:
+        completed = CompletedPermutations()
+    with tqdm(total=n, initial=completed.n_done, desc="Permutation test", unit=' permutations', disable=tqdm_disable()) as progress:
+        while not kill_beacon.is_set():
+            chunk = in_queue.get()
+            if chunk is None:
+                break
+            start, n_chunk = chunk
+            progress.update(n_chunk)
+            n_done = completed.add(start, n_chunk)
+            if checkpoint is not None:
+                checkpoint.update(n_done)
+            if stopping is not None:
+                stopping.update(n_done)
+            if in_flight is not None:
+                in_flight.release()
+    if checkpoint is not None and checkpoint.n_done < n and (stopping is None or stopping.n_stop is None):
+        checkpoint.save()
+
+
+@contextmanager
+def permutation_executor(executor):
+    """Distribute permutations through an executor
+
+    By default, permutation tests use ``n_workers`` local processes (see
+    :func:`configure`). Within this context, permutations are computed by
+    ``executor`` instead.
+
+    Parameters
+    ----------
+    executor : PermutationExecutor | concurrent.futures.Executor
+        Executor for computing permutations (:class:`SocketExecutor` for
+        workers on other hosts; a :mod:`concurrent.futures` executor is wrapped
+        in a :class:`FuturesExecutor`).
+
+    Examples
+    --------
+    Distribute permutations to workers on other hosts, which are started
+    with ``$ python -m eelbrain._stats.permutation_worker host 8000 KEY``,
+    where ``KEY`` is the key shown by the executor::
+
+        >>> executor = testnd.SocketExecutor(('', 8000))
+        >>> executor.authkey.decode()
+        '3f9c...'
+        >>> with testnd.permutation_executor(executor):
+        ...     res = testnd.ANOVA('src', 'A*B*subject', data=data, samples=10000)
+        >>> executor.close()
+
+    """
+    global _EXECUTOR
+
+    if isinstance(executor, Executor):
+        executor = FuturesExecutor(executor)
+    elif not isinstance(executor, PermutationExecutor):
+        raise TypeError(f"{executor=}: need PermutationExecutor or concurrent.futures.Executor")
+    old = _EXECUTOR
+    _EXECUTOR = executor
+    try:
+        yield executor
+    finally:
+        _EXECUTOR = old
+
 
+class MaxStatCollector:
+    """Store the maximum statistics of the maps in ``stat_maps``
+
+    Only maps for which ``do_permutation`` is set are processed. Maps from
+    threshold-based cluster tests are labeled in a single call.
+    """
+
+    def __init__(self, map_processor, stat_maps, thresholds, do_permutation):
+        self.map_processor = map_processor
+        self.stat_maps = stat_maps
+        self.index = np.flatnonzero(do_permutation)
+        if thresholds is not None and map_processor.parc is None:
+            self.thresholds = np.array([thresholds[i] for i in self.index], np.float64)
+            self.out = np.empty(len(self.index))
+        else:
+            self.out = None
+            maps = _map_views(stat_maps)
+            if thresholds is None:
+                self.maps = [(maps[i],) for i in self.index]
+            else:
+                self.maps = [(maps[i], thresholds[i]) for i in self.index]
+
+    def __call__(self, dist_arrays, i):
+        "Store maximum statistics in ``dist_arrays[:][i]``"
+        if self.out is None:
+            for dist, args in zip(dist_arrays, self.maps):
+                dist[i] = self.map_processor.max_stat(*args)
+        else:
+            self.map_processor.max_stats(self.stat_maps, self.index, self.thresholds, self.out)
+            for dist, v in zip(dist_arrays, self.out):
+                dist[i] = v
+
+
+class PermutationMaxStats:
+    """Compute maximum statistics for blocks of permutations
+
+    Parameters
+    ----------
+    test
+        Test mapper.
+    stat_map_shape
+        Shape of one statistical map.
+    map_args
+        Arguments for the map processor.
+    thresholds
+        Cluster forming thresholds for each map (for cluster-based tests).
+    do_permutation
+        For each map, whether to collect a distribution.
+    tile_size
+        Compute the statistical maps in tiles of this many points, so that
+        buffers scale with the tile instead of the whole map (only for
+        maximum statistic tests without ``parc``). With tiles, ``y`` is a
+        sequence of tiles (see :func:`_tile_slices`).
+    """
 
-def permutation_worker(in_queue, out_queue, memory_name, y_flat_shape, stat_map_shape, test_func, args, map_args, kill_beacon):
-    "Worker function for permutation test"
+    def __init__(self, test, stat_map_shape, map_args, thresholds, do_permutation, tile_size=None):
+        self.test = test
+        self.index = np.flatnonzero(do_permutation)
+        if tile_size:
+            kind, tail, max_axes, parc = map_args
+            if kind != 'raw' or parc is not None:
+                raise NotImplementedError(f"Tiled permutations for {kind=}, {parc=}")
+            self.tiles = _tile_slices(stat_map_shape, tile_size)
+            self.map_processor = StatMapProcessor(tail, None, None)
+            self._tile_buffers = {}  # tile size -> (test, stat_maps)
+        else:
+            self.tiles = None
+            self.stat_maps = test.preallocate(stat_map_shape)
+            self.collect = MaxStatCollector(get_map_processor(*map_args), self.stat_maps, thresholds, do_permutation)
+
+    def __call__(
+            self,
+            y: np.ndarray | Sequence[np.ndarray],  # data, flattened for permutation (or tiles of it)
+            start: int,  # index of the first permutation
+            perms: np.ndarray,  # block of permutations
+            dist_arrays: list[np.ndarray],  # distribution for each permuted map
+    ) -> Iterator[int]:
+        "Yield the index of each permutation once its maximum statistics are stored"
+        if self.tiles is None:
+            for i, _ in enumerate(self.test.map_batch(y, perms, self.stat_maps), start):
+                self.collect(dist_arrays, i)
+                yield i
+            return
+
+        out = np.full((len(dist_arrays), len(perms)), -np.inf)
+        for y_tile in y:
+            self.tile_max_stats(y_tile, perms, out)
+        for dist, x in zip(dist_arrays, out):
+            dist[start: start + len(perms)] = x
+        yield from range(start, start + len(perms))
+
+    def tile_max_stats(
+            self,
+            y_tile: np.ndarray,  # one tile of y (contiguous)
+            perms: np.ndarray,  # permutations
+            out: np.ndarray,  # (n_maps, n_perms) maximum statistics
+    ):
+        "Update ``out`` with the maximum statistics of one tile"
+        n = y_tile.shape[-1]
+        if n not in self._tile_buffers:
+            test = deepcopy(self.test) if self._tile_buffers else self.test
+            self._tile_buffers[n] = (test, test.preallocate((n,)))
+        test, stat_maps = self._tile_buffers[n]
+        for chunk_start in range(0, len(perms), MAX_CHUNK_SIZE):
+            chunk = perms[chunk_start: chunk_start + MAX_CHUNK_SIZE]
+            for i, _ in enumerate(test.map_batch(y_tile, chunk, stat_maps), chunk_start):
+                for out_j, j in zip(out, self.index):
+                    v = self.map_processor.max_stat(stat_maps[j])
+                    if v > out_j[i]:
+                        out_j[i] = v
+
+
+def _tile_slices(stat_map_shape, tile_size):
+    "Slices into the flattened map for each tile"
+    n = reduce(operator.mul, stat_map_shape, 1)
+    return [slice(i, min(i + tile_size, n)) for i in range(0, n, tile_size)]
+
+
+class PermutationTileWorkers:
+    """Worker processes computing maximum statistics for single tiles
+
+    Each task is one tile of ``y`` with a round of permutations, so that
+    workers only hold the data of the tile they are working on.
+    """
+
+    def __init__(self, max_stats: PermutationMaxStats, n_workers: int):
+        self.in_queue = mpc.SimpleQueue()
+        self.out_queue = mpc.SimpleQueue()
+        self.max_pending = 2 * n_workers
+        restore_main_spec()
+        self.workers = [mpc.Process(target=permutation_tile_worker, args=(self.in_queue, self.out_queue, max_stats)) for _ in range(n_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def map(self, perms, tiles):
+        "Maximum statistics for each tile in ``tiles`` (in any order)"
+        n_pending = 0
+        for y_tile in tiles:
+            if n_pending >= self.max_pending:
+                yield self._get()
+                n_pending -= 1
+            self.in_queue.put((perms, y_tile))
+            n_pending += 1
+        for _ in range(n_pending):
+            yield self._get()
+
+    def _get(self):
+        out = self.out_queue.get()
+        if isinstance(out, Exception):
+            raise out
+        return out
+
+    def close(self, terminate=False):
+        if terminate:
+            for worker in self.workers:
+                worker.terminate()
+        else:
+            for _ in self.workers:
+                self.in_queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+
+def permutation_tile_worker(in_queue, out_queue, max_stats):
     if CONFIG['nice']:
         os.nice(CONFIG['nice'])
 
-    shared_memory = SharedMemory(memory_name)
-    y = np.ndarray(y_flat_shape, np.float64, buffer=shared_memory.buf)
-    stat_map = np.empty(stat_map_shape)
-    stat_map_flat = stat_map.ravel()
-    map_processor = get_map_processor(*map_args)
-    while not kill_beacon.is_set():
-        perm = in_queue.get()
-        if perm is None:
+    while True:
+        task = in_queue.get()
+        if task is None:
             break
-        test_func(y, *args, stat_map_flat, perm)
-        max_v = map_processor.max_stat(stat_map)
-        out_queue.put(max_v)
-    shared_memory.close()
+        perms, y_tile = task
+        out = np.full((len(max_stats.index), len(perms)), -np.inf)
+        try:
+            max_stats.tile_max_stats(y_tile, perms, out)
+        except Exception as error:
+            out = error
+        out_queue.put(out)
 
 
-def run_permutation(test_func, dist, iterator, *args):
-    "Perform permutation test"
-    if CONFIG['n_workers']:
-        workers, out_queue, kill_beacon, shared_memory = setup_workers(test_func, dist, args)
+class PermutationJob:
+    """Compute maximum statistics for blocks of permutations
 
-        try:
-            for perm in iterator:
-                out_queue.put(perm)
+    Parameters
+    ----------
+    y
+        Data, flattened for permutation.
+    stat_map_shape
+        Shape of one statistical map.
+    dist_shape
+        Shape of the maximum statistic for one permutation.
+    test
+        Test mapper.
+    map_args
+        Arguments for the map processor.
+    thresholds
+        Cluster forming thresholds for each map (for cluster-based tests).
+    do_permutation
+        For each map, whether to collect a distribution.
+    tile_size
+        Compute maps in tiles (see :class:`PermutationMaxStats`).
+    """
 
-            for _ in range(len(workers) - 1):
-                out_queue.put(None)
+    def __init__(self, y, stat_map_shape, dist_shape, test, map_args, thresholds, do_permutation, tile_size=None):
+        if tile_size:
+            y = [np.ascontiguousarray(y[..., tile]) for tile in _tile_slices(stat_map_shape, tile_size)]
+        self.y = y
+        self.stat_map_shape = stat_map_shape
+        self.dist_shape = dist_shape
+        self.test = test
+        self.map_args = map_args
+        self.thresholds = thresholds
+        self.do_permutation = do_permutation
+        self.tile_size = tile_size
+        self._buffers = {}
 
-            logger = logging.getLogger(__name__)
-            for w in workers:
-                w.join()
-                logger.debug("worker joined")
-        except KeyboardInterrupt:
-            kill_beacon.set()
-            raise
-        finally:
-            shared_memory.close()
-            shared_memory.unlink()
-    else:
-        y = dist.data_for_permutation(False)
-        map_processor = get_map_processor(*dist.map_args)
-        stat_map = np.empty(dist.shape)
-        stat_map_flat = stat_map.ravel()
-        for i, perm in enumerate(iterator):
-            test_func(y, *args, stat_map_flat, perm)
-            dist.dist[i] = map_processor.max_stat(stat_map)
-    dist.finalize()
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k != '_buffers'}
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._buffers = {}
 
-def setup_workers(test_func, dist, func_args):
-    "Initialize workers for permutation test"
-    logger = logging.getLogger(__name__)
-    logger.debug("Setting up %i worker processes...", CONFIG['n_workers'])
-    permutation_queue = mpc.SimpleQueue()
-    dist_queue = mpc.SimpleQueue()
-    kill_beacon = mpc.Event()
+    def __call__(self, start, perms):
+        # buffers are not shared between threads
+        thread_id = get_ident()
+        if thread_id not in self._buffers:
+            self._buffers[thread_id] = PermutationMaxStats(deepcopy(self.test), self.stat_map_shape, self.map_args, self.thresholds, self.do_permutation, self.tile_size)
+        max_stats = self._buffers[thread_id]
+        out = np.empty((len(max_stats.index), len(perms), *self.dist_shape))
+        for _ in max_stats(self.y, 0, perms, out):
+            pass
+        return start, out
 
-    restore_main_spec()
 
-    # permutation workers
-    shared_memory, y_flat_shape, stat_map_shape = dist.data_for_permutation()
-    args = (permutation_queue, dist_queue, shared_memory.name, y_flat_shape, stat_map_shape, test_func, func_args, dist.map_args, kill_beacon)
-    workers = []
-    for _ in range(CONFIG['n_workers']):
-        w = mpc.Process(target=permutation_worker, args=args)
-        w.start()
-        workers.append(w)
+class TestFuncMapper(MPTestMapper):
+    """Test function for a single statistical map as :class:`MPTestMapper`
+
+    Parameters
+    ----------
+    test_func
+        Function computing the statistical map,
+        ``test_func(y, *args, stat_map_flat, perm)``.
+    args
+        Additional arguments for ``test_func``.
+    batch_func
+        Function computing statistical maps for a block of permutations,
+        ``batch_func(y, *args, stat_maps_flat, perms)``.
+    """
+
+    def __init__(self, test_func, args=(), batch_func=None):
+        self.test_func = test_func
+        self.args = args
+        self.batch_func = batch_func
+        self._flat_map = None
+
+    def preallocate(self, y_shape):
+        stat_map = np.empty((1, *y_shape))
+        self._flat_map = stat_map.reshape(-1)
+        return stat_map
+
+    def map(self, y, perm=None):
+        self.test_func(y, *self.args, self._flat_map, perm)
+
+    def map_batch(self, y, perms, maps):
+        if self.batch_func is None:
+            yield from MPTestMapper.map_batch(self, y, perms, maps)
+            return
+        stat_maps = np.empty((len(perms), len(self._flat_map)))
+        self.batch_func(y, *self.args, stat_maps, perms)
+        for stat_map in stat_maps:
+            self._flat_map[:] = stat_map
+            yield maps
+
+
+def run_permutation(test_func, dist, iterator, *args, batch_func=None):
+    "Perform permutation test"
+    run_permutation_me(TestFuncMapper(test_func, args, batch_func), [dist], iterator)
+
 
-    # distribution worker
-    args = (dist.dist, dist_queue, kill_beacon)
-    w = Thread(target=distribution_worker, args=args)
-    w.start()
-    workers.append(w)
+def _map_views(stat_maps):
+    "Views of the individual maps in a container (also for 0-d maps)"
+    return tuple(stat_maps[i, ...] for i in range(len(stat_maps)))
 
-    return workers, permutation_queue, kill_beacon, shared_memory  # return shared_memory so that it does not get garbage collected
+
+def _shared_dist(shape):
+    "Permutation distribution in shared memory that workers write into directly"
+    dist_memory = SharedMemory(create=True, size=max(1, 8 * reduce(operator.mul, shape)))
+    shared_dist = np.ndarray(shape, np.float64, buffer=dist_memory.buf)
+    shared_dist.fill(0)
+    return dist_memory, shared_dist
 
 
 def run_permutation_me(
@@ -3869,56 +4600,176 @@ def run_permutation_me(
     else:
         thresholds = None
 
-    if CONFIG['n_workers']:
-        workers, out_queue, kill_beacon, shared_memory = setup_workers_me(test, dists, thresholds)
+    n_workers, tile_size = _plan_permutations(dist, len(dists), 0 if _EXECUTOR else CONFIG['n_workers'])
+
+    if _EXECUTOR is not None:
+        y = dist.data_for_permutation(False)
+        do_permutation = [d.do_permutation for d in dists]
+        job = PermutationJob(y, dist.shape, dist.dist_shape[1:], test, dist.map_args, thresholds, do_permutation, tile_size)
+        dist_arrays = [d.dist for d in dists if d.do_permutation]
+        checkpoint, iterator, n_done = _setup_checkpoint(test, dists, iterator, dist_arrays)
+        stopping = SequentialStopping(dists, dist_arrays) if dist.sequential else None
+        chunks = permutation_chunks(iterator, PERMUTATION_CHUNK_SIZE or MAX_CHUNK_SIZE, n_done)
+        if stopping is not None:
+            chunks = takewhile(lambda _: stopping.n_stop is None, chunks)
+        completed = CompletedPermutations(n_done)
+        try:
+            with tqdm(total=dist.samples, initial=n_done, desc="Permutation test", unit=' permutations', disable=tqdm_disable()) as progress:
+                for start, chunk_dists in _EXECUTOR.map(job, chunks):
+                    n = chunk_dists.shape[1]
+                    for dist_array, chunk_dist in zip(dist_arrays, chunk_dists):
+                        dist_array[start: start + n] = chunk_dist
+                    progress.update(n)
+                    n_done = completed.add(start, n)
+                    if checkpoint is not None:
+                        checkpoint.update(n_done)
+                    if stopping is not None and stopping.update(n_done):
+                        break
+        except BaseException:
+            if checkpoint is not None:
+                checkpoint.save()
+            raise
+    elif tile_size:
+        # each tile of y is copied once for a round of permutations
+        y = dist.data_for_permutation(False)
+        dist_arrays = [d.dist for d in dists if d.do_permutation]
+        checkpoint, iterator, n_done = _setup_checkpoint(test, dists, iterator, dist_arrays)
+        stopping = SequentialStopping(dists, dist_arrays) if dist.sequential else None
+        max_stats = PermutationMaxStats(test, dist.shape, dist.map_args, thresholds, [d.do_permutation for d in dists], tile_size)
+        round_size = SEQUENTIAL_CHECK_INTERVAL if dist.sequential else TILE_ROUND_SIZE
+        tile_workers = PermutationTileWorkers(max_stats, n_workers) if n_workers else None
+        try:
+            with tqdm(total=dist.samples, initial=n_done, desc="Permutation test", unit=' permutations', disable=tqdm_disable()) as progress:
+                for start, perms in permutation_chunks(iterator, round_size, n_done):
+                    tiles = (np.ascontiguousarray(y[..., tile]) for tile in max_stats.tiles)
+                    out = np.full((len(dist_arrays), len(perms)), -np.inf)
+                    if tile_workers is None:
+                        for y_tile in tiles:
+                            max_stats.tile_max_stats(y_tile, perms, out)
+                    else:
+                        for tile_out in tile_workers.map(perms, tiles):
+                            np.maximum(out, tile_out, out)
+                    n_done = start + len(perms)
+                    for dist_array, x in zip(dist_arrays, out):
+                        dist_array[start: n_done] = x
+                    progress.update(len(perms))
+                    if checkpoint is not None:
+                        checkpoint.update(n_done)
+                    if stopping is not None and stopping.update(n_done):
+                        break
+        except BaseException:
+            if tile_workers is not None:
+                tile_workers.close(True)
+                tile_workers = None
+            if checkpoint is not None:
+                checkpoint.n_done = n_done
+                checkpoint.save()
+            raise
+        finally:
+            if tile_workers is not None:
+                tile_workers.close()
+    elif n_workers:
+        dist_memory, shared_dist = _shared_dist((len(dists), *dist.dist_shape))
+        dist_arrays = [shared_dist[i] for i, d in enumerate(dists) if d.do_permutation]
+        checkpoint, iterator, n_done = _setup_checkpoint(test, dists, iterator, dist_arrays)
+        stopping = SequentialStopping(dists, dist_arrays) if dist.sequential else None
+        # limit the number of chunks in the queue, so that workers stop soon
+        # after the stopping rule is met, and the parent never blocks on a
+        # queue that no worker reads
+        in_flight = Semaphore(2 * n_workers)
+        completed = CompletedPermutations(n_done)
+        workers, progress, out_queue, dist_queue, kill_beacon, shared_memory = setup_workers_me(test, dists, thresholds, dist_memory, shared_dist, checkpoint, completed, stopping, in_flight, n_workers)
+        chunk_size = _chunk_size(dist.samples, len(workers))
 
         try:
-            for perm in iterator:
-                out_queue.put(perm)
+            for chunk in permutation_chunks(iterator, chunk_size, n_done):
+                while not in_flight.acquire(timeout=1):
+                    _check_workers(workers)
+                if stopping is not None and stopping.n_stop is not None:
+                    break
+                out_queue.put(chunk)
 
-            for _ in range(len(workers) - 1):
+            for _ in workers:
                 out_queue.put(None)
 
             logger = logging.getLogger(__name__)
             for w in workers:
-                w.join()
+                while w.exitcode is None:
+                    _check_workers(workers)
+                    w.join(1)
                 logger.debug("worker joined")
-        except KeyboardInterrupt:
+            _check_workers(workers)
+            dist_queue.put(None)
+            progress.join()
+            n_expected = dist.samples if stopping is None or stopping.n_stop is None else stopping.n_stop
+            if completed.n_done < n_expected:
+                raise RuntimeError(f"Permutation test incomplete: only {completed.n_done} of {n_expected} permutations were computed")
+            for i, d in enumerate(dists):
+                if d.do_permutation:
+                    d.dist[:] = shared_dist[i]
+        except BaseException:
             kill_beacon.set()
+            # release workers that are waiting for a chunk
+            for _ in workers:
+                out_queue.put(None)
             raise
         finally:
-            shared_memory.close()
-            shared_memory.unlink()
+            if progress.is_alive():
+                dist_queue.put(None)
+                progress.join()
+            if checkpoint is not None:
+                checkpoint.dists = None
+            if stopping is not None:
+                stopping.dist_arrays = None
+            del shared_dist, dist_arrays
+            for memory in (shared_memory, dist_memory):
+                memory.close()
+                memory.unlink()
     else:
         y = dist.data_for_permutation(False)
-        map_processor = get_map_processor(*dist.map_args)
+        dist_arrays = [d.dist for d in dists if d.do_permutation]
+        checkpoint, iterator, n_done = _setup_checkpoint(test, dists, iterator, dist_arrays)
+        stopping = SequentialStopping(dists, dist_arrays) if dist.sequential else None
+        max_stats = PermutationMaxStats(test, dist.shape, dist.map_args, thresholds, [d.do_permutation for d in dists])
 
-        stat_maps = test.preallocate(dist.shape)
-        if thresholds:
-            stat_maps_iter = tuple(zip(stat_maps, thresholds, dists))
-        else:
-            stat_maps_iter = tuple(zip(stat_maps, dists))
-
-        for i, perm in enumerate(iterator):
-            test.map(y, perm)
-            if thresholds:
-                for m, t, d in stat_maps_iter:
-                    if d.do_permutation:
-                        d.dist[i] = map_processor.max_stat(m, t)
-            else:
-                for m, d in stat_maps_iter:
-                    if d.do_permutation:
-                        d.dist[i] = map_processor.max_stat(m)
+        try:
+            for start, perms in permutation_chunks(iterator, MAX_CHUNK_SIZE, n_done):
+                for i in max_stats(y, start, perms, dist_arrays):
+                    n_done = i + 1
+                if checkpoint is not None:
+                    checkpoint.update(n_done)
+                if stopping is not None and stopping.update(n_done):
+                    break
+        except BaseException:
+            if checkpoint is not None:
+                checkpoint.n_done = n_done
+                checkpoint.save()
+            raise
 
+    if checkpoint is not None:
+        checkpoint.remove()
     for d in dists:
+        if stopping is not None and stopping.n_stop is not None:
+            d.samples = stopping.n_stop
+            if d.do_permutation:
+                d.dist = d.dist[:stopping.n_stop].copy()
         if d.do_permutation:
             d.finalize()
 
 
-def setup_workers_me(test_func, dists, thresholds):
+def _check_workers(workers):
+    "Raise an error if a worker process has died"
+    for w in workers:
+        if w.exitcode:  # None while running
+            raise RuntimeError(f"Permutation worker process exited with exit code {w.exitcode}")
+
+
+def setup_workers_me(test_func, dists, thresholds, dist_memory, shared_dist, checkpoint=None, completed=None, stopping=None, in_flight=None, n_workers=None):
     "Initialize workers for multi-effect permutation test"
+    if n_workers is None:
+        n_workers = CONFIG['n_workers']
     logger = logging.getLogger(__name__)
-    logger.debug("Setting up %i worker processes...", CONFIG['n_workers'])
+    logger.debug("Setting up %i worker processes...", n_workers)
     permutation_queue = mpc.SimpleQueue()
     dist_queue = mpc.SimpleQueue()
     kill_beacon = mpc.Event()
@@ -3928,62 +4779,43 @@ def setup_workers_me(test_func, dists, thresholds):
     # permutation workers
     dist = dists[0]
     shared_memory, y_flat_shape, stat_map_shape = dist.data_for_permutation()
-    args = (permutation_queue, dist_queue, shared_memory.name, y_flat_shape, stat_map_shape, test_func, dist.map_args, thresholds, kill_beacon)
+    do_permutation = [d.do_permutation for d in dists]
+    args = (permutation_queue, dist_queue, shared_memory.name, dist_memory.name, y_flat_shape, stat_map_shape, shared_dist.shape, test_func, dist.map_args, thresholds, do_permutation, kill_beacon)
     workers = []
-    for _ in range(CONFIG['n_workers']):
+    for _ in range(n_workers):
         w = mpc.Process(target=permutation_worker_me, args=args)
         w.start()
         workers.append(w)
 
-    # distribution worker
-    args = ([dist.dist for dist in dists], dist_queue, kill_beacon)
-    w = Thread(target=distribution_worker_me, args=args)
-    w.start()
-    workers.append(w)
+    # progress
+    args = (dist.samples, dist_queue, kill_beacon, checkpoint, completed, stopping, in_flight)
+    progress = Thread(target=distribution_worker, args=args)
+    progress.start()
 
-    return workers, permutation_queue, kill_beacon, shared_memory
+    return workers, progress, permutation_queue, dist_queue, kill_beacon, shared_memory
 
 
-def permutation_worker_me(in_queue, out_queue, memory_name, y_flat_shape, stat_map_shape, test, map_args, thresholds, kill_beacon):
+def permutation_worker_me(in_queue, out_queue, memory_name, dist_memory_name, y_flat_shape, stat_map_shape, dist_shape, test, map_args, thresholds, do_permutation, kill_beacon):
     if CONFIG['nice']:
         os.nice(CONFIG['nice'])
 
     shared_memory = SharedMemory(memory_name)
+    dist_memory = SharedMemory(dist_memory_name)
     y = np.ndarray(y_flat_shape, np.float64, buffer=shared_memory.buf)
-    iterator = test.preallocate(stat_map_shape)
-    if thresholds:
-        iterator = tuple(zip(iterator, thresholds))
-    else:
-        iterator = tuple(iterator)
-    map_processor = get_map_processor(*map_args)
+    dists = np.ndarray(dist_shape, np.float64, buffer=dist_memory.buf)
+    dist_arrays = [dists[i] for i in np.flatnonzero(do_permutation)]
+    max_stats = PermutationMaxStats(test, stat_map_shape, map_args, thresholds, do_permutation)
     while not kill_beacon.is_set():
-        perm = in_queue.get()
-        if perm is None:
+        chunk = in_queue.get()
+        if chunk is None:
             break
-        test.map(y, perm)
-
-        if thresholds:
-            max_v = [map_processor.max_stat(m, t) for m, t in iterator]
-        else:
-            max_v = [map_processor.max_stat(m) for m in iterator]
-        out_queue.put(max_v)
+        start, perms = chunk
+        for _ in max_stats(y, start, perms, dist_arrays):
+            pass
+        out_queue.put((start, len(perms)))
+    del y, dists, dist_arrays
     shared_memory.close()
-
-
-def distribution_worker_me(dists, in_queue, kill_beacon):
-    "Worker that accumulates values and places them into the distribution"
-    for dist in dists:
-        if dist is not None:
-            n = dist.shape[0]
-            break
-    else:
-        raise RuntimeError("No distirbutions")
-    for i in trange(n, desc="Permutation test", unit=' permutations', disable=tqdm_disable()):
-        for dist, v in zip(dists, in_queue.get()):
-            if dist is not None:
-                dist[i] = v
-        if kill_beacon.is_set():
-            break
+    dist_memory.close()
 
 
 # Backwards compatibility for pickling
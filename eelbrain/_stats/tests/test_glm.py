@@ -3,7 +3,7 @@ from itertools import repeat
 
 import numpy as np
 from numpy import newaxis
-from numpy.testing import assert_allclose
+from numpy.testing import assert_allclose, assert_array_equal
 import pytest
 
 from eelbrain import datasets, load, test, testnd, Dataset, Factor, NDVar, Var
@@ -282,6 +282,25 @@ def test_anova_perm():
         assert_allclose(r2, r1, 1e-6, 1e-6)
 
 
+def test_anova_perm_batch():
+    "Test that batched ANOVA permutations are identical to single permutations"
+    ds = datasets.get_uts()
+    tests = [
+        (ds, glm._BalancedFixedNDANOVA(ds.eval('A*B'))),
+        (ds, glm._BalancedMixedNDANOVA(ds.eval('A*B*rm'))),
+        (ds[1:], glm._IncrementalNDANOVA(ds[1:].eval('A*B'))),
+    ]
+    for ds_, aov in tests:
+        y = ds_['uts'].x
+        perms = np.stack([np.array(perm) for perm in permute_order(len(y), 5)])
+        r = aov.preallocate(y.shape[1:])
+        batch = [r.copy() for _ in aov.map_batch(y, perms, r)]
+        assert len(batch) == len(perms)
+        for perm, r_batch in zip(perms, batch):
+            aov.map(y, perm)
+            assert_array_equal(r_batch, r)
+
+
 @pytest.mark.skip('Rounding error on different platforms')
 def test_anova_crawley():
     y = Var([2, 3, 3, 4, 3, 4, 5, 6,
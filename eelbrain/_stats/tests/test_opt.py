@@ -1,7 +1,7 @@
 # Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
 import numpy as np
 import scipy.stats
-from numpy.testing import assert_allclose
+from numpy.testing import assert_allclose, assert_array_equal
 from eelbrain import datasets
 from eelbrain._stats import opt
 from eelbrain._stats.permutation import permute_sign_flip
@@ -25,3 +25,11 @@ def test_t_1samp():
         opt.t_1samp_perm(y, t_perm, sign)
         opt.t_1samp(y * sign[:, None], t)
         assert_allclose(t_perm, t)
+
+    # batch
+    signs = np.stack([np.array(sign) for sign in permute_sign_flip(n_cases, 5)])
+    t_batch = np.empty((len(signs), len(t)))
+    opt.t_1samp_perm_batch(y, t_batch, signs)
+    for sign, t_sign in zip(signs, t_batch):
+        opt.t_1samp_perm(y, t_perm, sign)
+        assert_array_equal(t_sign, t_perm)
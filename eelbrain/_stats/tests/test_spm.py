@@ -3,11 +3,14 @@ import os
 import pickle
 
 import numpy as np
-from numpy.testing import assert_array_equal
+from numpy.testing import assert_allclose, assert_array_equal
 import pytest
 
-from eelbrain import datasets, configure
-from eelbrain._stats.spm import LM, LMGroup
+from eelbrain import Model, Var, datasets, configure
+from eelbrain._data_obj import PermutedParametrization
+from eelbrain._stats import stats
+from eelbrain._stats.permutation import permute_order
+from eelbrain._stats.spm import LM, LMGroup, LMMapper
 
 
 @pytest.mark.parametrize('n_workers', [False, True])
@@ -41,6 +44,49 @@ def test_lm(n_workers):
     assert lm.find_clusters(0.05).n_cases == 7
 
 
+def test_lm_perm_batch():
+    "Test that batched LM permutations are identical to single permutations"
+    ds = datasets.get_uts()
+    parametrization = ds.eval('A*B*Y')._parametrize('effect')
+    mapper = LMMapper(parametrization)
+    y = ds['uts'].x
+    perms = np.stack([np.array(perm) for perm in permute_order(len(y), 5)])
+    r = mapper.preallocate(y.shape[1:])
+    batch = [r.copy() for _ in mapper.map_batch(y, perms, r)]
+    assert len(batch) == len(perms)
+    permuted = PermutedParametrization(parametrization, g=True)
+    for perm, r_batch in zip(perms, batch):
+        mapper.map(y, perm)
+        assert_array_equal(r_batch, r)
+        permuted.permute(perm)
+        _, _, t = stats.lm_t(y, permuted)
+        assert_allclose(r_batch, t)
+    # observed map
+    mapper.map(y)
+    _, _, t = stats.lm_t(y, parametrization)
+    assert_array_equal(r, t)
+
+
+def test_lm_perm_batch_offset():
+    "Test batched LM permutations with a large offset in y"
+    rng = np.random.default_rng(0)
+    n_cases = 40
+    x = rng.normal(0, 1, n_cases)
+    y = 1e5 + 0.01 * x[:, None] + 1e-4 * rng.normal(0, 1, (n_cases, 3))
+    parametrization = Model([Var(x)])._parametrize('dummy')
+    mapper = LMMapper(parametrization)
+    r = mapper.preallocate(y.shape[1:])
+    perms = np.stack([np.arange(n_cases), *(np.array(perm) for perm in permute_order(n_cases, 5))])
+    for perm, r_batch in zip(perms, mapper.map_batch(y, perms, r)):
+        # reference with residuals of the centered design
+        xp = x[perm] - x[perm].mean()
+        yc = y - y.mean(0)
+        b = xp.dot(yc) / xp.dot(xp)
+        res = yc - xp[:, None] * b
+        se = np.sqrt((res ** 2).sum(0) / (n_cases - 2) / xp.dot(xp))
+        assert_allclose(r_batch[1], b / se, rtol=1e-6, atol=1e-6)
+
+
 def test_random_lm():
     np.random.seed(0)
 
@@ -2,7 +2,7 @@
 import warnings
 
 import numpy as np
-from numpy.testing import assert_allclose, assert_equal
+from numpy.testing import assert_allclose, assert_array_equal, assert_equal
 import pytest
 import scipy.stats
 import statsmodels.api as sm
@@ -174,6 +174,16 @@ def test_t_ind():
         t_sp, _ = scipy.stats.ttest_ind(y_perm[:n], y_perm[n:])
         assert_allclose(t, t_sp)
 
+    # batch of permutations
+    y = y.reshape((n_cases, -1))
+    perms = np.stack([np.array(perm) for perm in permute_order(n_cases, 5)])
+    t_batch = np.empty((len(perms), y.shape[1]))
+    stats.t_ind_batch(y, groups, t_batch, perms)
+    t = np.empty(y.shape[1])
+    for perm, t_perm in zip(perms, t_batch):
+        stats.t_ind(y, groups, out=t, perm=perm)
+        assert_array_equal(t_perm, t)
+
 
 def test_vector():
     ds = datasets.get_uts()
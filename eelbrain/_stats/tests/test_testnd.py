@@ -1,5 +1,7 @@
 # Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from itertools import product
+import os
 import pickle
 import logging
 import pytest
@@ -7,11 +9,14 @@ import sys
 
 import numpy as np
 from numpy.testing import assert_array_equal, assert_allclose
+from scipy import ndimage
 
 import eelbrain
 from eelbrain import Dataset, NDVar, Categorial, Scalar, UTS, Sensor, Space, configure, datasets, test, testnd, set_log_level, cwt_morlet
+from eelbrain._config import mpc
 from eelbrain._exceptions import WrongDimensionError, ZeroVarianceError
-from eelbrain._stats.testnd import Adjacency, NDPermutationDistribution, label_clusters, _MergedTemporalClusterDist, find_peaks, VectorDifferenceIndependent
+from eelbrain._stats import glm, testnd as _testnd
+from eelbrain._stats.testnd import Adjacency, NDPermutationDistribution, label_clusters, label_clusters_binary, tfce, _MergedTemporalClusterDist, find_peaks, VectorDifferenceIndependent
 from eelbrain._utils.system import IS_WINDOWS
 from eelbrain.fmtxt import asfmtext
 from eelbrain.testing import assert_dataobj_equal, assert_dataset_equal, requires_mne_sample_data
@@ -150,6 +155,258 @@ def test_anova():
         testnd.ANOVA('uts[:-1]', 'A * B * nrm(A)', data=ds)
 
 
+def test_permutation_chunks():
+    "Test dispatching permutations to workers in chunks"
+    ds = datasets.get_uts(True)
+    configure(n_workers=0)
+    res0 = testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, pmin=0.1, samples=50)
+    res0_anova = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, pmin=0.05, samples=20)
+    configure(n_workers=2)
+    try:
+        for chunk_size in (None, 1, 7, 100):
+            _testnd.PERMUTATION_CHUNK_SIZE = chunk_size
+            res = testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, pmin=0.1, samples=50)
+            assert_array_equal(res._cdist.dist, res0._cdist.dist)
+            res = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, pmin=0.05, samples=20)
+            for dist, dist0 in zip(res._cdist, res0_anova._cdist):
+                assert_array_equal(dist.dist, dist0.dist)
+    finally:
+        _testnd.PERMUTATION_CHUNK_SIZE = None
+        configure(n_workers=True)
+
+
+def test_permutation_checkpoints(tmp_path, monkeypatch):
+    "Test resuming an interrupted permutation test from a checkpoint"
+    ds = datasets.get_uts(True)
+    checkpoint_dir = tmp_path / 'checkpoints'
+    configure(n_workers=0)
+    res0 = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, tfce=True, samples=30)
+
+    map_batch = glm._BalancedNDANOVA.map_batch
+    n_mapped = []
+
+    def counting_map_batch(self, y, perms, maps):
+        for maps in map_batch(self, y, perms, maps):
+            n_mapped.append(1)
+            yield maps
+
+    interruption = [KeyboardInterrupt]
+
+    def interrupted_map_batch(self, y, perms, maps):
+        for maps in map_batch(self, y, perms, maps):
+            if len(n_mapped) == 20:
+                raise interruption[0]
+            n_mapped.append(1)
+            yield maps
+
+    try:
+        # interrupt, then resume in the same process
+        with _testnd.permutation_checkpoints(checkpoint_dir, 0):
+            monkeypatch.setattr(glm._BalancedNDANOVA, 'map_batch', interrupted_map_batch)
+            with pytest.raises(KeyboardInterrupt):
+                testnd.ANOVA('utsnd', 'A*B*rm', data=ds, tfce=True, samples=30)
+            assert len(list(checkpoint_dir.iterdir())) == 1
+            n_mapped.clear()
+            monkeypatch.setattr(glm._BalancedNDANOVA, 'map_batch', counting_map_batch)
+            res = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, tfce=True, samples=30)
+            assert len(n_mapped) == 10
+        assert not checkpoint_dir.exists()
+        for dist, dist0 in zip(res._cdist, res0._cdist):
+            assert_array_equal(dist.dist, dist0.dist)
+
+        # fail with another error, then resume with worker processes
+        n_mapped.clear()
+        interruption[0] = MemoryError
+        with _testnd.permutation_checkpoints(checkpoint_dir, 0):
+            monkeypatch.setattr(glm._BalancedNDANOVA, 'map_batch', interrupted_map_batch)
+            with pytest.raises(MemoryError):
+                testnd.ANOVA('utsnd', 'A*B*rm', data=ds, tfce=True, samples=30)
+            monkeypatch.setattr(glm._BalancedNDANOVA, 'map_batch', map_batch)
+            # different arguments do not use the checkpoint
+            res = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, tfce=True, samples=40)
+            assert len(list(checkpoint_dir.iterdir())) == 1
+            configure(n_workers=2)
+            res = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, tfce=True, samples=30)
+        assert not checkpoint_dir.exists()
+        for dist, dist0 in zip(res._cdist, res0._cdist):
+            assert_array_equal(dist.dist, dist0.dist)
+    finally:
+        configure(n_workers=True)
+
+
+def test_permutation_worker_failure(monkeypatch):
+    "Test that a permutation test fails when a worker process dies"
+    if mpc.get_start_method() != 'fork':
+        pytest.skip("Patching the test requires forked workers")
+    ds = datasets.get_uts(True)
+    monkeypatch.setattr(_testnd, 'PERMUTATION_CHUNK_SIZE', 5)
+    map_batch = glm._BalancedNDANOVA.map_batch
+    n_calls = [0]
+    n_exits = mpc.Value('i', 0)  # number of workers that may still exit
+
+    def failing_map_batch(self, y, perms, maps):
+        n_calls[0] += 1
+        if n_calls[0] == 3:
+            with n_exits.get_lock():
+                exit_now = n_exits.value > 0
+                n_exits.value -= 1
+            if exit_now:
+                os._exit(1)
+        yield from map_batch(self, y, perms, maps)
+
+    monkeypatch.setattr(glm._BalancedNDANOVA, 'map_batch', failing_map_batch)
+    configure(n_workers=2)
+    try:
+        for n in (1, 2):  # one or all workers die
+            n_exits.value = n
+            with pytest.raises(RuntimeError):
+                testnd.ANOVA('utsnd', 'A*B*rm', data=ds, samples=40)
+    finally:
+        configure(n_workers=True)
+
+
+def test_permutation_executor():
+    "Test distributing permutations through executors"
+    ds = datasets.get_uts(True)
+    configure(n_workers=0)
+    res0 = testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, pmin=0.1, samples=50)
+    res0_anova = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, tfce=True, samples=20)
+
+    def check(executor):
+        with testnd.permutation_executor(executor):
+            res = testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, pmin=0.1, samples=50)
+            assert_array_equal(res._cdist.dist, res0._cdist.dist)
+            res = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, tfce=True, samples=20)
+            for dist, dist0 in zip(res._cdist, res0_anova._cdist):
+                assert_array_equal(dist.dist, dist0.dist)
+
+    _testnd.PERMUTATION_CHUNK_SIZE = 7
+    try:
+        with ThreadPoolExecutor(2) as executor:
+            check(executor)
+        with ProcessPoolExecutor(2, mp_context=mpc) as executor:
+            assert testnd.FuturesExecutor(executor).max_pending == 4
+            check(executor)
+        # workers connecting over localhost
+        with testnd.SocketExecutor() as executor:
+            assert len(executor.authkey) == 64  # random key
+            workers = [mpc.Process(target=testnd.run_permutation_worker, args=(executor.address, executor.authkey)) for _ in range(3)]
+            for worker in workers:
+                worker.start()
+            check(executor)
+        for worker in workers:
+            worker.join(10)
+            assert worker.exitcode == 0
+        # no workers
+        with testnd.SocketExecutor(timeout=0.1) as executor, testnd.permutation_executor(executor):
+            with pytest.raises(TimeoutError):
+                testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, pmin=0.1, samples=50)
+    finally:
+        _testnd.PERMUTATION_CHUNK_SIZE = None
+        configure(n_workers=True)
+
+
+def test_sequential_stopping():
+    "Test permutation tests with samples='auto'"
+    ds = datasets.get_uts(True)
+    configure(n_workers=0)
+    res = testnd.TTestRelated('uts', 'A', 'a1', 'a0', 'rm', data=ds, pmin=0.05, samples='auto')
+    assert res.samples == res.n_samples == len(res._cdist.dist) < _testnd.SEQUENTIAL_MAX_SAMPLES
+    assert res.samples % _testnd.SEQUENTIAL_CHECK_INTERVAL == 0
+    assert 'sequential stopping' in str(res.info_list())
+    # same as the corresponding subset of a full test
+    res_full = testnd.TTestRelated('uts', 'A', 'a1', 'a0', 'rm', data=ds, pmin=0.05, samples=_testnd.SEQUENTIAL_MAX_SAMPLES)
+    assert_array_equal(res._cdist.dist, res_full._cdist.dist[:res.samples])
+    res_pickled = pickle.loads(pickle.dumps(res))
+    assert res_pickled.samples == res.samples
+    assert res_pickled._cdist.sequential == _testnd.SEQUENTIAL_MAX_SAMPLES
+    # independent of how permutations are distributed
+    res_anova = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, pmin=0.05, samples='auto')
+    assert res_anova.samples < _testnd.SEQUENTIAL_MAX_SAMPLES
+    configure(n_workers=2)
+    try:
+        res_mp = testnd.TTestRelated('uts', 'A', 'a1', 'a0', 'rm', data=ds, pmin=0.05, samples='auto')
+        assert_array_equal(res_mp._cdist.dist, res._cdist.dist)
+        res_mp = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, pmin=0.05, samples='auto')
+        assert res_mp.samples == res_anova.samples
+        for dist, dist0 in zip(res_mp._cdist, res_anova._cdist):
+            assert_array_equal(dist.dist, dist0.dist)
+        with ThreadPoolExecutor(2) as executor, testnd.permutation_executor(executor):
+            res_ex = testnd.TTestRelated('uts', 'A', 'a1', 'a0', 'rm', data=ds, pmin=0.05, samples='auto')
+        assert_array_equal(res_ex._cdist.dist, res._cdist.dist)
+    finally:
+        configure(n_workers=True)
+    with pytest.raises(ValueError):
+        testnd.TTestRelated('uts', 'A', 'a1', 'a0', 'rm', data=ds, pmin=0.05, samples='all')
+
+    # stopping rule: adjusted for repeated looks, per-region distributions with parc
+    configure(n_workers=0)
+    rng = np.random.RandomState(0)
+    y = NDVar(rng.normal(0, 1, (10, 5, 2)), ('case', UTS(0, 0.01, 5), Categorial('region', ('a', 'b'))))
+    res = testnd.TTestOneSample(y, samples=10, parc='region')
+    v_b = np.abs(res.t.x[:, 1]).max()
+    dist = np.zeros((1000, 2))
+    dist[:, 0] = v_b + 100  # all p-values 1 when corrected across regions
+    dist[:28, 1] = v_b + 1  # p = 0.028 in region b
+    assert res._cdist._p_values_resolved(dist)
+    assert not res._cdist._p_values_resolved(dist, 100)
+    dist[:50, 1] = v_b + 1  # p = 0.05 in region b
+    assert not res._cdist._p_values_resolved(dist)
+    configure(n_workers=True)
+
+
+def test_permutation_tiles(monkeypatch, caplog):
+    "Test computing maximum statistics in tiles"
+    ds = datasets.get_uts(True)
+    configure(n_workers=0)
+    res0 = testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, samples=20)
+    res0_anova = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, samples=20)
+    monkeypatch.setattr(_testnd, 'SEQUENTIAL_MAX_SAMPLES', 300)
+    res0_auto = testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, samples='auto')
+
+    def check():
+        res = testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, samples=20)
+        assert_allclose(res._cdist.dist, res0._cdist.dist)
+        res = testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, samples='auto')
+        assert_allclose(res._cdist.dist, res0_auto._cdist.dist)
+        res = testnd.ANOVA('utsnd', 'A*B*rm', data=ds, samples=20)
+        for dist, dist0 in zip(res._cdist, res0_anova._cdist):
+            assert_allclose(dist.dist, dist0.dist)
+
+    _testnd.PERMUTATION_TILE_SIZE = 7
+    try:
+        check()
+        configure(n_workers=2)
+        check()
+        with ThreadPoolExecutor(2) as executor, testnd.permutation_executor(executor):
+            check()
+    finally:
+        _testnd.PERMUTATION_TILE_SIZE = None
+        configure(n_workers=True)
+
+    # memory budget
+    monkeypatch.setattr(_testnd, 'MIN_TILE_SIZE', 50)
+    res = testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, samples=20)
+    assert _testnd._plan_permutations(res._cdist, 1, 4) == (4, None)
+    # raw tests are tiled, and y is not shared
+    monkeypatch.setattr(_testnd, 'MAX_CHUNK_SIZE', 1)
+    shared, per_point = _testnd.permutation_memory(res._cdist, 1, 4, 50)
+    assert shared == 2 * 20 * 8  # distributions only
+    monkeypatch.setattr(_testnd, 'PERMUTATION_MEMORY', shared + 2 * per_point * 50)
+    assert _testnd._plan_permutations(res._cdist, 1, 4) == (2, 50)
+    # other tests use fewer workers
+    res = testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, samples=20, pmin=0.05)
+    n_points = len(ds['utsnd'].sensor) * len(ds['utsnd'].time)
+    shared, per_point = _testnd.permutation_memory(res._cdist, 1, 4)
+    monkeypatch.setattr(_testnd, 'PERMUTATION_MEMORY', shared + 2 * per_point * n_points)
+    assert _testnd._plan_permutations(res._cdist, 1, 4) == (2, None)
+    # tests that do not fit
+    monkeypatch.setattr(_testnd, 'PERMUTATION_MEMORY', shared)
+    with caplog.at_level(logging.WARNING, 'eelbrain._stats.testnd'):
+        assert _testnd._plan_permutations(res._cdist, 1, 4) == (1, None)
+    assert 'exceeds the available' in caplog.text
+
+
 def test_anova_incremental():
     "Test testnd.ANOVA() with incremental f-tests"
     ds = datasets.get_uts()
@@ -446,6 +703,54 @@ def test_labeling():
     assert_array_equal(cmap > 0, np.abs(pmap) > 2)
 
 
+def test_cluster_processor():
+    "Test ClusterProcessor against label_clusters()"
+    rng = np.random.RandomState(0)
+    ds = datasets.get_uts(True)
+    for tail, criteria in product((0, 1, -1), ({}, {'mintime': 0.03}, {'mintime': 0.02, 'minsensor': 2})):
+        cdist = NDPermutationDistribution(ds['utsnd'], 1, 1., tail=tail, criteria=criteria)
+        processor = _testnd.get_map_processor(*cdist.map_args)
+        stat_maps = ndimage.gaussian_filter(rng.normal(0, 3, (5, *cdist.shape)), (0, 1, 1))
+        target = []
+        for stat_map in stat_maps:
+            cmap, cids = label_clusters(stat_map, 1., tail, cdist._adjacency, cdist._criteria)
+            masses = ndimage.sum(stat_map, cmap, cids)
+            target.append(np.abs(masses).max() if len(cids) else 0)
+            assert processor.max_stat(stat_map) == target[-1]
+        # several maps at once
+        out = np.empty(3)
+        processor.max_stats(stat_maps, np.array([0, 2, 4]), np.array([1., 1., 1.]), out, 2)
+        assert_array_equal(out, [target[0], target[2], target[4]])
+
+
+def test_tfce():
+    "Test TFCE against labeling clusters at each height"
+    def tfce_by_height(stat_map, tail, adjacency, dh=0.1, e=0.5, h=2.0):
+        out = np.zeros(stat_map.shape)
+        hs = []
+        if tail <= 0:
+            hs.extend(np.arange(-dh, stat_map.min(), -dh))
+        if tail >= 0:
+            hs.extend(np.arange(dh, stat_map.max(), dh))
+        for h_ in hs:
+            bin_map = stat_map >= h_ if h_ > 0 else stat_map <= h_
+            cmap, cids = label_clusters_binary(bin_map, adjacency)
+            for cid in cids:
+                index = cmap == cid
+                out[index] += np.sum(index) ** e * abs(h_) ** h
+        return out
+
+    rng = np.random.RandomState(0)
+    edges = np.array([(0, 1), (0, 3), (1, 2), (2, 3), (3, 4)], np.uint32)
+    graph = Scalar('graph', range(5), adjacency=edges)
+    time = UTS(0, 0.01, 50)
+    for dims in [(time,), (graph, time), (graph,), (Categorial('cat', 'abc'), time)]:
+        adjacency = Adjacency(dims)
+        stat_map = rng.normal(0, 2, [len(dim) for dim in dims])
+        for tail in (-1, 0, 1):
+            assert_allclose(tfce(stat_map, tail, adjacency), tfce_by_height(stat_map, tail, adjacency))
+
+
 def test_ttest_1samp():
     "Test testnd.TTestOneSample()"
     ds = datasets.get_uts(True)
@@ -18,10 +18,12 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field, fields
 from functools import cached_property, reduce
+import hashlib
 import inspect
-from itertools import chain, repeat
 from math import ceil
 from operator import mul
+import os
+from pathlib import Path
 import platform
 import sys
 import time
@@ -34,16 +36,24 @@ import numpy as np
 from numpy import newaxis
 
 from .._config import CONFIG
-from .._data_obj import Case, Dataset, Dimension, SourceSpaceBase, NDVar, CategorialArg, NDVarArg, dataobj_repr
+from .._data_obj import Case, Datalist, Dataset, Dimension, SourceSpaceBase, NDVar, CategorialArg, NDVarArg, ascategorial, asndvar, dataobj_repr
 from .._exceptions import OldVersionError
+from .._io.pickle import pickle, unpickle
+from .._types import PathArg
 from .._ndvar.ndvar import _concatenate_values, set_adjacency, set_parc
-from .._ndvar._convolve import convolve_1d, convolve_2d
+from .._ndvar._convolve import convolve_2d
 from .._utils import PickleableDataClass, deprecate_ds_arg, user_activity
 from .shared import PredictorData, DeconvolutionData, Split, Splits, merge_segments
 from ._fit_metrics import get_evaluators
 from . import _boosting_opt as opt
 
 
+# Largest number of y signals fit together
+MAX_BATCH_SIZE = 16
+# Memory for predicted y during model evaluation (bytes)
+EVALUATION_BLOCK_BYTES = 2**26
+
+
 def to_array(ndvar: NDVar | tuple[NDVar, ...] | float) -> np.ndarray:
     if isinstance(ndvar, NDVar):
         return ndvar.x.ravel()
@@ -280,7 +290,7 @@ class BoostingResult(PickleableDataClass):
         for name, param in inspect.signature(boosting).parameters.items():
             if param.default is inspect.Signature.empty or name == 'data':
                 continue
-            elif name == 'debug':
+            elif name in ('debug', 'batch_size', 'h_init', 'dtype', 'block_size', 'block_dir'):
                 continue
             elif name == 'partition_results':
                 value = bool(self.partition_results)
@@ -602,7 +612,7 @@ class BoostingResult(PickleableDataClass):
             if field_i.name == 'partition_results' and any(v is not None for v in values):
                 if not all(v is not None for v in values):
                     raise ValueError('partition_results available for some but not all part-results')
-                new_value = [cls._eelbrain_concatenate(p_results) for p_results in zip(*values)]
+                new_value = [cls._eelbrain_concatenate(p_results, dim) for p_results in zip(*values)]
             elif field_i.name in ('algorithm_version',):
                 values = set(values)
                 if len(values) == 1:
@@ -691,7 +701,21 @@ class Boosting:
             error: str = 'l1',
             delta: float = 0.005,  # coordinate search step
             mindelta: float = None,  # narrow search by reducing delta until reaching mindelta
+            batch_size: int = None,  # number of y signals fit together
+            h_init: BoostingResult | Boosting = None,  # start from these kernels instead of 0
     ):
+        """Fit kernels with boosting
+
+        With ``h_init``, boosting starts from the kernels of a previous fit
+        instead of from 0. Kernels are matched to predictors by name
+        (predictors not in ``h_init`` start from 0), and are converted to the
+        data scale and TRF window of this model. A :class:`Boosting` ``h_init``
+        needs to have been fit with the same data splits. A
+        :class:`BoostingResult` ``h_init`` is used for all splits, unless the
+        model uses test partitions, in which case ``h_init`` needs
+        ``partition_results`` for the same test partitions (to avoid fitting
+        the initial kernels to test data).
+        """
         self.data._check_data()
         assert error in ('l1', 'l2')
         error_id = int(error[1])
@@ -745,14 +769,130 @@ class Boosting:
 
         # boosting
         num_threads = CONFIG['n_workers']
+        if batch_size is None:
+            batch_size = auto_batch_size(len(self.data.y), len(self.data.splits.splits), num_threads)
         split_train = package_splits([split.train for split in self.data.splits.splits])
         split_validate = package_splits([split.validate for split in self.data.splits.splits])
         split_train_and_validate = package_splits([split.train_and_validate for split in self.data.splits.splits])
-        hs, hs_failed = opt.boosting_runs(self.data.y, self.data.x, self.data.x_pads, split_train, split_validate, split_train_and_validate, i_start_by_x, i_stop_by_x, delta, mindelta_, error_id, selective_stopping, num_threads)
+        hs_init = None if h_init is None else self._h_init_array(h_init, i_start_by_x, i_stop_by_x)
+        hs, hs_failed = opt.boosting_runs(self.data.y, self.data.x, self.data.x_pads, split_train, split_validate, split_train_and_validate, i_start_by_x, i_stop_by_x, delta, mindelta_, error_id, selective_stopping, num_threads, batch_size, hs_init)
         self.split_results = [SplitResult(split, h, h_failed) for split, h, h_failed in zip(self.data.splits.splits, hs, hs_failed)]
 
         self.t_fit_done = time.time()
 
+    def fit_path(
+            self,
+            tstart: float | Sequence[float],
+            tstop: float | Sequence[float],
+            deltas: Sequence[float],  # coordinate search steps, in the order in which they are fit
+            selective_stopping: int = 1,
+            error: str = 'l1',
+            mindelta: float | Sequence[float] = None,  # one value for all fits, or one for each delta
+            batch_size: int = None,
+            h_init: BoostingResult | Boosting = None,  # initial kernels for the first fit
+            **evaluate_kwargs,  # parameters for :meth:`.evaluate_fit`
+    ) -> list[BoostingResult]:
+        """Fit a sequence of models, each starting from the previous solution
+
+        Returns a list with the evaluated result for each ``delta``. Usually,
+        ``deltas`` should be decreasing, so that each fit refines the previous
+        one.
+        """
+        deltas = list(deltas)
+        if isinstance(mindelta, (tuple, list, np.ndarray)):
+            mindeltas = list(mindelta)
+            if len(mindeltas) != len(deltas):
+                raise ValueError(f"{mindelta=}: need one value for each delta ({len(deltas)})")
+        else:
+            mindeltas = [mindelta] * len(deltas)
+        results = []
+        for delta, mindelta_i in zip(deltas, mindeltas):
+            self.fit(tstart, tstop, selective_stopping, error, delta, mindelta_i, batch_size, h_init)
+            results.append(self.evaluate_fit(**evaluate_kwargs))
+            h_init = self
+        return results
+
+    def _h_init_array(
+            self,
+            h_init: BoostingResult | Boosting,
+            i_start_by_x: np.ndarray,
+            i_stop_by_x: np.ndarray,
+    ) -> np.ndarray:
+        "Initial kernels from a previous fit, (n_splits, n_y, n_x, n_times_h)"
+        splits = self.data.splits.splits
+        if isinstance(h_init, Boosting):
+            if h_init.split_results is None:
+                raise ValueError(f"{h_init=}: model has not been fit")
+            elif len(h_init.split_results) != len(splits) or not all(np.array_equal(split.validate, result.split.validate) for split, result in zip(splits, h_init.split_results)):
+                raise ValueError(f"{h_init=}: model was fit with different data splits")
+            data = h_init.data
+            basis, basis_window, ydims = data.basis, data.basis_window, data.ydims
+            _, y_scale, _, x_scale = data.data_scale_ndvars()
+            kernels = [data.package_kernel(result.h, h_init.tstart_h) for result in h_init.split_results]
+        elif isinstance(h_init, BoostingResult):
+            basis, basis_window, ydims = h_init.basis, h_init.basis_window, h_init._y_dims
+            y_scale, x_scale = h_init.y_scale, h_init.x_scale
+            if self.data.splits.n_test:
+                partition_hs = {result.i_test: result._h for result in h_init.partition_results or ()}
+                if any(split.i_test not in partition_hs for split in splits):
+                    raise ValueError(f"{h_init=}: for a model with test partitions, h_init needs partition_results for the same test partitions (initial kernels can not be fit to the test data)")
+                kernels = [partition_hs[split.i_test] for split in splits]
+            else:
+                kernels = [h_init._h] * len(splits)
+        else:
+            raise TypeError(f"{h_init=}: need BoostingResult or Boosting")
+        # check compatibility
+        if basis != self.data.basis or (basis and basis_window != self.data.basis_window):
+            raise ValueError(f"{h_init=}: different basis ({basis}, {basis_window!r}) than model ({self.data.basis}, {self.data.basis_window!r})")
+        elif tuple(ydims) != tuple(self.data.ydims):
+            raise ValueError(f"{h_init=}: different y dimensions {ydims} than model ({self.data.ydims})")
+        if not isinstance(x_scale, tuple):
+            x_scale = (x_scale,)
+        if self.data.scale_data:
+            _, y_scale_new, _, x_scale_new = self.data.data_scale_ndvars()
+            if not isinstance(x_scale_new, tuple):
+                x_scale_new = (x_scale_new,)
+        else:
+            y_scale_new = x_scale_new = None
+        # fill kernels
+        tstep = self.data.time.tstep
+        ydimnames = [dim.name for dim in self.data.ydims]
+        n_y = len(self.data.y)
+        n_times_h = np.max(i_stop_by_x) - self._i_start
+        out = np.zeros((len(splits), n_y, len(self.data.x), n_times_h))
+        for i_split, hs in enumerate(kernels):
+            if isinstance(hs, NDVar):
+                hs = (hs,)
+            hs = {h.name: (h, x_scale_i) for h, x_scale_i in zip(hs, x_scale)}
+            for i_x, (name, xdims, index) in enumerate(self.data._x_meta):
+                if name not in hs:
+                    continue
+                h, x_scale_i = hs[name]
+                if abs(h.time.tstep - tstep) > 1e-6 * tstep:
+                    raise ValueError(f"{h_init=}: different time step ({h.time.tstep}) than model ({tstep})")
+                # convert to original data scale, then to the scale of this model
+                if y_scale is not None:
+                    h = h * y_scale / x_scale_i
+                if y_scale_new is not None:
+                    h = h * x_scale_new[i_x] / y_scale_new
+                data = h.get_data((*ydimnames, *[dim.name for dim in xdims], 'time'))
+                data = data.reshape((n_y, -1, len(h.time)))
+                # align time
+                i_offset = int(round(h.time.tmin / tstep)) - self._i_start
+                i_src = max(0, -i_offset)
+                i_dst = max(0, i_offset)
+                n = min(len(h.time) - i_src, n_times_h - i_dst)
+                if n <= 0:
+                    continue
+                if isinstance(index, int):
+                    index = slice(index, index + 1)
+                out[i_split, :, index, i_dst:i_dst + n] = data[:, :, i_src:i_src + n]
+        # restrict to the TRF window of each predictor
+        for i_x, (i_start, i_stop) in enumerate(zip(i_start_by_x, i_stop_by_x)):
+            out[:, :, i_x, :i_start - self._i_start] = 0
+            out[:, :, i_x, i_stop - self._i_start:] = 0
+        return out
+
     def _get_i_tests(self):
         assert self.data.splits.n_test
         return sorted({split.split.i_test for split in self.split_results})
@@ -870,40 +1010,30 @@ class Boosting:
         if metrics:
             # y dimensions
             n_y = len(self.data.y)
-            if self.data.vector_dim:
-                n_vec = len(self.data.vector_dim)
-                n_vecs = n_y // n_vec
-            else:
-                n_vec = n_vecs = 0
+            n_vec = len(self.data.vector_dim) if self.data.vector_dim else 0
 
-            # predicted y
+            # predict and evaluate blocks of y
+            block_size = max(1, EVALUATION_BLOCK_BYTES // (8 * self.data.y.shape[1]))
+            if n_vec:
+                block_size = max(1, block_size // n_vec) * n_vec
+            block_size = min(block_size, n_y)
             if debug:
-                self.y_pred = y_pred_iter = y_pred = np.empty(self.data.y.shape)
-            elif n_vecs:
-                y_pred = np.empty((n_vec, *self.data.y.shape[1:]))
-                y_pred_iter = chain.from_iterable(repeat(tuple(y_pred), n_vecs))
+                self.y_pred = y_pred = np.empty(self.data.y.shape)
             else:
-                y_pred = np.empty(self.data.y.shape[1:])
-                y_pred_iter = repeat(y_pred, n_y)
-
-            all_evaluators, evaluators_s, evaluators_v = get_evaluators(metrics, self.data, eval_segments)
-
-            # fit and evaluate each y
-            for i_y, y_pred_i in enumerate(y_pred_iter):
+                y_pred_buffer = np.empty((block_size, *self.data.y.shape[1:]))
+            x_flat = self.data.x[newaxis]
+            x_pads = self.data.x_pads[newaxis]
+            all_evaluators = get_evaluators(metrics, self.data, eval_segments)[0]
+            for i_start in range(0, n_y, block_size):
+                index = slice(i_start, min(i_start + block_size, n_y))
+                y_pred_block = y_pred[index] if debug else y_pred_buffer[:index.stop - i_start]
                 # for cross-validation, different segments are predicted by different h:
                 for h, segments in hs:
-                    convolve_1d(h[i_y], self.data.x, self.data.x_pads, self._i_start, segments, y_pred_i)
-
-                if evaluators_s:
-                    for e in evaluators_s:
-                        e.add_y(i_y, self.data.y[i_y], y_pred_i)
-
-                if evaluators_v and i_y % n_vec == n_vec - 1:
-                    i_vec = i_y // n_vec
-                    i_y_vec = slice(i_y - n_vec + 1, i_y + 1)
-                    y_pred_i_vec = y_pred[i_y_vec] if debug else y_pred
-                    for e in evaluators_v:
-                        e.add_y(i_vec, self.data.y[i_y_vec], y_pred_i_vec)
+                    convolve_2d(h[index], x_flat, x_pads, self._i_start, segments, y_pred_block[newaxis])
+                # evaluate in double precision (y can be stored as float32)
+                y_block = np.asarray(self.data.y[index], np.float64)
+                for e in all_evaluators:
+                    e.add_ys(i_start, y_block, y_pred_block)
 
             # Package evaluators
             evaluations = {e.attr: e.get() for e in all_evaluators}
@@ -988,6 +1118,11 @@ def boosting(
         selective_stopping: int = 0,
         partition_results: bool = False,
         debug: bool = False,
+        batch_size: int = None,
+        h_init: BoostingResult | Boosting = None,
+        dtype: str = 'float64',
+        block_size: int = None,
+        block_dir: PathArg = None,
 ) -> BoostingResult:
     """Estimate a linear filter with coordinate descent
 
@@ -1076,6 +1211,43 @@ def boosting(
         This is disabled by default to reduce file size when saving results.
     debug
         Add additional attributes to the returned result.
+    batch_size
+        When ``y`` contains multiple signals, fit batches of ``batch_size``
+        signals together, sharing computations that only depend on ``x``
+        (mainly useful with ``error='l2'``). Results do not depend on
+        ``batch_size``. By default, batches of up to 16 signals are used, as
+        long as there are enough batches to keep all threads busy.
+    h_init
+        Start boosting from the kernels in a previous result instead of from 0
+        (e.g., from a model with fewer predictors, or with a larger ``delta``).
+        Kernels are matched to ``x`` by name, and predictors missing in
+        ``h_init`` start from 0. For models with test partitions (``test=1``),
+        ``h_init`` needs ``partition_results`` for the same partitions.
+        A :class:`Boosting` object fit with the same data splits can also be
+        used. See also ``Boosting.fit_path`` for fitting a sequence of ``delta``
+        values.
+    dtype
+        Data type for storing ``y`` during boosting. Use ``'float32'`` to
+        halve the memory needed for large ``y`` (e.g., source space data).
+        Boosting itself always uses double precision; kernels typically
+        differ by less than 1 % of their maximum from ``'float64'`` kernels.
+    block_size
+        Fit ``y`` in blocks of ``block_size`` signals along its first dimension
+        (other than case and time, e.g. ``source``), and combine the results.
+        Only one block of ``y`` is copied and normalized at a time, so that
+        ``y`` can be an :class:`NDVar` with memory-mapped data (e.g.,
+        ``NDVar(numpy.load(path, mmap_mode='r'), dims)``) that does not fit
+        into memory. The dimension needs to support concatenation (e.g.,
+        :class:`SourceSpace` or :class:`Scalar`).
+    block_dir
+        With ``block_size``, save the result for each block to this directory
+        as soon as it is done. Blocks whose result file already exists are
+        loaded instead of being fit again, so that an interrupted fit can be
+        resumed. The parameters of the fit and a digest of the ``y`` data of
+        each block are stored along with the blocks, and resuming a fit with
+        different parameters (e.g., a different ``x`` or ``delta``) or
+        different ``y`` data raises a :exc:`ValueError`; use a separate
+        directory for each model.
 
     See Also
     --------
@@ -1102,6 +1274,17 @@ def boosting(
         Computation in Neural Systems, 18(3), 191-212.
         `10.1080/09548980701609235 <https://doi.org/10.1080/09548980701609235>`_.
     """
+    if block_size is not None:
+        if h_init is not None or debug:
+            raise ValueError(f"{block_size=}: can not be combined with h_init or debug")
+        kwargs = dict(
+            x=x, tstart=tstart, tstop=tstop, scale_data=scale_data, delta=delta, mindelta=mindelta, error=error,
+            basis=basis, basis_window=basis_window, partitions=partitions, model=model, validate=validate, test=test,
+            data=data, selective_stopping=selective_stopping, partition_results=partition_results,
+            batch_size=batch_size, dtype=dtype)
+        return _boosting_blocks(asndvar(y, data=data), block_size, block_dir, kwargs)
+    elif block_dir is not None:
+        raise TypeError(f"{block_dir=} without block_size")
     # scale_data
     if isinstance(scale_data, bool):
         scale_in_place = False
@@ -1117,17 +1300,115 @@ def boosting(
     if selective_stopping < 0:
         raise ValueError(f"{selective_stopping=}")
 
-    dec_data = DeconvolutionData(y, x, data, scale_in_place)
+    dec_data = DeconvolutionData(y, x, data, scale_in_place, dtype)
     dec_data.apply_basis(basis, basis_window)
     if scale_data:
         dec_data.normalize(error)
     dec_data.initialize_cross_validation(partitions, model, data, validate, test)
 
     fit = Boosting(dec_data)
-    fit.fit(tstart, tstop, selective_stopping, error, delta, mindelta)
+    fit.fit(tstart, tstop, selective_stopping, error, delta, mindelta, batch_size, h_init)
     return fit.evaluate_fit(debug=debug, partition_results=partition_results)
 
 
+def _boosting_blocks(
+        y: NDVar,
+        block_size: int,
+        block_dir: PathArg | None,
+        kwargs: dict,  # other boosting() parameters
+) -> BoostingResult:
+    "Fit blocks of y separately (see boosting() block_size parameter)"
+    dims = [dim for dim in y.dims if dim.name not in ('case', 'time') and dim._adjacency_type != 'vector']
+    if not dims:
+        raise ValueError(f"{block_size=}: y={dataobj_repr(y)} has no dimension to divide into blocks")
+    dim = dims[0]
+    if type(dim)._concatenate.__func__ is Dimension._concatenate.__func__:
+        raise NotImplementedError(f"{block_size=}: blocks along {dim.__class__.__name__} dimension")
+    elif block_size < 1:
+        raise ValueError(f"{block_size=}")
+    if block_dir is not None:
+        block_dir = Path(block_dir).expanduser()
+        block_dir.mkdir(parents=True, exist_ok=True)
+        parameters = _block_parameters(y, dim, kwargs)
+        parameters_path = block_dir / 'parameters.pickle'
+        if parameters_path.exists():
+            old_parameters = unpickle(parameters_path)
+            if old_parameters != parameters:
+                changed = [key for key in parameters if old_parameters.get(key) != parameters[key]]
+                raise ValueError(f"{block_dir=}: contains blocks fit with different parameters ({', '.join(changed)}); use a separate block_dir for each model")
+        elif any(block_dir.glob(f'{dim.name}-*.pickle')):
+            raise ValueError(f"{block_dir=}: contains blocks without parameters; use a separate block_dir for each model")
+        else:
+            pickle(parameters, parameters_path)
+    axis = y.get_axis(dim.name)
+    results = []
+    for start in range(0, len(dim), block_size):
+        stop = min(start + block_size, len(dim))
+        index = (slice(None),) * axis + (slice(start, stop),)
+        y_block = NDVar(y.x[index], (*y.dims[:axis], dim[start:stop], *y.dims[axis + 1:]), y.name, y.info)
+        if block_dir is None:
+            path = None
+        else:
+            path = block_dir / f'{dim.name}-{start}-{stop}.pickle'
+            y_digest = _digest([y_block])
+            if path.exists():
+                old_digest, result = unpickle(path)
+                if old_digest != y_digest:
+                    raise ValueError(f"{block_dir=}: block {path.name} was fit to different y data; use a separate block_dir for each model")
+                results.append(result)
+                continue
+        result = boosting(y_block, **kwargs)
+        if path is not None:
+            # write to a temporary file first, so that interrupted writes are not mistaken for results
+            tmp_path = path.with_suffix('.tmp')
+            pickle((y_digest, result), tmp_path)
+            os.replace(tmp_path, path)
+        results.append(result)
+    if len(results) == 1:
+        return results[0]
+    return BoostingResult._eelbrain_concatenate(results, dim.name)
+
+
+def _block_parameters(
+        y: NDVar,
+        dim: Dimension,  # dimension along which y is divided into blocks
+        kwargs: dict,  # other boosting() parameters
+) -> dict:
+    "Parameters that determine the result for each block of y"
+    data = kwargs['data']
+    parameters = {key: value for key, value in kwargs.items() if key not in ('x', 'model', 'data', 'batch_size')}
+    if parameters['dtype'] is not None:
+        parameters['dtype'] = np.dtype(parameters['dtype']).name
+    parameters['y'] = (y.name, repr([d for d in y.dims if d is not dim]))
+    x = kwargs['x']
+    xs = [x] if isinstance(x, (NDVar, Datalist, str)) else x
+    parameters['x'] = _digest([asndvar(x_, data=data, ragged=True) for x_ in xs])
+    if kwargs['model'] is not None:
+        parameters['model'] = _digest([ascategorial(kwargs['model'], data=data)])
+    return parameters
+
+
+def _digest(objects: Sequence) -> str:
+    "Digest of the content of data-objects"
+    digest = hashlib.sha1()
+    for obj in objects:
+        digest.update(repr(obj).encode())
+        items = obj if isinstance(obj, Datalist) else [obj]
+        for item in items:
+            if isinstance(item, NDVar):
+                digest.update(repr(item.dims).encode())
+                digest.update(np.ascontiguousarray(item.x).tobytes())
+            else:
+                digest.update(repr(item).encode())
+    return digest.hexdigest()
+
+
+def auto_batch_size(n_y: int, n_splits: int, num_threads: int) -> int:
+    "Largest batch size that leaves at least 4 batches for each thread"
+    n_threads = num_threads or os.cpu_count()
+    return int(max(1, min(MAX_BATCH_SIZE, n_y * n_splits // (4 * n_threads))))
+
+
 def package_splits(splits: Sequence[np.ndarray]) -> np.ndarray:
     n = max(len(split) for split in splits)
     out = np.empty((len(splits), n, 2), np.int64)
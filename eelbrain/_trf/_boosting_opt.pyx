@@ -1,5 +1,6 @@
 # Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
 # cython: boundscheck=False, wraparound=False, cdivision=True, initializedcheck=False, language_level=3
+from cython cimport floating
 from libc.math cimport fabs
 from cython.parallel import parallel, prange
 from libc.stdlib cimport malloc, free
@@ -13,6 +14,8 @@ ctypedef np.float64_t FLOAT64
 
 
 cdef double inf = float('inf')
+# Memory for caching cross-products between predictors in each boosting run
+cdef Py_ssize_t CACHE_BYTES = 2**25
 
 
 cdef double square(double x) noexcept nogil:
@@ -113,15 +116,29 @@ cdef void l2_for_delta(
 
 
 def error_for_indexes(
-        FLOAT64 [:] x,
+        const FLOAT64 [:] x,
         INT64[:,:] indexes,  # (n_segments, 2)
         int error,  # 1 --> l1; 2 --> l2
 ):
     return error_for_indexes_c(&x[0], indexes, error)
 
 
+def errors_for_indexes(
+        const FLOAT64 [:,::1] x,  # (n, n_times)
+        INT64[:,:] indexes,  # (n_segments, 2)
+        int error,  # 1 --> l1; 2 --> l2
+        FLOAT64 [:] out,  # (n,)
+):
+    "Error for each row of ``x``"
+    cdef:
+        Py_ssize_t i
+
+    for i in prange(x.shape[0], nogil=True):
+        out[i] = error_for_indexes_c(&x[i, 0], indexes, error)
+
+
 cdef double error_for_indexes_c(
-        FLOAT64 * x,
+        const FLOAT64 * x,
         INT64[:,:] indexes,  # (n_segments, 2)
         int error,  # 1 --> l1; 2 --> l2
 ) noexcept nogil:
@@ -145,7 +162,7 @@ cdef double error_for_indexes_c(
 
 
 def boosting_runs(
-        FLOAT64 [:,:] y,  # (n_y, n_times)
+        const floating [:,:] y,  # (n_y, n_times); float32 or float64
         FLOAT64 [:,::1] x,  # (n_x, n_times)
         FLOAT64 [:] x_pads,  # (n_x,)
         INT64 [:,:,:] split_train,
@@ -158,36 +175,74 @@ def boosting_runs(
         int error,
         int selective_stopping,
         int num_threads,
+        int batch_size = 1,
+        FLOAT64 [:,:,:,:] hs_init = None,  # (n_splits, n_y, n_x, n_times_h)
 ):
-    """Estimate multiple filters with boosting"""
+    """Estimate multiple filters with boosting
+
+    Signals are processed in batches of ``batch_size`` signals (for each data
+    split), which share the computations that only depend on ``x``.
+    With ``hs_init``, boosting starts from these kernels instead of from 0.
+    ``y`` can be stored as float32; each signal is copied to a float64 buffer
+    for fitting.
+    """
     cdef:
         Py_ssize_t i_start = np.min(i_start_by_x)
         Py_ssize_t n_y = y.shape[0]
         Py_ssize_t n_x = x.shape[0]
         Py_ssize_t n_splits = split_train.shape[0]
-        Py_ssize_t n_total = n_splits * n_y
+        Py_ssize_t n_batches = (n_y + batch_size - 1) // batch_size
+        Py_ssize_t n_total = n_splits * n_batches
         Py_ssize_t n_times = x.shape[1]
         Py_ssize_t n_times_h = np.max(i_stop_by_x) - i_start
-        FLOAT64[:,:,:,:] hs = np.empty((n_splits, n_y, n_x, n_times_h))
+        Py_ssize_t n_options = np.sum(np.subtract(i_stop_by_x, i_start_by_x))
+        FLOAT64[:,:,:,:] hs
         INT8[:,:] hs_failed = np.zeros((n_splits, n_y), 'int8')
-        Py_ssize_t i, i_y, i_split
+        int warm_start = hs_init is not None
+        Py_ssize_t i, i_y, i_split, i_y_start, i_y_stop
         BoostingRunResult *result
+        OptionCache *cache
         INT8 * x_active
         FLOAT64 * y_error
+        FLOAT64 * gradients
+        FLOAT64 * y_batch
+        FLOAT64 * batch_sums
+
+    if batch_size < 1:
+        raise ValueError(f"{batch_size=}")
+    if warm_start:
+        shape = (hs_init.shape[0], hs_init.shape[1], hs_init.shape[2], hs_init.shape[3])
+        if shape != (n_splits, n_y, n_x, n_times_h):
+            raise ValueError(f"hs_init: shape {shape}, need {(n_splits, n_y, n_x, n_times_h)}")
+        hs = np.array(hs_init, np.float64)
+    else:
+        hs = np.empty((n_splits, n_y, n_x, n_times_h))
 
     with nogil, parallel(num_threads=num_threads):
         y_error = <FLOAT64*> malloc(sizeof(FLOAT64) * n_times)
         x_active = <INT8*> malloc(sizeof(INT8) * n_x)
+        gradients = <FLOAT64*> malloc(sizeof(FLOAT64) * n_options * batch_size)
+        y_batch = <FLOAT64*> malloc(sizeof(FLOAT64) * n_times * batch_size)
+        batch_sums = <FLOAT64*> malloc(sizeof(FLOAT64) * 2 * batch_size)
 
         for i in prange(n_total, schedule='guided'):
-            i_y = i // n_splits
+            i_y_start = (i // n_splits) * batch_size
+            i_y_stop = min(i_y_start + batch_size, n_y)
             i_split = i % n_splits
-            result = boosting_run(y[i_y], x, x_pads, hs[i_split, i_y], split_train[i_split], split_validate[i_split], split_train_and_validate[i_split], i_start_by_x, i_stop_by_x, delta, mindelta, error, selective_stopping, i_start, n_times_h, x_active, y_error)
-            hs_failed[i_split, i_y] = result.failed
-            free_history(result)
+            cache = option_cache_new(x, x_pads, split_train[i_split], i_start_by_x, i_stop_by_x, error)
+            if not warm_start:
+                batch_gradients[floating](gradients, y_batch, batch_sums, y, i_y_start, i_y_stop, x, x_pads, split_train[i_split], i_start_by_x, i_stop_by_x, error)
+            for i_y in range(i_y_start, i_y_stop):
+                result = boosting_run[floating](y[i_y], x, x_pads, hs[i_split, i_y], split_train[i_split], split_validate[i_split], split_train_and_validate[i_split], i_start_by_x, i_stop_by_x, delta, mindelta, error, selective_stopping, i_start, n_times_h, x_active, y_error, cache, NULL if warm_start else &gradients[(i_y - i_y_start) * n_options], warm_start)
+                hs_failed[i_split, i_y] = result.failed
+                free_history(result)
+            option_cache_free(cache)
 
         free(x_active)
         free(y_error)
+        free(gradients)
+        free(y_batch)
+        free(batch_sums)
 
     return hs.base, np.asarray(hs_failed, 'bool')
 
@@ -230,7 +285,7 @@ cdef void free_history(
 
 
 cdef BoostingRunResult * boosting_run(
-        FLOAT64 [:] y,  # (n_times,)
+        const floating [:] y,  # (n_times,)
         FLOAT64 [:,:] x,  # (n_x, n_times)
         FLOAT64 [:] x_pads,  # (n_x,)
         FLOAT64 [:,:] h,  # (n_x, n_times_h)
@@ -248,6 +303,9 @@ cdef BoostingRunResult * boosting_run(
         # buffers
         INT8 * x_active,
         FLOAT64 * y_error,
+        OptionCache * cache,  # cache for options (reused for the same x and split_train)
+        FLOAT64 * gradient,  # initial gradient for cache (or NULL)
+        int warm_start,  # start from the kernel in h instead of 0
 ) noexcept nogil:
     cdef:
         int out
@@ -261,14 +319,32 @@ cdef BoostingRunResult * boosting_run(
         double best_test_error = inf
         Py_ssize_t best_step_i = -1
         int n_bad, undo
-        Py_ssize_t i_step, i
+        Py_ssize_t i_step, i, seg_i, i_stim
 
     # initialize buffers
-    h[...] = 0
     for i in range(n_x):
         x_active[i] = 1
     for i in range(n_times):
         y_error[i] = y[i]
+    if warm_start:
+        for i_stim in range(n_x):
+            for i in range(n_times_h):
+                if h[i_stim, i] != 0:
+                    update_error(y_error, x[i_stim], x_pads[i_stim], split_train_and_validate, h[i_stim, i], i + i_start)
+    else:
+        h[...] = 0
+    if gradient == NULL:
+        cache.valid = 0
+    else:
+        for i in range(cache.n_options):
+            cache.gradient[i] = gradient[i]
+        if error == 1:
+            for seg_i in range(split_train.shape[0]):
+                if split_train[seg_i, 0] == -1:
+                    break
+                for i in range(split_train[seg_i, 0], split_train[seg_i, 1]):
+                    cache.sign[i] = sign(y_error[i])
+        cache.valid = 1
 
     # first step
     step = <BoostingStep*> malloc(sizeof(BoostingStep))
@@ -323,7 +399,7 @@ cdef BoostingRunResult * boosting_run(
                     # revert changes
                     for i in range(undo):
                         h[step.i_stim, step.i_time] -= step.delta
-                        update_error(y_error, x[step.i_stim], x_pads[step.i_stim], split_train_and_validate, -step.delta, step.i_time + i_start)
+                        apply_step(cache, y_error, x, x_pads, split_train, split_train_and_validate, i_start_by_x, i_stop_by_x, error, step.i_stim, step.i_time + i_start, -step.delta)
                         step_j = step.previous
                         free(step)
                         step = step_j
@@ -342,7 +418,7 @@ cdef BoostingRunResult * boosting_run(
         step = <BoostingStep *> malloc(sizeof(BoostingStep))
         step.previous = history
         step.i_step = i_step
-        generate_options(step, y_error, x, x_pads, x_active, split_train, i_start, i_start_by_x, i_stop_by_x, error, delta, n_x)
+        generate_options(step, cache, y_error, x, x_pads, x_active, split_train, i_start, i_start_by_x, i_stop_by_x, error, delta, n_x)
         history = step
 
         # If no improvements can be found reduce delta
@@ -365,13 +441,14 @@ cdef BoostingRunResult * boosting_run(
 
         # update h with best movement
         h[step.i_stim, step.i_time] += step.delta
-        update_error(y_error, x[step.i_stim], x_pads[step.i_stim], split_train_and_validate, step.delta, step.i_time + i_start)
+        apply_step(cache, y_error, x, x_pads, split_train, split_train_and_validate, i_start_by_x, i_stop_by_x, error, step.i_stim, step.i_time + i_start, step.delta)
     else:
         with gil:
             raise RuntimeError("Boosting: maximum number of iterations exceeded")
 
-    # reverse changes after best iteration
-    if best_step_i > -1:
+    # reverse changes after best iteration (with warm start, no improvement
+    # means that the initial kernel is best)
+    if best_step_i > -1 or warm_start:
         while step.i_step > best_step_i:
             if step.delta:
                 h[step.i_stim, step.i_time] -= step.delta
@@ -382,8 +459,306 @@ cdef BoostingRunResult * boosting_run(
         return boosting_run_result(1, history)
 
 
+ctypedef struct OptionCache:
+    # Incremental evaluation of boosting options
+    # ------------------------------------------
+    # l2: the error for an option (predictor i_stim at lag i_time) with
+    #     kernel change delta is ``e - 2 * delta * gradient + delta**2 * x_squared``,
+    #     with ``gradient = sum(y_error * x_shifted)``. After a step, gradient
+    #     is updated with the cross-products between the step's shifted
+    #     predictor and all options, which are cached for options that are
+    #     stepped repeatedly.
+    # l1: ``|y_error - delta * x_shifted|`` is linear in ``x_shifted``
+    #     wherever ``|y_error| >= delta * x_max``, so the error is
+    #     ``e - delta * gradient`` (``gradient = sum(sign(y_error) * x_shifted)``)
+    #     plus a correction at the remaining (``near``) samples; gradient is
+    #     updated where y_error changes sign.
+    int valid  # whether gradient is up to date with y_error
+    Py_ssize_t n_options
+    Py_ssize_t n_train
+    double x_max
+    FLOAT64 *gradient  # (n_options,)
+    FLOAT64 *x_squared  # (n_options,) l2 only
+    FLOAT64 **columns  # (n_options,) l2 only: cached cross-products
+    Py_ssize_t n_columns
+    Py_ssize_t max_columns
+    FLOAT64 *buffer  # (n_options,) cross-products for uncached columns
+    FLOAT64 *x_step  # (n_times,) shifted predictor for the current step
+    FLOAT64 *sign  # (n_times,) l1 only: sign of y_error
+    Py_ssize_t *near  # (n_times,) l1 only: indexes of near samples
+    Py_ssize_t *near_start  # (n_times,) start of the near sample's segment
+    Py_ssize_t *near_stop  # (n_times,) stop of the near sample's segment
+
+
+cdef OptionCache * option_cache_new(
+        FLOAT64 [:,:] x,  # (n_x, n_times)
+        FLOAT64 [:] x_pads,  # (n_x,)
+        INT64 [:,:] indexes,  # training segment indexes
+        INT64 [:] i_start_by_x,  # (n_x,) kernel start index
+        INT64 [:] i_stop_by_x, # (n_x,) kernel stop index
+        int error,
+) noexcept nogil:
+    cdef:
+        Py_ssize_t i, i_stim, seg_i, shift
+        Py_ssize_t n_x = x.shape[0]
+        Py_ssize_t n_times = x.shape[1]
+        OptionCache *cache = <OptionCache*> malloc(sizeof(OptionCache))
+
+    cache.valid = 0
+    cache.n_options = 0
+    for i_stim in range(n_x):
+        cache.n_options += i_stop_by_x[i_stim] - i_start_by_x[i_stim]
+    cache.n_train = 0
+    for seg_i in range(indexes.shape[0]):
+        if indexes[seg_i, 0] == -1:
+            break
+        cache.n_train += indexes[seg_i, 1] - indexes[seg_i, 0]
+    cache.gradient = <FLOAT64*> malloc(sizeof(FLOAT64) * cache.n_options)
+    cache.x_step = <FLOAT64*> malloc(sizeof(FLOAT64) * n_times)
+    cache.x_squared = NULL
+    cache.columns = NULL
+    cache.buffer = NULL
+    cache.sign = NULL
+    cache.near = NULL
+    cache.near_start = NULL
+    cache.near_stop = NULL
+    cache.n_columns = 0
+    cache.max_columns = 0
+    cache.x_max = 0
+    if error == 1:
+        cache.sign = <FLOAT64*> malloc(sizeof(FLOAT64) * n_times)
+        cache.near = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * n_times)
+        cache.near_start = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * n_times)
+        cache.near_stop = <Py_ssize_t*> malloc(sizeof(Py_ssize_t) * n_times)
+        for i_stim in range(n_x):
+            cache.x_max = max(cache.x_max, fabs(x_pads[i_stim]))
+            for i in range(n_times):
+                cache.x_max = max(cache.x_max, fabs(x[i_stim, i]))
+    else:
+        cache.x_squared = <FLOAT64*> malloc(sizeof(FLOAT64) * cache.n_options)
+        cache.buffer = <FLOAT64*> malloc(sizeof(FLOAT64) * cache.n_options)
+        cache.columns = <FLOAT64**> malloc(sizeof(FLOAT64*) * cache.n_options)
+        for i in range(cache.n_options):
+            cache.columns[i] = NULL
+        cache.max_columns = CACHE_BYTES // (sizeof(FLOAT64) * cache.n_options)
+        # sum of squares for each option
+        i = 0
+        for i_stim in range(n_x):
+            for shift in range(i_start_by_x[i_stim], i_stop_by_x[i_stim]):
+                shifted_x(cache.x_step, x[i_stim], x_pads[i_stim], indexes, shift)
+                cache.x_squared[i] = dot_shifted(cache.x_step, x[i_stim], x_pads[i_stim], indexes, shift)
+                i += 1
+    return cache
+
+
+cdef void option_cache_free(
+        OptionCache *cache,
+) noexcept nogil:
+    cdef:
+        Py_ssize_t i
+
+    if cache.columns != NULL:
+        for i in range(cache.n_options):
+            if cache.columns[i] != NULL:
+                free(cache.columns[i])
+        free(cache.columns)
+    free(cache.gradient)
+    free(cache.x_step)
+    free(cache.x_squared)
+    free(cache.buffer)
+    free(cache.sign)
+    free(cache.near)
+    free(cache.near_start)
+    free(cache.near_stop)
+    free(cache)
+
+
+cdef inline double sign(double x) noexcept nogil:
+    if x > 0:
+        return 1.
+    elif x < 0:
+        return -1.
+    return 0.
+
+
+cdef void shifted_x(
+        FLOAT64 * out,  # (n_times,)
+        FLOAT64 [:] x,  # (n_times,)
+        double x_pad,  # pad x outside valid convolution area
+        INT64 [:,:] indexes,  # segment indexes
+        Py_ssize_t shift,
+    ) noexcept nogil:
+    "Predictor shifted by ``shift``, at ``indexes``"
+    cdef:
+        Py_ssize_t i, seg_i, seg_start, seg_stop, conv_start, conv_stop
+
+    for seg_i in range(indexes.shape[0]):
+        seg_start = indexes[seg_i, 0]
+        if seg_start == -1:
+            break
+        seg_stop = indexes[seg_i, 1]
+        conv_start = seg_start
+        conv_stop = seg_stop
+        if shift > 0:
+            conv_start += shift
+        elif shift < 0:
+            conv_stop += shift
+        for i in range(seg_start, conv_start):
+            out[i] = x_pad
+        for i in range(conv_stop, seg_stop):
+            out[i] = x_pad
+        for i in range(conv_start, conv_stop):
+            out[i] = x[i - shift]
+
+
+cdef double dot_shifted(
+        FLOAT64 * a,  # (n_times,)
+        FLOAT64 [:] x,  # (n_times,)
+        double x_pad,  # pad x outside valid convolution area
+        INT64 [:,:] indexes,  # segment indexes
+        Py_ssize_t shift,
+    ) noexcept nogil:
+    "Dot product of ``a`` with the predictor shifted by ``shift``, at ``indexes``"
+    cdef:
+        double out = 0, pad_sum
+        Py_ssize_t i, seg_i, seg_start, seg_stop, conv_start, conv_stop
+
+    for seg_i in range(indexes.shape[0]):
+        seg_start = indexes[seg_i, 0]
+        if seg_start == -1:
+            break
+        seg_stop = indexes[seg_i, 1]
+        conv_start = seg_start
+        conv_stop = seg_stop
+        if shift > 0:
+            conv_start += shift
+        elif shift < 0:
+            conv_stop += shift
+        pad_sum = 0
+        for i in range(seg_start, conv_start):
+            pad_sum += a[i]
+        for i in range(conv_stop, seg_stop):
+            pad_sum += a[i]
+        out += pad_sum * x_pad
+        for i in range(conv_start, conv_stop):
+            out += a[i] * x[i - shift]
+    return out
+
+
+cdef void update_gradient(
+        OptionCache *cache,
+        FLOAT64 * y_error,
+        FLOAT64 [:,:] x,  # (n_x, n_times)
+        FLOAT64 [:] x_pads,  # (n_x,)
+        INT64 [:,:] indexes,  # training segment indexes
+        INT64 [:] i_start_by_x,  # (n_x,) kernel start index
+        INT64 [:] i_stop_by_x, # (n_x,) kernel stop index
+        int error,
+    ) noexcept nogil:
+    "Compute the gradient for all options from scratch"
+    cdef:
+        Py_ssize_t i, i_option, i_stim, shift, seg_i
+        FLOAT64 * a
+
+    if error == 1:
+        for seg_i in range(indexes.shape[0]):
+            if indexes[seg_i, 0] == -1:
+                break
+            for i in range(indexes[seg_i, 0], indexes[seg_i, 1]):
+                cache.sign[i] = sign(y_error[i])
+        a = cache.sign
+    else:
+        a = y_error
+    i_option = 0
+    for i_stim in range(x.shape[0]):
+        for shift in range(i_start_by_x[i_stim], i_stop_by_x[i_stim]):
+            cache.gradient[i_option] = dot_shifted(a, x[i_stim], x_pads[i_stim], indexes, shift)
+            i_option += 1
+    cache.valid = 1
+
+
+cdef void batch_gradients(
+        FLOAT64 * out,  # (n_batch, n_options)
+        FLOAT64 * y_batch,  # (n_times, n_batch) buffer
+        FLOAT64 * sums,  # (2 * n_batch) buffer
+        const floating [:,:] y,  # (n_y, n_times)
+        Py_ssize_t i_y_start,
+        Py_ssize_t i_y_stop,
+        FLOAT64 [:,:] x,  # (n_x, n_times)
+        FLOAT64 [:] x_pads,  # (n_x,)
+        INT64 [:,:] indexes,  # training segment indexes
+        INT64 [:] i_start_by_x,  # (n_x,) kernel start index
+        INT64 [:] i_stop_by_x, # (n_x,) kernel stop index
+        int error,
+    ) noexcept nogil:
+    """Initial gradient for a batch of signals (see update_gradient)
+
+    Each shifted predictor is read once for all signals in the batch. The
+    summation order is the same as in :func:`dot_shifted`.
+    """
+    cdef:
+        Py_ssize_t i, j, seg_i, seg_start, seg_stop, conv_start, conv_stop, i_stim, shift, i_option = 0
+        Py_ssize_t n_batch = i_y_stop - i_y_start
+        Py_ssize_t n_options = 0
+        FLOAT64 * pad_sums = sums
+        FLOAT64 * dots = &sums[n_batch]
+        FLOAT64 * y_i
+        double x_pad, x_i
+
+    for i_stim in range(x.shape[0]):
+        n_options += i_stop_by_x[i_stim] - i_start_by_x[i_stim]
+    # interleave signals
+    for seg_i in range(indexes.shape[0]):
+        if indexes[seg_i, 0] == -1:
+            break
+        for i in range(indexes[seg_i, 0], indexes[seg_i, 1]):
+            for j in range(n_batch):
+                if error == 1:
+                    y_batch[i * n_batch + j] = sign(y[i_y_start + j, i])
+                else:
+                    y_batch[i * n_batch + j] = y[i_y_start + j, i]
+
+    for i_stim in range(x.shape[0]):
+        x_pad = x_pads[i_stim]
+        for shift in range(i_start_by_x[i_stim], i_stop_by_x[i_stim]):
+            for j in range(n_batch):
+                dots[j] = 0
+            for seg_i in range(indexes.shape[0]):
+                seg_start = indexes[seg_i, 0]
+                if seg_start == -1:
+                    break
+                seg_stop = indexes[seg_i, 1]
+                conv_start = seg_start
+                conv_stop = seg_stop
+                if shift > 0:
+                    conv_start += shift
+                elif shift < 0:
+                    conv_stop += shift
+                for j in range(n_batch):
+                    pad_sums[j] = 0
+                for i in range(seg_start, conv_start):
+                    y_i = &y_batch[i * n_batch]
+                    for j in range(n_batch):
+                        pad_sums[j] += y_i[j]
+                for i in range(conv_stop, seg_stop):
+                    y_i = &y_batch[i * n_batch]
+                    for j in range(n_batch):
+                        pad_sums[j] += y_i[j]
+                for j in range(n_batch):
+                    dots[j] += pad_sums[j] * x_pad
+                for i in range(conv_start, conv_stop):
+                    x_i = x[i_stim, i - shift]
+                    y_i = &y_batch[i * n_batch]
+                    for j in range(n_batch):
+                        dots[j] += y_i[j] * x_i
+            for j in range(n_batch):
+                out[j * n_options + i_option] = dots[j]
+            i_option += 1
+
+
 cdef void generate_options(
         BoostingStep * step,
+        OptionCache * cache,
         FLOAT64 * y_error,
         FLOAT64 [:,:] x,  # (n_x, n_times)
         FLOAT64 [:] x_pads,  # (n_x,)
@@ -397,24 +772,60 @@ cdef void generate_options(
         Py_ssize_t n_x,
     ) noexcept nogil:
     cdef:
-        double e_add, e_sub, e_new, x_pad
-        Py_ssize_t i_stim, i_time, new_sign
+        double e, e_add, e_sub, e_new, x_pad, d, dx, threshold, r
+        Py_ssize_t i, j, seg_i, i_stim, i_time, i_option, new_sign, n_near = 0
+        int incremental = 1
         FLOAT64 * x_stim
 
+    if not cache.valid:
+        update_gradient(cache, y_error, x, x_pads, indexes, i_start_by_x, i_stop_by_x, error)
+    e = error_for_indexes_c(y_error, indexes, error)
+    if error == 1:
+        # samples at which the error is not linear in delta
+        threshold = delta * cache.x_max
+        for seg_i in range(indexes.shape[0]):
+            if indexes[seg_i, 0] == -1:
+                break
+            for i in range(indexes[seg_i, 0], indexes[seg_i, 1]):
+                if fabs(y_error[i]) < threshold:
+                    cache.near[n_near] = i
+                    cache.near_start[n_near] = indexes[seg_i, 0]
+                    cache.near_stop[n_near] = indexes[seg_i, 1]
+                    n_near += 1
+        # with many near samples, the direct computation is faster
+        incremental = n_near * 4 < cache.n_train
+
     step.e_train = inf
+    i_option = 0
     for i_stim in range(n_x):
         if x_active[i_stim] == 0:
+            i_option += i_stop_by_x[i_stim] - i_start_by_x[i_stim]
             continue
         x_stim = &x[i_stim, 0]
         x_pad = x_pads[i_stim]
         for i_time in range(i_start_by_x[i_stim], i_stop_by_x[i_stim]):
             # +/- delta
-            if error == 1:
-                l1_for_delta(y_error, x_stim, x_pad, indexes, delta, i_time, &e_add, &e_sub)
+            if error == 2:
+                d = 2 * delta * cache.gradient[i_option]
+                e_add = e - d + delta * delta * cache.x_squared[i_option]
+                e_sub = e_add + 2 * d
+            elif incremental:
+                d = delta * cache.gradient[i_option]
+                e_add = e - d
+                e_sub = e + d
+                for j in range(n_near):
+                    i = cache.near[j]
+                    if cache.near_start[j] <= i - i_time < cache.near_stop[j]:
+                        dx = delta * x_stim[i - i_time]
+                    else:
+                        dx = delta * x_pad
+                    r = y_error[i]
+                    e_add += fabs(r - dx) - fabs(r) + dx * cache.sign[i]
+                    e_sub += fabs(r + dx) - fabs(r) - dx * cache.sign[i]
             else:
-                l2_for_delta(y_error, x_stim, x_pad, indexes, delta, i_time, &e_add, &e_sub)
+                l1_for_delta(y_error, x_stim, x_pad, indexes, delta, i_time, &e_add, &e_sub)
+            i_option += 1
 
-            i_time -= i_start
             if e_add > e_sub:
                 e_new = e_sub
                 new_sign = -1
@@ -426,10 +837,81 @@ cdef void generate_options(
             if e_new < step.e_train:
                 step.e_train = e_new
                 step.i_stim = i_stim
-                step.i_time = i_time
+                step.i_time = i_time - i_start
                 step.delta = delta * new_sign
 
 
+cdef void apply_step(
+        OptionCache * cache,
+        FLOAT64 * y_error,
+        FLOAT64 [:,:] x,  # (n_x, n_times)
+        FLOAT64 [:] x_pads,  # (n_x,)
+        INT64 [:,:] split_train,  # training segment indexes
+        INT64 [:,:] split_train_and_validate,  # segments in which to update y_error
+        INT64 [:] i_start_by_x,  # (n_x,) kernel start index
+        INT64 [:] i_stop_by_x, # (n_x,) kernel stop index
+        int error,
+        Py_ssize_t i_stim_step,
+        Py_ssize_t shift_step,
+        double delta,
+    ) noexcept nogil:
+    "Update y_error and the option cache with a step"
+    cdef:
+        Py_ssize_t i, seg_i, seg_start, seg_stop, i_stim, shift, i_option, i_step = 0, n_changed = 0
+        double new_sign, d_sign
+        FLOAT64 * column
+
+    update_error(y_error, x[i_stim_step], x_pads[i_stim_step], split_train_and_validate, delta, shift_step)
+    if not cache.valid:
+        return
+
+    if error == 2:
+        for i_stim in range(i_stim_step):
+            i_step += i_stop_by_x[i_stim] - i_start_by_x[i_stim]
+        i_step += shift_step - i_start_by_x[i_stim_step]
+        column = cache.columns[i_step]
+        if column == NULL:
+            if cache.n_columns < cache.max_columns:
+                column = <FLOAT64*> malloc(sizeof(FLOAT64) * cache.n_options)
+                cache.columns[i_step] = column
+                cache.n_columns += 1
+            else:
+                column = cache.buffer
+            shifted_x(cache.x_step, x[i_stim_step], x_pads[i_stim_step], split_train, shift_step)
+            i_option = 0
+            for i_stim in range(x.shape[0]):
+                for shift in range(i_start_by_x[i_stim], i_stop_by_x[i_stim]):
+                    column[i_option] = dot_shifted(cache.x_step, x[i_stim], x_pads[i_stim], split_train, shift)
+                    i_option += 1
+        for i_option in range(cache.n_options):
+            cache.gradient[i_option] -= delta * column[i_option]
+    else:
+        for seg_i in range(split_train.shape[0]):
+            seg_start = split_train[seg_i, 0]
+            if seg_start == -1:
+                break
+            seg_stop = split_train[seg_i, 1]
+            for i in range(seg_start, seg_stop):
+                new_sign = sign(y_error[i])
+                if new_sign == cache.sign[i]:
+                    continue
+                n_changed += 1
+                if n_changed * 4 > cache.n_train:
+                    # faster to recompute
+                    cache.valid = 0
+                    return
+                d_sign = new_sign - cache.sign[i]
+                cache.sign[i] = new_sign
+                i_option = 0
+                for i_stim in range(x.shape[0]):
+                    for shift in range(i_start_by_x[i_stim], i_stop_by_x[i_stim]):
+                        if seg_start <= i - shift < seg_stop:
+                            cache.gradient[i_option] += d_sign * x[i_stim, i - shift]
+                        else:
+                            cache.gradient[i_option] += d_sign * x_pads[i_stim]
+                        i_option += 1
+
+
 cdef void update_error(
         FLOAT64 * y_error,
         FLOAT64 [:] x,
@@ -483,7 +965,7 @@ cdef class Step:
 
 
 def boosting_fit(
-        FLOAT64 [:] y,  # (n_times,)
+        const FLOAT64 [:] y,  # (n_times,)
         FLOAT64 [:,:] x,  # (n_x, n_times)
         FLOAT64 [:] x_pads,  # (n_x,)
         INT64 [:,:] split_train,
@@ -538,9 +1020,12 @@ def boosting_fit(
         FLOAT64[:, :] h = np.empty((n_x, n_times_h))
         INT8 * x_active = <INT8 *> malloc(sizeof(INT8) * n_x)
         FLOAT64 * y_error = <FLOAT64 *> malloc(sizeof(FLOAT64) * n_times)
+        OptionCache *cache
 
     x = np.asarray(x, order='C')
-    result = boosting_run(y, x, x_pads, h, split_train, split_validate, split_train_and_validate, i_start_by_x, i_stop_by_x, delta, mindelta, error, selective_stopping, i_start, n_times_h, x_active, y_error)
+    cache = option_cache_new(x, x_pads, split_train, i_start_by_x, i_stop_by_x, error)
+    result = boosting_run(y, x, x_pads, h, split_train, split_validate, split_train_and_validate, i_start_by_x, i_stop_by_x, delta, mindelta, error, selective_stopping, i_start, n_times_h, x_active, y_error, cache, NULL, 0)
+    option_cache_free(cache)
     free(x_active)
     free(y_error)
 
@@ -3,16 +3,29 @@ from warnings import catch_warnings, filterwarnings
 
 import numpy as np
 from scipy.linalg import norm
-from scipy.stats import spearmanr
+from scipy.stats import rankdata, spearmanr
 try:
     from scipy.stats import ConstantInputWarning  # >= 1.9
 except ImportError:
     from scipy.stats import SpearmanRConstantInputWarning as ConstantInputWarning  # < 1.9
 
-from ._boosting_opt import error_for_indexes
+from ._boosting_opt import error_for_indexes, errors_for_indexes
 from .shared import DeconvolutionData
 
 
+def pearsonr_rows(
+        a: np.ndarray,  # (n, n_times)
+        b: np.ndarray,  # (n, n_times)
+) -> np.ndarray:
+    "Correlation between corresponding rows (0 for constant rows)"
+    a = a - a.mean(-1, keepdims=True)
+    b = b - b.mean(-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.einsum('ij,ij->i', a, b) / np.sqrt(np.einsum('ij,ij->i', a, a) * np.einsum('ij,ij->i', b, b))
+    r[~np.isfinite(r)] = 0
+    return np.clip(r, -1, 1, out=r)
+
+
 class Evaluator:
     vector = False
     attr = NotImplemented
@@ -52,6 +65,21 @@ class Evaluator:
     ):
         raise NotImplementedError
 
+    def add_ys(
+            self,
+            i_start: int,  # index of the first y (row in data.y)
+            y: np.ndarray,  # (n_y, n_times) actual data
+            y_pred: np.ndarray,  # (n_y, n_times) data predicted by model
+    ):
+        "Add a block of consecutive signals"
+        if self.vector:
+            n_vec = len(self.data.vector_dim)
+            for i in range(0, len(y), n_vec):
+                self.add_y((i_start + i) // n_vec, y[i: i + n_vec], y_pred[i: i + n_vec])
+        else:
+            for i in range(len(y)):
+                self.add_y(i_start + i, y[i], y_pred[i])
+
     def __repr__(self):
         return f"<{self.__class__.__name__} evaluator>"
 
@@ -73,6 +101,11 @@ class L1(Evaluator):
         for x, segments in zip(self.xs, self.segments):
             x[i] = error_for_indexes(err, segments, 1)
 
+    def add_ys(self, i_start, y, y_pred):
+        err = np.subtract(y, y_pred)
+        for x, segments in zip(self.xs, self.segments):
+            errors_for_indexes(err, segments, 1, x[i_start: i_start + len(y)])
+
 
 class L2(Evaluator):
     attr = 'l2_residual'
@@ -88,6 +121,11 @@ class L2(Evaluator):
         for x, segments in zip(self.xs, self.segments):
             x[i] = error_for_indexes(err, segments, 2)
 
+    def add_ys(self, i_start, y, y_pred):
+        err = np.subtract(y, y_pred)
+        for x, segments in zip(self.xs, self.segments):
+            errors_for_indexes(err, segments, 2, x[i_start: i_start + len(y)])
+
 
 class L1Total(Evaluator):
     attr = 'l1_total'
@@ -102,6 +140,11 @@ class L1Total(Evaluator):
         for x, segments in zip(self.xs, self.segments):
             x[i] = error_for_indexes(y, segments, 1)
 
+    def add_ys(self, i_start, y, y_pred):
+        y = np.ascontiguousarray(y)
+        for x, segments in zip(self.xs, self.segments):
+            errors_for_indexes(y, segments, 1, x[i_start: i_start + len(y)])
+
 
 class L2Total(Evaluator):
     attr = 'l2_total'
@@ -116,6 +159,11 @@ class L2Total(Evaluator):
         for x, segments in zip(self.xs, self.segments):
             x[i] = error_for_indexes(y, segments, 2)
 
+    def add_ys(self, i_start, y, y_pred):
+        y = np.ascontiguousarray(y)
+        for x, segments in zip(self.xs, self.segments):
+            errors_for_indexes(y, segments, 2, x[i_start: i_start + len(y)])
+
 
 class Correlation(Evaluator):
     attr = 'r'
@@ -135,6 +183,11 @@ class Correlation(Evaluator):
                 r = np.corrcoef(y_i, y_pred_i)[0, 1]
             x[i] = 0 if np.isnan(r) else r
 
+    def add_ys(self, i_start, y, y_pred):
+        for x, segments in zip(self.xs, self.segments):
+            y_i, y_pred_i = self._crop_y(segments, y, y_pred)
+            x[i_start: i_start + len(y)] = pearsonr_rows(y_i, y_pred_i)
+
 
 class RankCorrelation(Evaluator):
     attr = 'r_rank'
@@ -155,6 +208,11 @@ class RankCorrelation(Evaluator):
                 r = spearmanr(y_i, y_pred_i)[0]
             x[i] = 0 if np.isnan(r) else r
 
+    def add_ys(self, i_start, y, y_pred):
+        for x, segments in zip(self.xs, self.segments):
+            y_i, y_pred_i = self._crop_y(segments, y, y_pred)
+            x[i_start: i_start + len(y)] = pearsonr_rows(rankdata(y_i, axis=-1), rankdata(y_pred_i, axis=-1))
+
 
 class VectorL1(Evaluator):
     vector = True
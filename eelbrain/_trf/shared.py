@@ -15,6 +15,11 @@ from .._data_obj import CategorialArg, NDVarArg, Datalist, Dataset, NDVar, Case,
 from .._utils import PickleableDataClass, intervals
 
 
+# Memory for temporary arrays when computing the scale of y (bytes)
+SCALE_BLOCK_BYTES = 2**26
+DTYPES = (np.float32, np.float64)
+
+
 class EQMixIn:
 
     def __eq__(self, other):
@@ -211,6 +216,26 @@ def split_data(
     return Splits(splits, partitions_arg, partitions, validate, test, model, segments, split_segments)
 
 
+def row_scale(
+        data: np.ndarray,  # (n, n_times) or, with vector, (n, n_vector, n_times)
+        error: str,  # 'l1': mean absolute value; 'l2': root mean square
+        vector: bool = False,  # compute the scale of the vector norm
+) -> np.ndarray:
+    "Scale of each row, computed in blocks to avoid temporary copies of data"
+    n_row = data[0].size if len(data) else 1
+    block_size = max(1, SCALE_BLOCK_BYTES // (8 * n_row))
+    out = np.empty(len(data))
+    for start in range(0, len(data), block_size):
+        block = np.asarray(data[start: start + block_size], np.float64)
+        if vector:
+            block = norm(block, axis=1)
+        if error == 'l1':
+            out[start: start + block_size] = np.abs(block).mean(-1)
+        else:
+            out[start: start + block_size] = (block ** 2).mean(-1) ** 0.5
+    return out
+
+
 class PredictorData:
     """Restructure model NDVars (like DeconvolutionData but for x only)"""
 
@@ -306,11 +331,11 @@ class PredictorData:
             x_data = [np.ascontiguousarray(xi.get_data(dimnames).reshape(shape)) for xi, dimnames in zip(xs, x_dimnames)]
             if len(x_data) == 1:
                 x_data = x_data[0]
-                if copy:
+                # get_data() and reshape() may already have made a copy
+                x_data_is_copy = not np.may_share_memory(x_data, xs[0].x)
+                if copy and not x_data_is_copy:
                     x_data = x_data.copy()
                     x_data_is_copy = True
-                else:
-                    x_data_is_copy = False
             else:
                 x_data = np.concatenate(x_data)
                 x_data_is_copy = True
@@ -357,6 +382,14 @@ class DeconvolutionData:
         segments delimit chunks of continuous data, such as trials.
     splits : list of Split
         Cross-validation scheme.
+
+    Notes
+    -----
+    With ``dtype='float32'``, ``y`` is stored in single precision, which halves
+    the memory needed for large ``y`` (e.g., source space data). Boosting and
+    the data scale still use double precision, and kernels usually agree with
+    kernels estimated from float64 data to within 1 % of their maximum.
+    ``x`` is always stored in double precision.
     """
     # data
     x_mean = None
@@ -375,7 +408,11 @@ class DeconvolutionData:
             x: NDVarArg | Sequence[NDVarArg],
             data: Dataset = None,
             in_place: bool = False,
+            dtype: np.dtype | str = np.float64,  # for storing y
     ):
+        dtype = np.dtype(dtype)
+        if dtype not in DTYPES:
+            raise ValueError(f"{dtype=}: need float32 or float64")
         x_data = PredictorData(x, data)
 
         # check y
@@ -423,12 +460,16 @@ class DeconvolutionData:
         n_flat = reduce(mul, map(len, ydims), 1)
         shape = (n_flat, x_data.n_times_flat)
         if x_data.is_ragged:
-            y_data = np.empty(shape)
+            y_data = np.empty(shape, dtype)
             for yi, (start, stop) in zip(y, x_data.segments):
                 y_data[:, start:stop] = yi.get_data(y_dimnames).reshape((n_flat, stop - start))
             self._y_is_copy = True
         else:
             y_data = y.get_data(y_dimnames).reshape(shape)
+            if y_data.dtype != dtype:
+                y_data = y_data.astype(dtype)
+            # get_data() and reshape() may already have made a copy
+            self._y_is_copy = not np.may_share_memory(y_data, y.x)
         # shape for exposing vector dimension
         if vector_dim:
             n_flat_prevector = reduce(mul, map(len, ydims[:-1]), 1)
@@ -501,27 +542,26 @@ class DeconvolutionData:
         return np.zeros(len(self.x))
 
     def normalize(self, error: str):
-        self._copy_data(y=True)
-        y_mean = self.y.mean(1)
+        if error not in ('l1', 'l2'):
+            raise RuntimeError(f"{error=}")
+        self._copy_data()
+        y_mean = self.y.mean(1, dtype=np.float64)
         x_mean = self.x.mean(1)
-        self.y -= y_mean[:, newaxis]
+        # copy y while subtracting the mean
+        if self.in_place or self._y_is_copy:
+            self.y -= y_mean[:, newaxis]
+        else:
+            self.y = np.subtract(self.y, y_mean[:, newaxis], dtype=self.y.dtype)
+            self._y_is_copy = True
         self.x -= x_mean[:, newaxis]
         # for vector data, scale by vector norm
         if self.vector_shape:
             y_data_vector_shape = self.y.reshape(self.vector_shape)
-            y_data_for_scale = norm(y_data_vector_shape, axis=1)
+            y_scale = row_scale(y_data_vector_shape, error, vector=True)
         else:
             y_data_vector_shape = None
-            y_data_for_scale = self.y
-
-        if error == 'l1':
-            y_scale = np.abs(y_data_for_scale).mean(-1)
-            x_scale = np.abs(self.x).mean(-1)
-        elif error == 'l2':
-            y_scale = (y_data_for_scale ** 2).mean(-1) ** 0.5
-            x_scale = (self.x ** 2).mean(-1) ** 0.5
-        else:
-            raise RuntimeError(f"{error=}")
+            y_scale = row_scale(self.y, error)
+        x_scale = row_scale(self.x, error)
 
         if self.vector_shape:
             y_data_vector_shape /= y_scale[:, newaxis, newaxis]
@@ -540,7 +580,7 @@ class DeconvolutionData:
     def _check_data(self):
         if self.x_scale is None:
             x_check = self.x.var(1)
-            y_check = self.y.var(1)
+            y_check = self.y.var(1, dtype=np.float64)
         else:
             x_check = self.x_scale
             y_check = self.y_scale
@@ -15,7 +15,8 @@ import scipy.stats
 from eelbrain import datasets, boosting, combine, convolve, correlation_coefficient, epoch_impulse_predictor, NDVar, UTS, Scalar
 
 from eelbrain.testing import assert_dataobj_equal
-from eelbrain._trf._boosting import Boosting, DeconvolutionData, Split, convolve_1d
+from eelbrain._ndvar._convolve import convolve_1d
+from eelbrain._trf._boosting import Boosting, DeconvolutionData, Split
 from eelbrain._trf._boosting_opt import boosting_fit
 
 
@@ -189,6 +190,14 @@ def test_boosting_epochs():
     y = convolve(res.h_scaled, [p0, p1])
     r = correlation_coefficient(y, ds['utsnd'], ('case', 'time'))
     assert_dataobj_equal(res.r, r, decimal=3, name=False)
+    # fitting signals in batches
+    for error, batch_size in product(('l1', 'l2'), (1, 2, 5)):
+        res_b = boosting('utsnd', [p0, p1], 0, 0.6, error=error, model='A', data=ds, partitions=3, batch_size=batch_size)
+        if batch_size == 1:
+            res_1 = res_b
+            continue
+        for h, h_1 in zip(res_b.h, res_1.h):
+            assert_dataobj_equal(h, h_1)
     # cross-validation
     res_cv = boosting('utsnd', [p0, p1], 0, 0.6, error='l1', data=ds, partitions=3, test=1, partition_results=True, debug=True)
     y_pred = res_cv.cross_predict([p0, p1], scale='normalized')
@@ -223,6 +232,114 @@ def test_boosting_object():
     assert_dataobj_equal(h_part.mean('case'), res_oo._h)
 
 
+def test_boosting_float32():
+    "Test storing y as float32"
+    ds = datasets._get_continuous(ynd=True)
+    data = DeconvolutionData('y', ['x1', 'x2'], ds, dtype='float32')
+    assert data.y.dtype == np.float32
+    data.normalize('l1')
+    assert data.y.dtype == np.float32
+    assert ds['y'].x.dtype == np.float64
+    data_64 = DeconvolutionData('y', ['x1', 'x2'], ds)
+    data_64.normalize('l1')
+    assert_allclose(data.y_scale, data_64.y_scale, rtol=1e-6)
+    assert_allclose(data.y, data_64.y, atol=1e-5)
+    # documented tolerance: 1 % of the kernel maximum
+    for error in ['l1', 'l2']:
+        res_64 = boosting('y', ['x1', 'x2'], 0, 1, data=ds, error=error, basis=0.2, partitions=4)
+        res_32 = boosting('y', ['x1', 'x2'], 0, 1, data=ds, error=error, basis=0.2, partitions=4, dtype='float32')
+        for h_32, h_64 in zip(res_32.h, res_64.h):
+            assert_allclose(h_32.x, h_64.x, atol=0.01 * np.abs(h_64.x).max())
+        assert res_32.r == approx(res_64.r, abs=1e-4)
+    with pytest.raises(ValueError):
+        DeconvolutionData('y', 'x1', ds, dtype='int16')
+
+
+def test_boosting_blocks(tmp_path, monkeypatch):
+    "Test fitting blocks of memory-mapped y"
+    ds = datasets._get_continuous()
+    x1, x2 = ds['x1'], ds['x2']
+    band = Scalar('band', range(5))
+    rng = np.random.RandomState(0)
+    y = convolve(ds['h1'] * NDVar(rng.uniform(0.5, 1, 5), band), x1) + NDVar(rng.normal(0, 1, (5, len(x1))), (band, x1.time))
+    np.save(tmp_path / 'y.npy', y.get_data(('band', 'time')))
+    y_mmap = NDVar(np.load(tmp_path / 'y.npy', mmap_mode='r'), (band, x1.time), 'y')
+    res = boosting(y, [x1, x2], 0, 1, partitions=3, test=1, partition_results=True)
+    res_blocks = boosting(y_mmap, [x1, x2], 0, 1, partitions=3, test=1, partition_results=True, block_size=2, block_dir=tmp_path / 'blocks')
+    for h_blocks, h in zip(res_blocks.h, res.h):
+        assert_dataobj_equal(h_blocks, h, name=False)
+    assert_dataobj_equal(res_blocks.r, res.r, name=False)
+    assert len(res_blocks.partition_results) == 3
+    assert_dataobj_equal(res_blocks.partition_results[1].h[0], res.partition_results[1].h[0], name=False)
+    assert sorted(path.name for path in (tmp_path / 'blocks').iterdir()) == ['band-0-2.pickle', 'band-2-4.pickle', 'band-4-5.pickle', 'parameters.pickle']
+    # resume from saved blocks
+    (tmp_path / 'blocks' / 'band-2-4.pickle').unlink()
+    n_fit = []
+    fit = Boosting.fit
+    monkeypatch.setattr(Boosting, 'fit', lambda self, *args: n_fit.append(1) or fit(self, *args))
+    res_resumed = boosting(y_mmap, [x1, x2], 0, 1, partitions=3, test=1, partition_results=True, block_size=2, block_dir=tmp_path / 'blocks')
+    assert len(n_fit) == 1
+    assert_dataobj_equal(res_resumed.h[1], res.h[1], name=False)
+    # resuming with different parameters
+    with pytest.raises(ValueError, match='delta'):
+        boosting(y_mmap, [x1, x2], 0, 1, partitions=3, test=1, partition_results=True, block_size=2, block_dir=tmp_path / 'blocks', delta=0.01)
+    with pytest.raises(ValueError, match=r'\(x\)'):
+        boosting(y_mmap, [x1, x2 + 1], 0, 1, partitions=3, test=1, partition_results=True, block_size=2, block_dir=tmp_path / 'blocks')
+    # resuming with different y data
+    np.save(tmp_path / 'y2.npy', y.get_data(('band', 'time')) + 1)
+    y2_mmap = NDVar(np.load(tmp_path / 'y2.npy', mmap_mode='r'), (band, x1.time), 'y')
+    with pytest.raises(ValueError, match='different y data'):
+        boosting(y2_mmap, [x1, x2], 0, 1, partitions=3, test=1, partition_results=True, block_size=2, block_dir=tmp_path / 'blocks')
+    assert len(n_fit) == 1
+    with pytest.raises(ValueError):
+        boosting(x2, x1, 0, 1, partitions=3, block_size=1, h_init=res)
+    # read-only y is passed to the fitting without copy
+    res = boosting(y, x1, 0, 1, partitions=3, scale_data=False)
+    res_blocks = boosting(y_mmap, x1, 0, 1, partitions=3, block_size=2, scale_data=False)
+    assert_dataobj_equal(res_blocks.h, res.h, name=False)
+
+
+def test_boosting_warm_start():
+    "Test starting boosting from previous kernels"
+    ds = datasets._get_continuous()
+    res = boosting('y', ['x1', 'x2'], 0, 1, data=ds, partitions=4)
+    # initial kernels are converted to the data scale of the model
+    data = DeconvolutionData('y', ['x1', 'x2'], ds)
+    data.normalize('l1')
+    data.initialize_cross_validation(4)
+    model = Boosting(data)
+    model._i_start = 0
+    n_times_h = len(res.h_time)
+    n_x = len(data.x)  # x2 has 2 dimensions
+    hs = model._h_init_array(res, np.zeros(n_x, np.int64), np.full(n_x, n_times_h))
+    assert hs.shape == (4, 1, n_x, n_times_h)
+    y_mean, y_scale, x_mean, x_scale = data.data_scale_ndvars()
+    for h, h_init, x_scale_i in zip(data.package_kernel(hs[0], 0), res.h_scaled, x_scale):
+        assert_dataobj_equal(h * (y_scale / x_scale_i), h_init, decimal=12, name=False)
+    # restart from result
+    res_warm = boosting('y', ['x1', 'x2'], 0, 1, data=ds, partitions=4, h_init=res)
+    assert res_warm.r >= res.r - 0.001
+    # add a predictor to a reduced model
+    res_x1 = boosting('y', 'x1', 0, 1, data=ds, partitions=4)
+    res_x12 = boosting('y', ['x1', 'x2'], 0, 1, data=ds, partitions=4, h_init=res_x1)
+    assert res_x12.r > res_x1.r
+    assert res_x12.r == approx(res.r, abs=0.01)
+    # with test partitions, h_init needs matching partition results
+    with pytest.raises(ValueError):
+        boosting('y', ['x1', 'x2'], 0, 1, data=ds, partitions=4, test=1, h_init=res)
+    res_test = boosting('y', 'x1', 0, 1, data=ds, partitions=4, test=1, partition_results=True)
+    res_test_12 = boosting('y', ['x1', 'x2'], 0, 1, data=ds, partitions=4, test=1, h_init=res_test)
+    assert res_test_12.r > res_test.r
+
+    # regularization path
+    model = Boosting(data)
+    results = model.fit_path(0, 1, [0.05, 0.01, 0.005], error='l1', selective_stopping=0)
+    assert [r.delta for r in results] == [0.05, 0.01, 0.005]
+    assert results[-1].r >= results[0].r - 0.001
+    with pytest.raises(ValueError):
+        model.fit_path(0, 1, [0.05, 0.01], mindelta=[0.001])
+
+
 def test_result():
     "Test boosting results"
     ds = datasets._get_continuous()
@@ -316,6 +433,50 @@ def test_boosting_fit():
     assert rr == approx(mat['crlt'][1, 0])
 
 
+def shifted_x(x, x_pad, segments, shift):
+    out = np.zeros(len(x))
+    for start, stop in segments:
+        for i in range(start, stop):
+            out[i] = x[i - shift] if start <= i - shift < stop else x_pad
+    return out
+
+
+@pytest.mark.parametrize('error', [1, 2])
+def test_boosting_steps(error):
+    "Test incremental evaluation of boosting options against direct computation"
+    rng = np.random.RandomState(0)
+    n_times = 600
+    x = rng.normal(0, 1, (3, n_times))
+    x_pads = np.array([0, 0.5, -0.2])
+    h_true = rng.normal(0, 1, (3, 5))
+    segments = np.array([[0, 200], [200, n_times]], np.int64)
+    y = np.empty(n_times)
+    convolve_1d(h_true, x, x_pads, -2, segments, y)
+    y += rng.normal(0, 0.5, n_times)
+    split = Split(np.array([[100, 200], [250, n_times]], np.int64), np.array([[0, 100], [200, 250]], np.int64))
+    i_start_by_x = np.array([-2, -2, 0], np.int64)
+    i_stop_by_x = np.array([3, 2, 3], np.int64)
+    h, history = boosting_fit(y, x, x_pads, split.train, split.validate, split.train_and_validate, i_start_by_x, i_stop_by_x, 0.01, 0.001, error)
+    assert len(history) > 100
+    # all options as (n_options, n_times) for the training data
+    options = [(i_stim, shift) for i_stim in range(3) for shift in range(i_start_by_x[i_stim], i_stop_by_x[i_stim])]
+    x_options = np.array([shifted_x(x[i_stim], x_pads[i_stim], split.train, shift) for i_stim, shift in options])
+    index = np.concatenate([np.arange(start, stop) for start, stop in split.train])
+    x_options = x_options[:, index]
+    y_error = y[index]
+    err = np.abs if error == 1 else np.square
+    for step in history[1:]:
+        if step.delta == 0:
+            continue
+        # the selected option minimizes the training error
+        delta = abs(step.delta)
+        e_options = np.concatenate([err(y_error - delta * x_options).sum(1), err(y_error + delta * x_options).sum(1)])
+        assert step.e_train == approx(e_options.min(), rel=1e-10)
+        i_option = options.index((step.i_stim, step.i_time - 2))
+        y_error -= step.delta * x_options[i_option]
+        assert step.e_train == approx(err(y_error).sum(), rel=1e-10)
+
+
 def test_trf_len():
     # test vanilla boosting
     rng = np.random.RandomState(0)
@@ -1,8 +1,11 @@
 # Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
 import numpy as np
+from numpy.testing import assert_allclose
 import pytest
 
-from eelbrain._trf._fit_metrics import error_for_indexes
+from eelbrain import datasets
+from eelbrain._trf._fit_metrics import EVALUATORS, error_for_indexes
+from eelbrain._trf.shared import DeconvolutionData
 
 
 # numpy-based error functions
@@ -23,3 +26,21 @@ def test_error_functions():
     index = np.array(((0, 100),), np.int64)
     assert error_for_indexes(x, index, 1) == pytest.approx(np_l1(x))
     assert error_for_indexes(x, index, 2) == pytest.approx(np_l2(x))
+
+
+def test_evaluators():
+    "Test evaluating blocks of signals"
+    ds = datasets._get_continuous(ynd=True)
+    data = DeconvolutionData('ynd', 'x1', ds)
+    rng = np.random.RandomState(0)
+    y_pred = data.y + rng.normal(0, 1, data.y.shape)
+    y_pred[1] = 0  # constant prediction
+    segments = [np.array(((0, 100),), np.int64), np.array(((0, 40), (60, 100)), np.int64)]
+    for key in ['l1_residual', 'l2_residual', 'l1_total', 'l2_total', 'r', 'r_rank']:
+        evaluator = EVALUATORS[key](data, segments)
+        for i, (y_i, y_pred_i) in enumerate(zip(data.y, y_pred)):
+            evaluator.add_y(i, y_i, y_pred_i)
+        evaluator_block = EVALUATORS[key](data, segments)
+        evaluator_block.add_ys(0, data.y, y_pred)
+        for x_block, x in zip(evaluator_block.xs, evaluator.xs):
+            assert_allclose(x_block, x, err_msg=key)
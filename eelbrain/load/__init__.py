@@ -23,6 +23,7 @@ from . import mne
 
 from .._io.txt import tsv
 from .._io.cnd import read_cnd as cnd
+from .._io.dataset_dir import load_dataset_dir as dataset_dir
 from .._io.pickle import unpickle, update_subjects_dir, convert_pickle_protocol
 from .._io.sphere import load_sphere as sphere_audio
 from .._io.wav import load_wav as wav
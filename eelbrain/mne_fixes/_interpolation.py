@@ -1,5 +1,17 @@
 # Mostly retaining MNE-Python functions to compensate for API changes
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import io
 import logging
+from pathlib import Path
+import pickle
+import struct
+import zlib
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 import numpy as np
 
@@ -11,11 +23,14 @@ try:
 except ImportError:  # mne < 0.21
     from mne.forward import _map_meg_channels as _map_meg_or_eeg_channels
 
+from .._config import mpc
+from .._types import PathArg
+
 
 # mne 0.10 function
-def map_meg_channels(inst, picks_good, picks_bad, mode):
-    info_from = mne.pick_info(inst.info, picks_good, copy=True)
-    info_to = mne.pick_info(inst.info, picks_bad, copy=True)
+def map_meg_channels(info, picks_good, picks_bad, mode):
+    info_from = mne.pick_info(info, picks_good, copy=True)
+    info_to = mne.pick_info(info, picks_bad, copy=True)
     return _map_meg_or_eeg_channels(info_from, info_to, mode=mode, origin='auto')
 
 
@@ -116,7 +131,102 @@ def _interpolate_bads_eeg(epochs, bad_channels_by_epoch):
         epochs._data[i, bads_idx, :] = np.dot(interpolation, epochs._data[i, goods_idx, :])
 
 
-def _interpolate_bads_meg(epochs, bad_channels_by_epoch, interp_cache):
+class InterpolatorCache(dict):
+    """Interpolators stored in an append-only file
+
+    Each entry is appended to the file as a separate record, so that adding
+    interpolators never rewrites the file. Several processes can use the same
+    file: writing is protected by a file lock (where available). Records are
+    length-prefixed and checksummed, so that a record that is still being
+    written is read later, and a corrupt record (e.g., left by a writer that
+    was killed) is skipped.
+
+    Parameters
+    ----------
+    path
+        Cache file (can contain a whole-file pickled :class:`dict` from
+        previous versions).
+    """
+    _MAGIC = b'EICR'
+    _HEADER = struct.Struct('<4sQI')  # magic, payload length, payload crc32
+
+    def __init__(self, path: PathArg):
+        dict.__init__(self)
+        self.path = Path(path)
+        self._offset = 0
+        self.read()
+
+    def read(self):
+        "Read entries added to the file since the last read"
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as fid:
+            if fcntl is not None:
+                fcntl.flock(fid, fcntl.LOCK_SH)
+            fid.seek(0, 2)
+            if fid.tell() < self._offset:  # file was reset
+                dict.clear(self)
+                self._offset = 0
+            fid.seek(self._offset)
+            data = fid.read()
+        offset = self._offset
+        pos = 0
+        if offset == 0 and not data.startswith(self._MAGIC):
+            pos = self._read_legacy(data)
+            self._offset = pos
+        while True:
+            pos = data.find(self._MAGIC, pos)
+            if pos == -1:
+                break
+            end = pos + self._HEADER.size
+            if end <= len(data):
+                _, length, crc = self._HEADER.unpack_from(data, pos)
+                payload = data[end: end + length]
+                if len(payload) == length and zlib.crc32(payload) == crc:
+                    if offset + pos > self._offset:
+                        logging.getLogger(__name__).warning("%s: skipping corrupt record at byte %i", self.path, self._offset)
+                    dict.__setitem__(self, *pickle.loads(payload))
+                    pos = end + length
+                    self._offset = offset + pos
+                    continue
+            # incomplete or corrupt record: look for a subsequent record
+            pos += 1
+
+    def _read_legacy(self, data: bytes) -> int:
+        "Read pickle records from previous versions, return end position"
+        fid = io.BytesIO(data)
+        pos = 0
+        while pos < len(data) and not data.startswith(self._MAGIC, pos):
+            try:
+                record = pickle.load(fid)
+            except Exception:
+                break
+            pos = fid.tell()
+            if isinstance(record, dict):
+                dict.update(self, record)
+            else:
+                dict.__setitem__(self, *record)
+        return pos
+
+    def __setitem__(self, key, value):
+        payload = pickle.dumps((key, value), pickle.HIGHEST_PROTOCOL)
+        header = self._HEADER.pack(self._MAGIC, len(payload), zlib.crc32(payload))
+        with open(self.path, 'ab') as fid:
+            if fcntl is not None:
+                fcntl.flock(fid, fcntl.LOCK_EX)
+            fid.write(header + payload)
+        dict.__setitem__(self, key, value)
+
+    def clear(self):
+        with open(self.path, 'ab') as fid:
+            if fcntl is not None:
+                fcntl.flock(fid, fcntl.LOCK_EX)
+            fid.truncate(0)
+        dict.clear(self)
+        self._offset = 0
+
+
+def _interpolate_bads_meg(epochs, bad_channels_by_epoch, interp_cache, n_workers=0):
     """Interpolate bad MEG channels per epoch
 
     Parameters
@@ -126,8 +236,10 @@ def _interpolate_bads_meg(epochs, bad_channels_by_epoch, interp_cache):
     bad_channels_by_epoch : list of list of str
         Bad channel names specified for each epoch. For example, for an Epochs
         instance containing 3 epochs: ``[['F1'], [], ['F3', 'FZ']]``
-    interp_cache : dict
+    interp_cache : dict | InterpolatorCache
         Will be updated.
+    n_workers : int
+        Number of processes for computing missing interpolators.
 
     Notes
     -----
@@ -164,28 +276,42 @@ def _interpolate_bads_meg(epochs, bad_channels_by_epoch, interp_cache):
         interp_cache['ch_names'] = epochs.ch_names
 
     # create interpolators
-    make_interpolators(interp_cache, needed, bads, epochs)
+    make_interpolators(interp_cache, needed, bads, epochs, n_workers)
     t1 = time.time()
 
     logger.debug("interpolate epochs")
+    epochs_by_key = defaultdict(list)
     for i, key in enumerate(sorted_bad_chs_by_epoch):
-        if not key:
-            continue
-        # apply interpolation
+        if key:
+            epochs_by_key[key].append(i)
+    for key, index in epochs_by_key.items():
+        # apply interpolation to all epochs with the same bad channels
         picks_good, picks_bad, interpolation = interp_cache[bads, key]
-        logger.info('Interpolating sensors %s on epoch %s', picks_bad, i)
-        epochs._data[i, picks_bad, :] = interpolation.dot(epochs._data[i, picks_good, :])
+        logger.info('Interpolating sensors %s on epochs %s', picks_bad, index)
+        epochs._data[np.ix_(index, picks_bad)] = np.matmul(interpolation, epochs._data[np.ix_(index, picks_good)])
     t2 = time.time()
 
     logger.debug(f"Interpolation took {t1 - t0}/{t2 - t1} seconds")
 
 
-def make_interpolators(interp_cache, keys, bads, epochs):
+def _make_meg_interpolator(info, key):
+    picks_good = mne.pick_types(info, meg=True, ref_meg=False, exclude=key)
+    picks_bad = mne.pick_channels(info.ch_names, key)
+    interpolation = map_meg_channels(info, picks_good, picks_bad, 'accurate')
+    return picks_good, picks_bad, interpolation
+
+
+def make_interpolators(interp_cache, keys, bads, epochs, n_workers=0):
+    if isinstance(interp_cache, InterpolatorCache):
+        interp_cache.read()  # entries added by other processes
     make = [k for k in keys if (bads, k) not in interp_cache]
     logger = logging.getLogger(__name__)
     logger.debug(f"Making {len(make)} of {len(keys)} interpolators")
-    for key in make:
-        picks_good = mne.pick_types(epochs.info, meg=True, ref_meg=False, exclude=key)
-        picks_bad = mne.pick_channels(epochs.ch_names, key)
-        interpolation = map_meg_channels(epochs, picks_good, picks_bad, 'accurate')
-        interp_cache[bads, key] = picks_good, picks_bad, interpolation
+    n_workers = min(n_workers or 0, len(make))
+    if n_workers > 1:
+        with ProcessPoolExecutor(n_workers, mp_context=mpc) as executor:
+            interpolators = list(executor.map(_make_meg_interpolator, repeat(epochs.info), make))
+    else:
+        interpolators = [_make_meg_interpolator(epochs.info, key) for key in make]
+    for key, interpolator in zip(make, interpolators):
+        interp_cache[bads, key] = interpolator
@@ -1,9 +1,16 @@
 # Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+from pathlib import Path
+import pickle
+import zlib
+
+import mne
+import numpy as np
 from numpy.testing import assert_array_equal, assert_array_almost_equal
 
 from eelbrain import datasets
-from eelbrain.mne_fixes import _interpolate_bads_meg
-from eelbrain.testing import requires_mne_sample_data
+from eelbrain.mne_fixes import InterpolatorCache, _interpolate_bads_meg
+from eelbrain.mne_fixes import _interpolation
+from eelbrain.testing import TempDir, requires_mne_sample_data
 
 
 @requires_mne_sample_data
@@ -28,3 +35,76 @@ def test_interpolation():
     epochs3.info['bads'] = bads3
     epochs3.interpolate_bads(mode='accurate', origin='auto')
     assert_array_almost_equal(test_epochs._data[3], epochs3._data[3], 25)
+
+
+def test_interpolation_by_bad_set(monkeypatch):
+    "Test applying interpolators to epochs that share bad channels"
+    def map_meg_channels(info, picks_good, picks_bad, mode):
+        return np.full((len(picks_bad), len(picks_good)), 1 / len(picks_good))
+
+    monkeypatch.setattr(_interpolation, 'map_meg_channels', map_meg_channels)
+    ch_names = [f'MEG {i:03}' for i in range(6)]
+    info = mne.create_info(ch_names, 100, 'mag')
+    rng = np.random.RandomState(0)
+    epochs = mne.EpochsArray(rng.normal(0, 1, (5, 6, 10)), info, verbose=False)
+    bads_list = [[], ['MEG 001'], ['MEG 002', 'MEG 004'], ['MEG 001'], []]
+    target = epochs.get_data().copy()
+    for data, bads in zip(target, bads_list):
+        if bads:
+            picks_bad = [ch_names.index(ch) for ch in bads]
+            picks_good = [i for i in range(6) if i not in picks_bad]
+            data[picks_bad] = data[picks_good].mean(0)
+
+    for n_workers in (0, 2):
+        test_epochs = epochs.copy()
+        interp_cache = {}
+        _interpolate_bads_meg(test_epochs, bads_list, interp_cache, n_workers)
+        assert_array_almost_equal(test_epochs.get_data(), target)
+        assert len(interp_cache) == 3  # ch_names and 2 interpolators
+
+
+def test_interpolator_cache():
+    "Test the append-only interpolator cache file"
+    tempdir = TempDir()
+    path = Path(tempdir) / 'interp.pickle'
+    cache = InterpolatorCache(path)
+    assert cache == {}
+    cache['ch_names'] = ['a', 'b']
+    cache[(), ('a',)] = np.arange(3)
+    cache_2 = InterpolatorCache(path)
+    assert list(cache_2) == ['ch_names', ((), ('a',))]
+    assert_array_equal(cache_2[(), ('a',)], np.arange(3))
+    # entries added by another process
+    cache['c'] = 1
+    cache_2.read()
+    assert cache_2['c'] == 1
+    # incomplete record from a concurrent writer
+    payload = pickle.dumps(('d', np.arange(100)))
+    data = InterpolatorCache._HEADER.pack(InterpolatorCache._MAGIC, len(payload), zlib.crc32(payload)) + payload
+    with open(path, 'ab') as fid:
+        fid.write(data[:50])
+    cache_2.read()
+    assert 'd' not in cache_2
+    with open(path, 'ab') as fid:
+        fid.write(data[50:])
+    cache_2.read()
+    assert_array_equal(cache_2['d'], np.arange(100))
+    # truncated record from a writer that was killed
+    with open(path, 'ab') as fid:
+        fid.write(data[:50])
+    cache['e'] = 2
+    cache_2.read()
+    assert cache_2['e'] == 2
+    assert list(InterpolatorCache(path)) == list(cache_2)
+    # reset
+    cache.clear()
+    assert InterpolatorCache(path) == {}
+    cache_2.read()
+    assert cache_2 == {}
+    # cache file from previous versions
+    with open(path, 'wb') as fid:
+        pickle.dump({'ch_names': ['a'], 'x': 1}, fid)
+    assert InterpolatorCache(path) == {'ch_names': ['a'], 'x': 1}
+    cache = InterpolatorCache(path)
+    cache['y'] = 2
+    assert InterpolatorCache(path) == {'ch_names': ['a'], 'x': 1, 'y': 2}
@@ -34,6 +34,61 @@ InterpolationArg = Literal[None, 'nearest', 'linear', 'spline']
 SensorLabelsArg = Literal['', 'none', 'index', 'name', 'fullname']
 
 
+# Cache for thin-plate spline interpolation operators
+TOPOMAP_OPERATORS = {}
+TOPOMAP_OPERATORS_MAX = 16
+
+
+def thin_plate_operator(locs: np.ndarray, res: int) -> np.ndarray:
+    """Linear operator for thin-plate spline interpolation of sensor data
+
+    Parameters
+    ----------
+    locs : array (n_sensors, 2)
+        Sensor locations (in the unit square).
+    res
+        Resolution of the ``res * res`` pixel grid.
+
+    Returns
+    -------
+    operator : array (res * res, n_sensors)
+        Operator mapping sensor data to the flattened pixel grid (rows
+        correspond to ``np.meshgrid(grid, grid)``).
+    """
+    key = (locs.tobytes(), locs.shape, res)
+    if key in TOPOMAP_OPERATORS:
+        return TOPOMAP_OPERATORS[key]
+    # code adapted from mne-python topmap _griddata()
+    xy = locs[:, 0] + locs[:, 1] * -1j
+    d = np.abs(xy - xy[:, None])
+    diagonal_step = len(locs) + 1
+    d.flat[::diagonal_step] = 1.
+    g = (d * d) * (np.log(d) - 1.)
+    g.flat[::diagonal_step] = 0.
+    # thin-plate kernel between pixels and sensors
+    grid = np.linspace(0, 1, res)
+    xi, yi = np.meshgrid(grid, grid)
+    d = np.abs((xi + -1j * yi).reshape((-1, 1)) - xy)
+    on_sensor = d == 0
+    d[on_sensor] = 1.
+    g_grid = (d * d) * (np.log(d) - 1.)
+    g_grid[on_sensor] = 0.
+    # weights = g^-1 @ v, so out = g_grid @ g^-1 @ v (g is symmetric)
+    try:
+        operator = linalg.solve(g, g_grid.T).T
+    except ValueError:
+        unique_locs = np.unique(locs, axis=0)
+        if len(unique_locs) < len(locs):
+            raise NotImplementedError("Error determining sensor map projection due to more than one sensor in a single location; try using a different projection.")
+        raise
+    operator = np.ascontiguousarray(operator)
+    operator.flags.writeable = False
+    if len(TOPOMAP_OPERATORS) >= TOPOMAP_OPERATORS_MAX:
+        del TOPOMAP_OPERATORS[next(iter(TOPOMAP_OPERATORS))]
+    TOPOMAP_OPERATORS[key] = operator
+    return operator
+
+
 class Topomap(SensorMapMixin, ColorMapMixin, TopoMapKey, EelFigure):
     """Plot individual topogeraphies
 
@@ -663,44 +718,10 @@ class PltTopomap(PltIm):
             locs = locs[self._visible_data]
 
         if self._method is None:
-            # interpolate data
-            xi, yi = self._mgrid
-
-            # code adapted from mne-python topmap _griddata()
-            xy = locs[:, 0] + locs[:, 1] * -1j
-            d = np.abs(xy - xy[:, None])
-            diagonal_step = len(locs) + 1
-            d.flat[::diagonal_step] = 1.
-
-            g = (d * d) * (np.log(d) - 1.)
-            g.flat[::diagonal_step] = 0.
-            try:
-                weights = linalg.solve(g, v.ravel())
-            except ValueError:
-                if np.isnan(v).any():
-                    raise NotImplementedError("Can't interpolate sensor data with NaN")
-                unique_locs = np.unique(locs, axis=0)
-                if len(unique_locs) < len(locs):
-                    raise NotImplementedError("Error determining sensor map projection due to more than one sensor in a single location; try using a different projection.")
-                raise
-
-            m, n = xi.shape
-            out = np.empty_like(xi)
-
-            g = np.empty(xy.shape)
-            for i in range(m):
-                for j in range(n):
-                    d = np.abs(xi[i, j] + -1j * yi[i, j] - xy)
-                    mask = np.where(d == 0)[0]
-                    if len(mask):
-                        d[mask] = 1.
-                    np.log(d, out=g)
-                    g -= 1.
-                    g *= d * d
-                    if len(mask):
-                        g[mask] = 0.
-                    out[i, j] = g.dot(weights)
-            return out
+            if np.isnan(v).any():
+                raise NotImplementedError("Can't interpolate sensor data with NaN")
+            operator = thin_plate_operator(locs, len(self._grid))
+            return (operator @ v).reshape((len(self._grid), len(self._grid)))
         elif self._method == 'spline':
             k = int(floor(sqrt(len(locs)))) - 1
             tck = interpolate.bisplrep(locs[:, 1], locs[:, 0], v, kx=k, ky=k)
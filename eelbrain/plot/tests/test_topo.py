@@ -1,10 +1,14 @@
 # Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
 from matplotlib.backend_bases import KeyEvent
 import numpy as np
+from numpy.testing import assert_allclose
 import pytest
+from scipy import linalg
 
 from eelbrain import datasets, plot, testnd
 from eelbrain._utils import IS_WINDOWS
+from eelbrain.plot._sensors import SENSORMAP_FRAME
+from eelbrain.plot._topo import TOPOMAP_OPERATORS
 from eelbrain.testing import requires_mne_sample_data, hide_plots
 from eelbrain.testing.matplotlib import assert_titles_visible
 
@@ -29,6 +33,23 @@ def test_plot_topomap():
 
     p = plot.Topomap('topo', data=ds, vmax=0.5e-6, w=2)
     p.close()
+    # thin-plate spline interpolation
+    TOPOMAP_OPERATORS.clear()
+    p = plot.Topomap('topo', 'predictability', data=ds, res=20)
+    assert len(TOPOMAP_OPERATORS) == 1  # cells share the operator
+    topo = ds[0, 'topo']
+    locs = topo.sensor.get_locs_2d('default', frame=SENSORMAP_FRAME)
+    xy = locs[:, 0] - 1j * locs[:, 1]
+    d = np.abs(xy - xy[:, None])
+    np.fill_diagonal(d, 1)
+    weights = linalg.solve(d ** 2 * (np.log(d) - 1) * (1 - np.eye(len(d))), topo.x)
+    grid = np.linspace(0, 1, 20)
+    xi, yi = np.meshgrid(grid, grid)
+    d = np.abs((xi - 1j * yi)[..., None] - xy)
+    target = (d ** 2 * (np.log(d) - 1)) @ weights
+    plt = p.plots[0].plots[0]
+    assert_allclose(plt._data_from_ndvar(topo), target)
+    p.close()
     p = plot.Topomap('topo', 'predictability', data=ds, axw=2)
     assert_titles_visible(p)
     p.close()
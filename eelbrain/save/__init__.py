@@ -2,6 +2,7 @@
 """Helper functions for saving data in various formats."""
 
 from ._besa import meg160_triggers, besa_evt
+from .._io.dataset_dir import save_dataset_dir as dataset_dir
 from .._io.pickle import pickle
 from ._txt import txt
 from .._io.wav import save_wav as wav
@@ -17,6 +17,8 @@ from numpy.testing import (
     assert_equal, assert_array_equal, assert_allclose,
     assert_array_almost_equal)
 import pytest
+import scipy.sparse
+from scipy.spatial.distance import pdist, squareform
 import statsmodels.api as sm
 
 from eelbrain import (
@@ -24,12 +26,14 @@ from eelbrain import (
     Case, Categorial, Scalar, Sensor, UTS, set_tmin,
     align, align1, choose, combine,
     cwt_morlet, shuffled_index)
+from eelbrain import _data_obj
+from eelbrain._data_opt import gaussian_smoother
 from eelbrain._data_obj import (
     all_equal, asvar, assub, FULL_AXIS_SLICE, longname, SourceSpace,
     assert_has_no_empty_cells)
 from eelbrain._exceptions import DimensionMismatchError
 from eelbrain._stats.stats import rms
-from eelbrain.testing import assert_dataobj_equal, assert_dataset_equal, assert_fmtxt_str_equals, assert_source_space_equal, requires_mne_sample_data, skip_on_windows, requires_mne_testing_data
+from eelbrain.testing import TempDir, assert_dataobj_equal, assert_dataset_equal, assert_fmtxt_str_equals, assert_source_space_equal, requires_mne_sample_data, skip_on_windows, requires_mne_testing_data
 
 
 OPERATORS = {
@@ -1556,6 +1560,33 @@ def test_ndvar_summary_methods():
     assert x.extrema() == max(abs(x.min()), abs(x.max()))
 
 
+def test_ndvar_memmap(monkeypatch):
+    "Test NDVar with memory-mapped data"
+    tempdir = TempDir()
+    ds = datasets.get_uts(utsnd=True)
+    x = ds['utsnd']
+    path = os.path.join(tempdir, 'x.npy')
+    np.save(path, x.x)
+    xm = NDVar(np.load(path, mmap_mode='r'), x.dims, x.name, x.info)
+    # indexing returns views
+    assert isinstance(xm[:5].x, np.memmap)
+    assert isinstance(xm.sub(time=(0, 0.1)).x, np.memmap)
+    assert_dataobj_equal(xm[[3, 1, 2]], x[[3, 1, 2]])
+    # aggregate in blocks of cases
+    monkeypatch.setattr(_data_obj, 'MEMMAP_BLOCK_BYTES', x.x[:7].nbytes)
+    idx = x[0] > 0
+    for func in ('mean', 'sum', 'max', 'min', 'rms', 'std'):
+        for axis in (None, 'time', ('sensor', 'time'), 'case', ('case', 'time'), idx):
+            target = getattr(x, func)(axis)
+            out = getattr(xm, func)(axis)
+            if isinstance(target, (NDVar, Var)):
+                assert type(out) is type(target)
+                assert_array_almost_equal(out.x, target.x)
+            else:
+                assert out == pytest.approx(target)
+    assert_dataobj_equal(xm.mean(time=(0, 0.1)), x.mean(time=(0, 0.1)))
+
+
 def test_ndvar_timeseries_methods():
     "Test NDVar time-series methods"
     ds = datasets.get_uts(True)
@@ -1836,6 +1867,38 @@ def test_source_space():
     assert source_lh._array_index('lh') == slice(len(source_lh))
 
 
+def test_source_space_smooth(monkeypatch):
+    "Test sparse Gaussian smoothing on a SourceSpace"
+    rng = np.random.RandomState(0)
+    sss = []
+    for _ in range(2):
+        rr = rng.uniform(0, 0.1, (300, 3))
+        vertno = np.sort(rng.choice(300, 200, replace=False))
+        dist = np.zeros((300, 300))
+        dist[np.ix_(vertno, vertno)] = squareform(pdist(rr[vertno]))
+        sss.append({'rr': rr, 'vertno': vertno, 'dist': scipy.sparse.csr_matrix(dist)})
+    source = SourceSpace([ss['vertno'] for ss in sss], 'fake', 'ico-4', None, None)
+    monkeypatch.setattr(source, 'get_source_space', lambda *args: sss)
+    x = NDVar(rng.normal(0, 1, (3, len(source), 5)), (Case, source, UTS(0, 0.01, 5)))
+    std = 0.01
+    dense = gaussian_smoother(source._distances(), std)
+    target = np.moveaxis(np.tensordot(dense, x.x, (1, 1)), 0, 1)
+
+    # without cutoff, identical to dense smoother
+    monkeypatch.setattr(_data_obj, 'GAUSSIAN_SMOOTHER_CUTOFF', 100)
+    monkeypatch.setattr(_data_obj, 'GAUSSIAN_SMOOTHERS', {})
+    assert_allclose(source._gaussian_smoother(std).toarray(), dense, rtol=1e-12)
+    assert_allclose(x.smooth('source', std, 'gaussian').x, target, rtol=1e-12)
+    # with cutoff
+    monkeypatch.setattr(_data_obj, 'GAUSSIAN_SMOOTHER_CUTOFF', 4)
+    monkeypatch.setattr(_data_obj, 'GAUSSIAN_SMOOTHERS', {})
+    m = source._gaussian_smoother(std)
+    assert m.nnz < dense.size / 5
+    assert_allclose(m.sum(1), 1)
+    assert source._gaussian_smoother(std) is m
+    assert_allclose(x.smooth('source', std, 'gaussian').x, target, atol=0.01)
+
+
 def test_var():
     "Test Var objects"
     base = Factor('aabbcde')
@@ -14,7 +14,7 @@ from eelbrain import (
     Dataset, Factor,
     concatenate, labels_from_clusters, morph_source_space, set_parc, xhemi)
 from eelbrain._data_obj import SourceSpace, asndvar, _matrix_graph
-from eelbrain._mne import shift_mne_epoch_trigger, combination_label
+from eelbrain._mne import morph_stcs, shift_mne_epoch_trigger, combination_label
 from eelbrain.testing import requires_mne_sample_data, requires_mne_testing_data
 from eelbrain.tests.test_data import assert_dataobj_equal
 
@@ -219,6 +219,12 @@ def test_morphing():
     morph = mne.compute_source_morph(stc, 'sample', 'fsaverage', subjects_dir)
     stc_fsa = morph.apply(stc)
     stc_fsa_ndvar = load.mne.stc_ndvar(stc_fsa, 'fsaverage', 'ico-5', subjects_dir, 'dSPM', False, 'src', parc=None)
+    # morph several stcs at once
+    stc_short = stc.copy().crop(0.1)
+    stcs_fsa = morph_stcs(morph, [stc, stc_short])
+    assert_array_equal(stcs_fsa[0].data, stc_fsa.data)
+    assert_array_equal(stcs_fsa[1].data, morph.apply(stc_short).data)
+    assert stcs_fsa[1].tmin == stc_short.tmin
 
     # sample to fsaverage
     # -------------------
@@ -1,4 +1,5 @@
 # Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+import numpy as np
 from eelbrain import *
 
 # turn off multiprocessing
@@ -6,3 +7,13 @@ configure(0)
 ds = datasets._get_continuous(10000)
 
 timeit boosting(ds['y'], ds['x1'], 0, .5)
+
+# multiple signals sharing a stimulus, fit in batches
+rng = np.random.RandomState(0)
+time = UTS(0, 0.01, 10000)
+x = NDVar(rng.normal(0, 1, (8, 10000)), (Scalar('band', range(8)), time), name='x')
+h = NDVar(rng.normal(0, 1, (8, 30)) * np.hanning(30), (Scalar('band', range(8)), UTS(0, 0.01, 30)))
+y = convolve(h, x) + NDVar(rng.normal(0, 2, (32, 10000)), (Scalar('channel', range(32)), time))
+for batch_size in [1, 4, 16]:
+    print(f"{batch_size=}")
+    timeit boosting(y, x, 0, .5, partitions=4, batch_size=batch_size)
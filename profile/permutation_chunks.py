@@ -0,0 +1,27 @@
+# Author: Christian Brodbeck <christianbrodbeck@nyu.edu>
+"""Permutation throughput as a function of chunk size and number of workers
+
+usage: $ python permutation_chunks.py
+"""
+from time import time
+
+from eelbrain import *
+from eelbrain._stats import testnd as _testnd
+
+
+SAMPLES = 2000
+CHUNK_SIZES = (1, 10, 100, None)
+N_WORKERS = (1, 2, 4, 8)
+
+ds = datasets.get_uts(True)
+
+print(f"{'workers':>8} {'chunk':>6} {'samples/s':>10}")
+for n_workers in N_WORKERS:
+    configure(n_workers=n_workers)
+    for chunk_size in CHUNK_SIZES:
+        _testnd.PERMUTATION_CHUNK_SIZE = chunk_size
+        t0 = time()
+        testnd.TTestRelated('utsnd', 'A', 'a1', 'a0', 'rm', data=ds, samples=SAMPLES)
+        dt = time() - t0
+        print(f"{n_workers:>8} {chunk_size or 'auto':>6} {SAMPLES / dt:>10.0f}")
+_testnd.PERMUTATION_CHUNK_SIZE = None